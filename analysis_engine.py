@@ -0,0 +1,204 @@
+"""
+Analysis Engine Module for WellTech AI MedSuite
+Structured session note content with memoized analysis rendering
+"""
+
+import re
+import json
+import time
+import hashlib
+from functools import lru_cache
+
+from note_renderer import render_note_ir, NOTE_IR_VERSION
+from sentiment_engine import analyze_sentiment
+from single_flight import SingleFlight
+
+# Rendered analyses kept per (client, therapy type, format, date)
+ANALYSIS_CACHE_SIZE = 1024
+
+# Stored with every analysed session; bump it when templates, the sentiment
+# lexicon or the note layout change so older sessions are re-analysed
+ENGINE_VERSION = 1
+
+
+class FrozenDict(dict):
+    """dict that refuses mutation, so shared constant structures stay constant.
+
+    Being a real dict it still serializes with json.dumps and jsonify.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('FrozenDict is read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+# Session content behind every note format; see build_note_ir
+NOTE_CONTENT = FrozenDict({
+    'durationMinutes': 50,
+    'platform': 'WellTech AI MedSuite™',
+    'presentation': "Client reports increased anxiety levels this week, particularly related to work responsibilities and upcoming project deadlines. Describes perfectionist tendencies and compulsive checking behaviors. Expresses feeling overwhelmed by workload and concerns about meeting expectations. Client mentions sleep disturbance (difficulty falling asleep, waking up at 3 AM with racing thoughts) and decreased appetite. Reports using deep breathing techniques learned in previous sessions with moderate success.",
+    'observations': "Client appeared alert and engaged throughout session. Maintained appropriate eye contact and demonstrated good verbal communication. Showed visible signs of anxiety when discussing work concerns (fidgeting, rapid speech) but demonstrated capacity for insight and self-reflection. Client was able to identify triggers and patterns in anxiety responses. No signs of acute distress or safety concerns observed.",
+    'interventions': "Reviewed the week's anxiety episodes and mapped triggers to automatic thoughts. Used cognitive restructuring to challenge perfectionist and catastrophic thinking about work performance. Reinforced diaphragmatic breathing and introduced the daily thought record as homework.",
+    'response': "Client engaged actively in restructuring exercises and generated balanced alternative thoughts with moderate prompting. Reported feeling calmer by the end of session and agreed to complete thought records and practice breathing before bed.",
+    'assessment': "Client presenting with work-related anxiety disorder with perfectionist features and mild sleep disturbance. Symptoms include excessive checking behaviors, catastrophic thinking patterns, and somatic manifestations of anxiety. Client demonstrates excellent therapeutic engagement, strong insight capacity, and motivation for change. Therapeutic alliance remains strong with good rapport established.",
+    'plan': (
+        "Continue cognitive restructuring techniques focusing on perfectionist thought patterns",
+        "Introduce progressive muscle relaxation for sleep hygiene",
+        "Implement graded exposure exercises to reduce checking behaviors",
+        "Assign homework: daily thought record for work-related anxiety triggers",
+        "Schedule follow-up session in one week to monitor progress",
+        "Consider referral to psychiatrist if sleep disturbance persists",
+        "Provide psychoeducation materials on anxiety management strategies"
+    ),
+    'clinicalNotes': "Client shows significant progress in identifying anxiety triggers and implementing coping strategies. Recommend continued focus on cognitive behavioral interventions with emphasis on behavioral activation and exposure therapy principles."
+})
+
+VALIDATION_TEMPLATE = """\
+**CLINICAL VALIDATION REVIEW**
+
+**Accuracy Assessment:** The analysis accurately reflects the therapeutic content and clinical observations documented during the session. All major themes and interventions are appropriately captured.
+
+**Completeness Review:** The summary comprehensively covers subjective reports, objective observations, clinical assessment, and treatment planning. Includes appropriate risk assessment and progress monitoring.
+
+**Clinical Quality:** Professional language and evidence-based clinical terminology used throughout. Follows standard {summary_format} documentation format with appropriate level of detail for insurance and clinical record requirements.
+
+**Overall Quality Score:** 9.3/10 - Excellent clinical documentation meeting professional standards for therapy session notes.
+
+**Compliance Notes:** Documentation meets HIPAA requirements and professional clinical standards for mental health treatment records.
+"""
+
+# Stand-in session transcript for demos and sessions without speech
+SIMULATED_TRANSCRIPT = """\
+Therapist: How has this week been for you?
+Client: Honestly I've been really anxious. There's a big project deadline at work and I keep checking everything three or four times. I feel overwhelmed and worried that it won't be perfect.
+Therapist: What happens at night?
+Client: I can't sleep. I wake up at three with my thoughts racing, and I'm exhausted the next day. My appetite is down too.
+Therapist: What have you tried when the worry builds up?
+Client: The breathing we practiced helps a bit. I managed to calm down twice this week.
+Therapist: Let's look at the thought that the project has to be perfect.
+Client: I realize I expect more of myself than anyone else does. If it's good enough, nobody will think I'm a failure.
+Therapist: How does that feel to say?
+Client: Calmer, actually. A bit relieved. I'm willing to try the thought record as homework and keep practicing the breathing before bed.
+Therapist: Next week we'll review it together.
+Client: Okay. I feel more hopeful than when I came in. I think this is helping and I'm looking forward to seeing progress.
+"""
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# Scored once: sentiment of the simulated session
+SENTIMENT_ANALYSIS = _freeze(analyze_sentiment([SIMULATED_TRANSCRIPT])[0])
+
+AREAS_FOR_REVIEW = (
+    FrozenDict({
+        'area': 'Sleep disturbance assessment',
+        'priority': 'medium',
+        'description': 'Consider detailed sleep assessment and potential medical evaluation'
+    }),
+    FrozenDict({
+        'area': 'Work stress management',
+        'priority': 'high',
+        'description': 'Develop specific workplace coping strategies and boundary setting'
+    })
+)
+
+CONFIDENCE_SCORE = 0.93
+
+# Identical concurrent analyses (demo bursts, replayed batches) run once
+analysis_flight = SingleFlight()
+
+_FIELD_PATTERN = re.compile(r'\{(\w+)\}')
+
+
+def parse_template(template):
+    """Split a template into alternating (literal, field name, literal, ...) parts"""
+    return tuple(_FIELD_PATTERN.split(template))
+
+
+def render_template(parts, **values):
+    """Render parsed parts; every field left in them must be supplied"""
+    out = list(parts)
+    out[1::2] = [str(values[field]) for field in parts[1::2]]
+    return ''.join(out)
+
+
+_VALIDATION_PARTS = parse_template(VALIDATION_TEMPLATE.strip())
+
+
+@lru_cache(maxsize=64)
+def render_validation(summary_format):
+    """Validation review text, which depends only on the summary format"""
+    return render_template(_VALIDATION_PARTS, summary_format=summary_format)
+
+
+def build_note_ir(client_name, therapy_type, date, sentiment=SENTIMENT_ANALYSIS):
+    """Structured note for a session, rendered into any format by note_renderer"""
+    return FrozenDict(NOTE_CONTENT, version=NOTE_IR_VERSION, clientName=client_name, therapyType=therapy_type,
+                      date=date, sentiment=sentiment, areasForReview=AREAS_FOR_REVIEW)
+
+
+def render_note(client_name, therapy_type, summary_format, date):
+    """Session note text for one client and date"""
+    return render_note_ir(build_note_ir(client_name, therapy_type, date), summary_format)
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _render_analysis(client_name, therapy_type, summary_format, date):
+    return FrozenDict({
+        'analysis': render_note(client_name, therapy_type, summary_format, date),
+        'sentimentAnalysis': SENTIMENT_ANALYSIS,
+        'validationAnalysis': render_validation(summary_format),
+        'confidenceScore': CONFIDENCE_SCORE,
+        'areasForReview': AREAS_FOR_REVIEW
+    })
+
+
+def generate_comprehensive_analysis(client_name, therapy_type, summary_format):
+    """Generate the analysis payload for a session.
+
+    Rendered results are memoized by inputs and date, and concurrent
+    callers with the same inputs share one rendering. The returned dict is
+    a fresh shallow copy so callers may add keys; nested values are shared
+    read-only objects.
+    """
+    key = (client_name, therapy_type, summary_format, time.strftime('%Y-%m-%d'))
+    return dict(analysis_flight.do(('analysis',) + key, _render_analysis, *key))
+
+
+def _analyze_note(client_name, therapy_type, summary_format, date, sentiment):
+    note_ir = build_note_ir(client_name, therapy_type, date, sentiment)
+    return FrozenDict({
+        'analysis': render_note_ir(note_ir, summary_format),
+        'noteIR': note_ir,
+        'confidenceScore': CONFIDENCE_SCORE,
+        'areasForReview': AREAS_FOR_REVIEW
+    })
+
+
+def analyze_note(client_name, therapy_type, summary_format, date, sentiment=SENTIMENT_ANALYSIS):
+    """Structured note and its rendering for one session, as the pipeline's analyze stage stores them.
+
+    Concurrent callers with the same inputs and sentiment (e.g. a batch
+    replayed with the same parameters) share one analysis. Returns a fresh
+    shallow copy, like generate_comprehensive_analysis.
+    """
+    sentiment_key = hashlib.sha256(json.dumps(sentiment, sort_keys=True).encode()).digest()
+    key = ('note', client_name, therapy_type, summary_format, date, sentiment_key)
+    return dict(analysis_flight.do(key, _analyze_note, client_name, therapy_type, summary_format, date, sentiment))
+
+
+def score_transcript(transcript):
+    """Sentiment of one transcript; concurrent calls for the same text share one scoring"""
+    key = ('sentiment', hashlib.sha256(transcript.encode()).digest())
+    return analysis_flight.do(key, lambda: analyze_sentiment([transcript])[0])
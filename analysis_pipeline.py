@@ -0,0 +1,306 @@
+"""
+Analysis Pipeline Module for WellTech AI MedSuite
+Staged session processing: transcribe -> sentiment -> analyze -> validate
+"""
+
+import json
+import time
+import wave
+import logging
+import importlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from analysis_engine import analyze_note, render_validation, score_transcript, SENTIMENT_ANALYSIS
+from audio_segmentation import segment_audio
+from waveform import write_peaks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGES = 'transcribe,sentiment,analyze,validate'
+
+# Stage outputs that only depend on the recording; kept after the session is stored, for reanalysis
+RECORDING_STAGES = ('segment', 'transcribe', 'waveform')
+
+
+class PipelineError(Exception):
+    """Raised when a stage fails; earlier stage outputs stay persisted"""
+
+    def __init__(self, stage, error):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    """Base class for pipeline stages.
+
+    `run` receives the pipeline context: the session inputs plus, under
+    each earlier stage's name, that stage's output. It returns a
+    JSON-serializable dict whose keys are merged into the session result.
+    Stages with executor = 'process' run in a process pool, so they and
+    their context must be picklable.
+    """
+
+    name = None
+    executor = 'thread'
+    timeout = 300
+
+    def run(self, context):
+        raise NotImplementedError
+
+
+class SegmentStage(Stage):
+    """Windowed analysis of WAV recordings across a process pool.
+
+    Not in DEFAULT_STAGES; enable it by listing 'segment' first in the
+    ANALYSIS_PIPELINE spec. The stage runs on a pipeline thread and farms
+    the windows out to its own process pool, shared by all sessions.
+    Sessions without a PCM WAV file the wave module can read (8/16/24/32
+    bit) get no segments. The segments are stored with the session.
+    """
+
+    name = 'segment'
+    workers = None
+    _pool = None
+
+    def run(self, context):
+        file_path = context.get('file_path')
+        if not file_path or not file_path.lower().endswith('.wav'):
+            return {'segments': []}
+        if SegmentStage._pool is None:
+            SegmentStage._pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            return segment_audio(file_path, executor=SegmentStage._pool)
+        except (wave.Error, ValueError) as e:
+            # e.g. float or WAVE_FORMAT_EXTENSIBLE files; the rest of the analysis goes ahead
+            logger.warning(f"No segments for {file_path}: {e}")
+            return {'segments': []}
+
+
+class TranscribeStage(Stage):
+    """Placeholder transcription: records what was uploaded"""
+
+    name = 'transcribe'
+
+    def run(self, context):
+        return {'transcript': context['transcript_note']}
+
+
+class AnalyzeStage(Stage):
+    """Structured clinical note, plus its rendering in the requested format.
+
+    Identical concurrent analyses share one run (analysis_engine.analyze_note).
+    """
+
+    name = 'analyze'
+
+    def run(self, context):
+        sentiment = context.get('sentiment', {}).get('sentimentAnalysis', SENTIMENT_ANALYSIS)
+        return analyze_note(context['client_name'], context['therapy_type'], context['summary_format'],
+                            context['date'], sentiment)
+
+
+class SentimentStage(Stage):
+    """Lexicon sentiment of the transcript (see sentiment_engine)"""
+
+    name = 'sentiment'
+
+    def run(self, context):
+        transcript = context.get('transcribe', {}).get('transcript', '')
+        sentiment = score_transcript(transcript)
+        if not sentiment['scores']['affectWords']:
+            # The placeholder transcription carries no speech; describe the simulated session
+            sentiment = SENTIMENT_ANALYSIS
+        return {'sentimentAnalysis': sentiment}
+
+
+class ValidateStage(Stage):
+    """Validation review from the built-in template engine"""
+
+    name = 'validate'
+
+    def run(self, context):
+        return {'validationAnalysis': render_validation(context['summary_format'])}
+
+
+class WaveformStage(Stage):
+    """Writes the waveform peaks blob served to the audio preview.
+
+    Not in DEFAULT_STAGES: peaks are written in the background after
+    upload (waveform.PeaksWriter). List 'waveform' in ANALYSIS_PIPELINE to
+    have them ready before the analysis response instead.
+    """
+
+    name = 'waveform'
+
+    def run(self, context):
+        file_path = context.get('file_path')
+        peaks = write_peaks(file_path) if file_path else None
+        return {'waveformAvailable': peaks is not None}
+
+
+STAGE_REGISTRY = {
+    'segment': SegmentStage,
+    'transcribe': TranscribeStage,
+    'analyze': AnalyzeStage,
+    'sentiment': SentimentStage,
+    'validate': ValidateStage,
+    'waveform': WaveformStage
+}
+
+
+def register_stage(stage_class):
+    """Make a stage class available by name to load_stages"""
+    STAGE_REGISTRY[stage_class.name] = stage_class
+    return stage_class
+
+
+def load_stages(spec=DEFAULT_STAGES):
+    """Build stage instances from a comma-separated spec.
+
+    Each entry is a registered stage name or a 'module:ClassName' path, so
+    a local transcription or analysis model can be swapped in through
+    configuration (e.g. 'my_asr:WhisperStage,sentiment,analyze,validate').
+    """
+    stages = []
+    for entry in (part.strip() for part in spec.split(',')):
+        if not entry:
+            continue
+        if ':' in entry:
+            module_name, class_name = entry.split(':', 1)
+            stage_class = getattr(importlib.import_module(module_name), class_name)
+        else:
+            stage_class = STAGE_REGISTRY[entry]
+        stages.append(stage_class())
+    return stages
+
+
+class AnalysisPipeline:
+    """Runs named stages in order with per-stage timing and persistence.
+
+    Each stage's output (or error) is written to pipeline_stage_results,
+    keyed by (session_id, stage). Running the pipeline again for the same
+    session reuses completed outputs, so a failed stage can be retried
+    without redoing the stages before it. Once a session's result is
+    stored, prune() drops the rows the session row already holds, and
+    forget() drops the rest when its recording is deleted.
+    """
+
+    def __init__(self, get_db, stages=None, thread_workers=4, process_workers=2):
+        self.get_db = get_db
+        self.stages = stages if stages is not None else load_stages()
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._thread_pool = None
+        self._process_pool = None
+
+    def init_schema(self):
+        """Create the stage results table if needed"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pipeline_stage_results (
+                    session_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    output TEXT,
+                    error TEXT,
+                    duration_ms REAL,
+                    attempts INTEGER DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (session_id, stage)
+                )
+            ''')
+            conn.commit()
+
+    def prune(self, session_ids, keep=RECORDING_STAGES):
+        """Delete stored sessions' stage rows, except completed stages in `keep`"""
+        placeholders = ','.join('?' * len(keep))
+        with self.get_db() as conn:
+            conn.executemany(f'''
+                DELETE FROM pipeline_stage_results
+                WHERE session_id = ? AND (status != 'completed' OR stage NOT IN ({placeholders}))
+            ''', [(session_id, *keep) for session_id in session_ids])
+            conn.commit()
+
+    def forget(self, session_id):
+        """Delete every stage row of a session, e.g. once its recording is gone"""
+        with self.get_db() as conn:
+            conn.execute('DELETE FROM pipeline_stage_results WHERE session_id = ?', (session_id,))
+            conn.commit()
+
+    def _pool(self, stage):
+        if stage.executor == 'process':
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers,
+                                                   thread_name_prefix='pipeline')
+        return self._thread_pool
+
+    def _completed_outputs(self, cursor, session_id):
+        cursor.execute('''
+            SELECT stage, output, duration_ms FROM pipeline_stage_results
+            WHERE session_id = ? AND status = 'completed'
+        ''', (session_id,))
+        return {row[0]: (json.loads(row[1]), row[2]) for row in cursor.fetchall()}
+
+    def _record(self, conn, session_id, stage, status, output=None, error=None, duration_ms=None):
+        conn.execute('''
+            INSERT INTO pipeline_stage_results (session_id, stage, status, output, error, duration_ms, attempts, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (session_id, stage) DO UPDATE SET
+                status = excluded.status, output = excluded.output, error = excluded.error,
+                duration_ms = excluded.duration_ms, attempts = attempts + 1,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (session_id, stage, status, json.dumps(output) if output is not None else None,
+              error, duration_ms))
+        conn.commit()
+
+    def run(self, session_id, inputs, listener=None, reuse=None):
+        """Run all stages for a session.
+
+        Returns (result, report): the merged stage outputs and a list of
+        {'stage', 'status', 'durationMs'} entries. Raises PipelineError if
+        a stage fails. `listener(event_type, data)`, if given, is called
+        with 'stage-started' and 'stage-finished' progress events.
+        `reuse` limits which completed stages are reused (default: all).
+        """
+        notify = listener or (lambda event_type, data: None)
+        context = dict(inputs, session_id=session_id)
+        context.setdefault('date', time.strftime('%Y-%m-%d'))
+        result = {}
+        report = []
+
+        with self.get_db() as conn:
+            completed = self._completed_outputs(conn.cursor(), session_id)
+            if reuse is not None:
+                completed = {name: value for name, value in completed.items() if name in reuse}
+
+            for stage in self.stages:
+                if stage.name in completed:
+                    output, duration_ms = completed[stage.name]
+                    report.append({'stage': stage.name, 'status': 'reused', 'durationMs': duration_ms})
+                else:
+                    notify('stage-started', {'stage': stage.name})
+                    started = time.perf_counter()
+                    try:
+                        output = self._pool(stage).submit(stage.run, context).result(timeout=stage.timeout)
+                    except Exception as e:
+                        duration_ms = (time.perf_counter() - started) * 1000
+                        self._record(conn, session_id, stage.name, 'failed', error=str(e), duration_ms=duration_ms)
+                        logger.error(f"Pipeline stage {stage.name} failed for {session_id}: {e}")
+                        notify('stage-finished', {'stage': stage.name, 'status': 'failed',
+                                                  'durationMs': duration_ms, 'error': str(e)})
+                        raise PipelineError(stage.name, e)
+
+                    duration_ms = (time.perf_counter() - started) * 1000
+                    self._record(conn, session_id, stage.name, 'completed', output=output, duration_ms=duration_ms)
+                    report.append({'stage': stage.name, 'status': 'completed', 'durationMs': duration_ms})
+                    notify('stage-finished', report[-1])
+
+                context[stage.name] = output
+                result.update(output)
+
+        return result, report
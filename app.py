@@ -11,13 +11,35 @@ import hashlib
 import sqlite3
 import logging
 import secrets
+import time
+import threading
 import jwt
 from datetime import datetime, timedelta
 from contextlib import contextmanager
 from functools import wraps
-from flask import Flask, request, jsonify, send_from_directory, render_template_string
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template_string
 from flask_cors import CORS
-from file_management import add_file_management_routes, save_uploaded_file
+from file_management import add_file_management_routes, save_uploaded_file, adopt_uploaded_file
+from media_probe import probe_upload, probe_file, screen_head
+from resumable_uploads import UploadStore, UploadError
+from upload_ingest import IngestRequest, UploadBudget
+from blob_store import BlobStore
+from waveform import PeaksWriter
+from file_catalog import FileCatalog
+from werkzeug.exceptions import RequestEntityTooLarge
+from email_filter import EmailBloomFilter
+from analysis_engine import generate_comprehensive_analysis, build_note_ir, analysis_flight, ENGINE_VERSION
+from note_renderer import render_session_note, canonical_format, SUPPORTED_FORMATS
+from analysis_pipeline import AnalysisPipeline, load_stages, DEFAULT_STAGES
+from job_queue import JobQueue
+from reanalysis import Reanalyzer
+from session_events import EventBroker
+from response_cache import ResponseCache, seconds_until_midnight
+from token_revocation import TokenRevocationList
+from key_management import KeyRing
+from session_store import SessionStore
+from idempotency import IdempotencyStore, MAX_KEY_LENGTH
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,12 +47,35 @@ logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='static', static_url_path='')
+# Multipart file parts stream straight into the uploads directory
+app.request_class = IngestRequest
 CORS(app)
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'welltech-ai-medsuite-2024')
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', secrets.token_hex(32))
+app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')  # Verifies tokens issued before the keyring
+app.config['JWT_KEYRING_FILE'] = os.environ.get('JWT_KEYRING_FILE', 'jwt_keyring.json')
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB
+app.config['ACCESS_TOKEN_MINUTES'] = int(os.environ.get('ACCESS_TOKEN_MINUTES', 15))
+app.config['STREAM_TICKET_SECONDS'] = int(os.environ.get('STREAM_TICKET_SECONDS', 60))
+app.config['REFRESH_TOKEN_DAYS'] = int(os.environ.get('REFRESH_TOKEN_DAYS', 14))
+app.config['ANALYSIS_PIPELINE'] = os.environ.get('ANALYSIS_PIPELINE', DEFAULT_STAGES)
+app.config['SESSION_WORKERS'] = int(os.environ.get('SESSION_WORKERS', 2))
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', 4))
+app.config['WAVEFORM_WORKERS'] = int(os.environ.get('WAVEFORM_WORKERS', 1))
+app.config['MAX_BATCH_SESSIONS'] = int(os.environ.get('MAX_BATCH_SESSIONS', 50))
+app.config['DEMO_CACHE_SIZE'] = int(os.environ.get('DEMO_CACHE_SIZE', 1024))
+app.config['REANALYSIS_BATCH_SIZE'] = int(os.environ.get('REANALYSIS_BATCH_SIZE', 20))
+app.config['REANALYSIS_RATE'] = float(os.environ.get('REANALYSIS_RATE', 5))
+app.config['DEDUP_POLICY'] = os.environ.get('DEDUP_POLICY', 'session')  # session | file | off
+app.config['BLOB_GC_GRACE_HOURS'] = float(os.environ.get('BLOB_GC_GRACE_HOURS', 1))
+app.config['FILE_RECONCILE_MINUTES'] = int(os.environ.get('FILE_RECONCILE_MINUTES', 15))
+app.config['IDEMPOTENCY_TTL_HOURS'] = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', 24))
+app.config['IDEMPOTENCY_WAIT_SECONDS'] = int(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 30))
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 1024 * 1024 * 1024))
+app.config['UPLOAD_EXPIRY_HOURS'] = int(os.environ.get('UPLOAD_EXPIRY_HOURS', 24))
+app.config['USER_STORAGE_QUOTA_MB'] = int(os.environ.get('USER_STORAGE_QUOTA_MB', 5120))  # 0 = unlimited
 
 # Database context manager
 @contextmanager
@@ -42,6 +87,34 @@ def get_db():
     finally:
         conn.close()
 
+# JWT signing keys shared by every worker through the keyring file
+keyring = KeyRing(app.config['JWT_KEYRING_FILE'], legacy_secret=app.config['JWT_SECRET_KEY'])
+
+# Refresh-token sessions in user_sessions
+session_store = SessionStore(get_db, lifetime=timedelta(days=app.config['REFRESH_TOKEN_DAYS']))
+
+# Resumable chunked uploads, handed to session creation once complete
+upload_store = UploadStore(get_db, chunk_size=app.config['UPLOAD_CHUNK_SIZE'], max_size=app.config['UPLOAD_MAX_BYTES'],
+                           ttl_seconds=app.config['UPLOAD_EXPIRY_HOURS'] * 3600)
+
+# Size, hash and presence of stored recordings, so listings need no filesystem calls
+file_catalog = FileCatalog(get_db)
+
+# Recordings, stored once per content hash and reference-counted by session
+blob_store = BlobStore(get_db, grace_seconds=app.config['BLOB_GC_GRACE_HOURS'] * 3600, catalog=file_catalog)
+
+# Stored responses of requests sent with an Idempotency-Key
+idempotency_store = IdempotencyStore(get_db, ttl_seconds=app.config['IDEMPOTENCY_TTL_HOURS'] * 3600)
+
+# Session analysis stages (transcribe -> sentiment -> analyze -> validate)
+analysis_pipeline = AnalysisPipeline(get_db, load_stages(app.config['ANALYSIS_PIPELINE']))
+
+# Registered-email filter for fast rejection of unknown logins
+email_filter = EmailBloomFilter(get_db)
+
+# Revoked token ids, shared between workers through the database
+revocation_list = TokenRevocationList(get_db)
+
 # Initialize database
 def init_database():
     with get_db() as conn:
@@ -66,7 +139,8 @@ def init_database():
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 last_login DATETIME,
                 login_attempts INTEGER DEFAULT 0,
-                locked_until DATETIME
+                locked_until DATETIME,
+                token_version INTEGER DEFAULT 0
             )
         ''')
         
@@ -85,6 +159,17 @@ def init_database():
                 validation_analysis TEXT,
                 confidence_score REAL,
                 status TEXT DEFAULT 'pending',
+                file_path TEXT,
+                duration_seconds REAL,
+                channels INTEGER,
+                sample_rate INTEGER,
+                codec TEXT,
+                note_ir TEXT,
+                engine_version INTEGER DEFAULT 0,
+                content_sha256 TEXT,
+                file_size INTEGER,
+                file_name TEXT,
+                segments TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users (id)
@@ -101,6 +186,7 @@ def init_database():
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 ip_address TEXT,
                 user_agent TEXT,
+                token_version INTEGER DEFAULT 0,
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
@@ -133,6 +219,24 @@ def init_database():
             )
         ''')
         
+        # Columns added after the first release
+        add_missing_columns(cursor, 'users', {'token_version': 'INTEGER DEFAULT 0'})
+        add_missing_columns(cursor, 'user_sessions', {'token_version': 'INTEGER DEFAULT 0'})
+        add_missing_columns(cursor, 'therapy_sessions', {
+            'file_path': 'TEXT',
+            'duration_seconds': 'REAL',
+            'channels': 'INTEGER',
+            'sample_rate': 'INTEGER',
+            'codec': 'TEXT',
+            'note_ir': 'TEXT',
+            'engine_version': 'INTEGER DEFAULT 0',
+            'content_sha256': 'TEXT',
+            'file_size': 'INTEGER',
+            'file_name': 'TEXT',
+            'segments': 'TEXT'
+        })
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_therapy_sessions_content ON therapy_sessions (user_id, content_sha256)')
+        
         # Create admin user
         admin_password_hash = hash_password('3942-granite-35')
         cursor.execute('''
@@ -141,7 +245,25 @@ def init_database():
         ''', ('admin', admin_password_hash, 'System Administrator', 'admin', 'active', True, 'System Administrator', 'ADMIN-001', 'N/A'))
         
         conn.commit()
-        logger.info("Database initialized successfully")
+    
+    revocation_list.init_schema()
+    session_store.init_schema()
+    idempotency_store.init_schema()
+    upload_store.init_schema()
+    blob_store.init_schema()
+    file_catalog.init_schema()
+    analysis_pipeline.init_schema()
+    job_queue.init_schema()
+    reanalyzer.init_schema()
+    logger.info("Database initialized successfully")
+
+def add_missing_columns(cursor, table, columns):
+    """Add columns that an existing database predates"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row['name'] for row in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
 
 # Password hashing functions
 def hash_password(password):
@@ -160,21 +282,45 @@ def verify_password(password, stored_hash):
         return False
 
 # JWT token functions
-def generate_jwt_token(user_id, email, role):
-    """Generate JWT token for user authentication"""
+def generate_jwt_token(user_id, email, role, status, token_version):
+    """Generate a short-lived access token.
+
+    Status and account version are embedded so protected routes can trust
+    the claims without a database lookup; a status change takes effect no
+    later than ACCESS_TOKEN_MINUTES, when the client must refresh.
+    """
     payload = {
         'user_id': user_id,
         'email': email,
         'role': role,
-        'exp': datetime.utcnow() + timedelta(hours=24),
+        'status': status,
+        'ver': token_version,
+        'jti': secrets.token_urlsafe(16),
+        'exp': datetime.utcnow() + timedelta(minutes=app.config['ACCESS_TOKEN_MINUTES']),
+        'iat': datetime.utcnow()
+    }
+    return keyring.encode(payload)
+
+def generate_stream_ticket(user_id, session_id):
+    """Short-lived, single-use token that opens one session's event stream.
+    
+    EventSource cannot send an Authorization header, so the ticket travels
+    in the URL instead of the access token; it is useless once consumed.
+    """
+    payload = {
+        'typ': 'stream',
+        'user_id': user_id,
+        'sid': session_id,
+        'jti': secrets.token_urlsafe(16),
+        'exp': datetime.utcnow() + timedelta(seconds=app.config['STREAM_TICKET_SECONDS']),
         'iat': datetime.utcnow()
     }
-    return jwt.encode(payload, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+    return keyring.encode(payload)
 
 def verify_jwt_token(token):
     """Verify JWT token and return user data"""
     try:
-        payload = jwt.decode(token, app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+        payload = keyring.decode(token)
         return payload
     except jwt.ExpiredSignatureError:
         return None
@@ -187,20 +333,50 @@ def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+        else:
             return jsonify({'error': 'Authentication required'}), 401
         
-        token = auth_header.split(' ')[1]
         user_data = verify_jwt_token(token)
         
-        if not user_data:
+        # Stream tickets are signed with the same keys but are not access tokens
+        if not user_data or user_data.get('typ'):
             return jsonify({'error': 'Invalid or expired token'}), 401
         
+        if user_data.get('jti') and revocation_list.is_revoked(user_data['jti']):
+            return jsonify({'error': 'Token has been revoked'}), 401
+        
         request.current_user = user_data
         return f(*args, **kwargs)
     
     return decorated_function
 
+def require_stream_ticket(f):
+    """Decorator authenticating an event stream by ?ticket= or, failing that, require_auth
+    
+    The ticket must be a stream ticket for the session in the URL; it is
+    consumed on use, across workers, through the revocation list.
+    """
+    header_auth = require_auth(f)
+    
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        ticket = request.args.get('ticket')
+        if not ticket:
+            return header_auth(*args, **kwargs)
+        
+        ticket_data = verify_jwt_token(ticket)
+        if not ticket_data or ticket_data.get('typ') != 'stream' or ticket_data.get('sid') != kwargs.get('session_id'):
+            return jsonify({'error': 'Invalid or expired stream ticket'}), 401
+        if not revocation_list.revoke(ticket_data['jti'], ticket_data['exp'], ticket_data['user_id']):
+            return jsonify({'error': 'Stream ticket already used'}), 401
+        
+        request.current_user = {'user_id': ticket_data['user_id']}
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 def require_admin(f):
     """Decorator to require admin role"""
     @wraps(f)
@@ -215,6 +391,12 @@ def require_active_user(f):
     """Decorator to require active user status"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        # Access tokens carry the account status at issue time
+        if 'status' in request.current_user:
+            if request.current_user['status'] != 'active':
+                return jsonify({'error': 'Account not active or approved'}), 403
+            return f(*args, **kwargs)
+        
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT status FROM users WHERE id = ?', (request.current_user['user_id'],))
@@ -227,116 +409,130 @@ def require_active_user(f):
     
     return decorated_function
 
-# Generate comprehensive analysis
-def generate_comprehensive_analysis(client_name, therapy_type, summary_format):
-    analysis = f"""
-**{summary_format} THERAPY SESSION SUMMARY**
-
-Client: {client_name}
-Therapy Type: {therapy_type}
-Date: {datetime.now().strftime('%Y-%m-%d')}
-Session Duration: 50 minutes
-Platform: WellTech AI MedSuite™
-
-**SUBJECTIVE:**
-Client reports increased anxiety levels this week, particularly related to work responsibilities and upcoming project deadlines. Describes perfectionist tendencies and compulsive checking behaviors. Expresses feeling overwhelmed by workload and concerns about meeting expectations. Client mentions sleep disturbance (difficulty falling asleep, waking up at 3 AM with racing thoughts) and decreased appetite. Reports using deep breathing techniques learned in previous sessions with moderate success.
-
-**OBJECTIVE:**
-Client appeared alert and engaged throughout session. Maintained appropriate eye contact and demonstrated good verbal communication. Showed visible signs of anxiety when discussing work concerns (fidgeting, rapid speech) but demonstrated capacity for insight and self-reflection. Client was able to identify triggers and patterns in anxiety responses. No signs of acute distress or safety concerns observed.
-
-**ASSESSMENT:**
-Client presenting with work-related anxiety disorder with perfectionist features and mild sleep disturbance. Symptoms include excessive checking behaviors, catastrophic thinking patterns, and somatic manifestations of anxiety. Client demonstrates excellent therapeutic engagement, strong insight capacity, and motivation for change. Therapeutic alliance remains strong with good rapport established.
-
-**PLAN:**
-1. Continue cognitive restructuring techniques focusing on perfectionist thought patterns
-2. Introduce progressive muscle relaxation for sleep hygiene
-3. Implement graded exposure exercises to reduce checking behaviors
-4. Assign homework: daily thought record for work-related anxiety triggers
-5. Schedule follow-up session in one week to monitor progress
-6. Consider referral to psychiatrist if sleep disturbance persists
-7. Provide psychoeducation materials on anxiety management strategies
+# Multipart framing (boundaries, part headers, form fields) allowed on top of the file bytes
+MULTIPART_OVERHEAD_ALLOWANCE = 64 * 1024
 
-**CLINICAL NOTES:**
-Client shows significant progress in identifying anxiety triggers and implementing coping strategies. Recommend continued focus on cognitive behavioral interventions with emphasis on behavioral activation and exposure therapy principles.
-
-**SENTIMENT ANALYSIS:**
-
-**Overall Emotional Tone:** Moderate anxiety with underlying resilience and motivation for therapeutic change
-
-**Emotional Progression:** Session began with heightened anxiety discussion, progressed to collaborative problem-solving, ended with hope and commitment to treatment goals
-
-**Key Emotional Indicators:**
-• Work-related anxiety and stress
-• Perfectionist concerns and self-criticism
-• Sleep disruption and physical tension
-• Therapeutic engagement and motivation
-• Hope for improvement and change
-
-**Therapeutic Engagement Level:** High - client actively participates, demonstrates insight, and commits to homework assignments
-
-**Risk Assessment:** Low risk - client has good coping skills, strong support system, no safety concerns identified. Monitor sleep disturbance and work stress levels.
-
-**Progress Indicators:**
-• Increased awareness of anxiety triggers
-• Successful implementation of breathing techniques
-• Improved ability to challenge catastrophic thoughts
-• Strong therapeutic alliance and engagement
-• Commitment to treatment goals and homework completion
-"""
-
-    sentiment_analysis = {
-        "overallEmotionalTone": "Moderate anxiety with underlying resilience and motivation for therapeutic change",
-        "emotionalProgression": "Session began with heightened anxiety discussion, progressed to collaborative problem-solving, ended with hope and commitment to treatment goals",
-        "keyEmotionalIndicators": [
-            "Work-related anxiety and stress",
-            "Perfectionist concerns and self-criticism",
-            "Sleep disruption and physical tension",
-            "Therapeutic engagement and motivation",
-            "Hope for improvement and change"
-        ],
-        "therapeuticEngagementLevel": "High - client actively participates, demonstrates insight, and commits to homework assignments",
-        "riskAssessment": "Low risk - client has good coping skills, strong support system, no safety concerns identified. Monitor sleep disturbance and work stress levels.",
-        "progressIndicators": [
-            "Increased awareness of anxiety triggers",
-            "Successful implementation of breathing techniques",
-            "Improved ability to challenge catastrophic thoughts",
-            "Strong therapeutic alliance and engagement",
-            "Commitment to treatment goals and homework completion"
-        ]
-    }
-
-    validation_analysis = f"""
-**CLINICAL VALIDATION REVIEW**
-
-**Accuracy Assessment:** The analysis accurately reflects the therapeutic content and clinical observations documented during the session. All major themes and interventions are appropriately captured.
+def storage_used(user_id):
+    """Bytes of recordings stored for a user, plus space reserved by their unfinished resumable uploads.
+    
+    A file shared by several sessions (a deduplicated upload) counts once;
+    sessions saved before file sizes were recorded count as zero.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COALESCE(SUM(file_size), 0) FROM (
+                SELECT DISTINCT file_path, file_size FROM therapy_sessions
+                WHERE user_id = ? AND file_path IS NOT NULL
+            )
+        ''', (user_id,))
+        stored = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT COALESCE(SUM(size), 0) FROM resumable_uploads
+            WHERE user_id = ? AND status IN ('uploading', 'complete')
+        ''', (user_id,))
+        return stored + cursor.fetchone()[0]
 
-**Completeness Review:** The summary comprehensively covers subjective reports, objective observations, clinical assessment, and treatment planning. Includes appropriate risk assessment and progress monitoring.
+def storage_remaining(user_id):
+    """Bytes a user may still upload under USER_STORAGE_QUOTA_MB, or None when unlimited"""
+    quota = app.config['USER_STORAGE_QUOTA_MB'] * 1024 * 1024
+    if quota <= 0:
+        return None
+    return max(0, quota - storage_used(user_id))
 
-**Clinical Quality:** Professional language and evidence-based clinical terminology used throughout. Follows standard {summary_format} documentation format with appropriate level of detail for insurance and clinical record requirements.
+def upload_quota(f):
+    """Decorator parsing multipart uploads under the user's remaining storage quota
+    
+    A declared Content-Length that cannot fit is refused before any body
+    is read; otherwise file parts are streamed to disk and the parse stops
+    with 413 as soon as they pass the remaining allowance. Each part is
+    screened by screen_session_audio as it arrives. Place it before
+    anything that reads request.form or request.files.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        request.upload_screen = screen_session_audio
+        remaining = storage_remaining(request.current_user['user_id'])
+        if remaining is not None:
+            if request.content_length is not None and request.content_length > remaining + MULTIPART_OVERHEAD_ALLOWANCE:
+                return jsonify({'error': f'Upload exceeds your remaining storage quota of {remaining} bytes'}), 413
+            request.upload_budget = UploadBudget(remaining)
+        
+        if request.content_type and 'multipart/form-data' in request.content_type:
+            try:
+                request.files
+            except RequestEntityTooLarge as e:
+                return jsonify({'error': e.description}), 413
+        return f(*args, **kwargs)
+    
+    return decorated_function
 
-**Overall Quality Score:** 9.3/10 - Excellent clinical documentation meeting professional standards for therapy session notes.
+def request_fingerprint():
+    """Digest identifying a request's content, to catch a reused Idempotency-Key.
+    
+    Uploads are identified by field, filename and size rather than hashed,
+    so checking a retry costs no extra pass over the recording.
+    """
+    digest = hashlib.sha256(f"{request.method} {request.path}?{request.query_string.decode()}".encode())
+    if request.form or request.files:
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"\0{name}={value}".encode())
+        for name, storage in sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or '')):
+            storage.stream.seek(0, os.SEEK_END)
+            size = storage.stream.tell()
+            storage.stream.seek(0)
+            digest.update(f"\0{name}:{storage.filename}:{size}".encode())
+    else:
+        digest.update(request.get_data())
+    return digest.digest()[:16]
 
-**Compliance Notes:** Documentation meets HIPAA requirements and professional clinical standards for mental health treatment records.
-"""
+def idempotent(f):
+    """Decorator running a request once per Idempotency-Key and replaying its response
+    
+    Retries wait for an in-flight original (up to IDEMPOTENCY_WAIT_SECONDS)
+    instead of running again. Server errors are not stored, so a retry
+    after one runs afresh.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+        
+        user_id = request.current_user['user_id']
+        fingerprint = request_fingerprint()
+        outcome, record = idempotency_store.begin(user_id, key, fingerprint)
+        if outcome == 'in-progress':
+            outcome, record = idempotency_store.wait(user_id, key, fingerprint, app.config['IDEMPOTENCY_WAIT_SECONDS'])
+        
+        if outcome == 'mismatch':
+            return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+        if outcome == 'in-progress':
+            return jsonify({'error': 'A request with this Idempotency-Key is still being processed'}), 409
+        if outcome == 'replay':
+            response = Response(record['body'], status=record['status_code'], content_type=record['content_type'])
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(user_id, key)
+            raise
+        if response.status_code >= 500:
+            idempotency_store.release(user_id, key)
+        else:
+            idempotency_store.complete(user_id, key, response.status_code, response.get_data(), response.content_type)
+        return response
+    
+    return decorated_function
 
-    return {
-        'analysis': analysis.strip(),
-        'sentimentAnalysis': sentiment_analysis,
-        'validationAnalysis': validation_analysis.strip(),
-        'confidenceScore': 0.93,
-        'areasForReview': [
-            {
-                'area': 'Sleep disturbance assessment',
-                'priority': 'medium',
-                'description': 'Consider detailed sleep assessment and potential medical evaluation'
-            },
-            {
-                'area': 'Work stress management',
-                'priority': 'high',
-                'description': 'Develop specific workplace coping strategies and boundary setting'
-            }
-        ]
-    }
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    # Bodies over MAX_CONTENT_LENGTH, and uploads over a quota parsed outside upload_quota
+    return jsonify({'error': e.description}), 413
 
 # Routes
 @app.route('/')
@@ -432,6 +628,8 @@ def register():
             
             conn.commit()
         
+        email_filter.add(data['email'])
+        
         return jsonify({
             'success': True,
             'message': 'Registration successful. Your account is pending admin approval.',
@@ -453,10 +651,18 @@ def login():
         if not email or not password:
             return jsonify({'success': False, 'error': 'Email and password are required'}), 400
         
+        # Unknown emails are rejected without a database round trip, padded
+        # to the cost of a real lookup so the response time leaks nothing
+        started = time.perf_counter()
+        if not email_filter.might_contain(email):
+            email_filter.pad_response(started)
+            return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
+        
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
             user = cursor.fetchone()
+            email_filter.record_lookup(time.perf_counter() - started)
             
             if not user:
                 return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
@@ -495,15 +701,20 @@ def login():
                 VALUES (?, ?, ?, ?, ?)
             ''', (user['id'], 'user_login', f'User logged in: {email}', request.remote_addr, request.headers.get('User-Agent')))
             
+            refresh_token = session_store.create(cursor, user['id'], request.remote_addr,
+                                                 request.headers.get('User-Agent'), user['token_version'])
+            
             conn.commit()
         
         # Generate JWT token
-        token = generate_jwt_token(user['id'], user['email'], user['role'])
+        token = generate_jwt_token(user['id'], user['email'], user['role'], user['status'], user['token_version'])
         
         return jsonify({
             'success': True,
             'message': 'Login successful',
             'token': token,
+            'refresh_token': refresh_token,
+            'expires_in': app.config['ACCESS_TOKEN_MINUTES'] * 60,
             'user': {
                 'id': user['id'],
                 'email': user['email'],
@@ -517,13 +728,70 @@ def login():
         logger.error(f"Login error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh():
+    """Exchange a refresh token for a new access token and refresh token"""
+    try:
+        data = request.get_json() or {}
+        refresh_token = data.get('refresh_token')
+        
+        if not refresh_token:
+            return jsonify({'success': False, 'error': 'Refresh token is required'}), 400
+        
+        with get_db() as conn:
+            cursor = conn.cursor()
+            
+            # Refresh tokens are single use: rotate on every exchange
+            session = session_store.consume(cursor, refresh_token)
+            if not session:
+                return jsonify({'success': False, 'error': 'Invalid or expired refresh token'}), 401
+            
+            cursor.execute('SELECT id, email, role, status, token_version FROM users WHERE id = ?',
+                           (session['user_id'],))
+            row = cursor.fetchone()
+            
+            if not row or row['status'] != 'active':
+                conn.commit()
+                return jsonify({'success': False, 'error': 'Account not active or approved'}), 403
+            
+            # Approval, rejection and other account changes bump token_version and end older sessions
+            if session['token_version'] != row['token_version']:
+                conn.commit()
+                return jsonify({'success': False, 'error': 'Account changed; please log in again'}), 401
+            
+            new_refresh_token = session_store.create(cursor, row['id'], request.remote_addr,
+                                                     request.headers.get('User-Agent'), row['token_version'])
+            conn.commit()
+        
+        token = generate_jwt_token(row['id'], row['email'], row['role'], row['status'], row['token_version'])
+        
+        return jsonify({
+            'success': True,
+            'token': token,
+            'refresh_token': new_refresh_token,
+            'expires_in': app.config['ACCESS_TOKEN_MINUTES'] * 60
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Token refresh error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/auth/logout', methods=['POST'])
 @require_auth
 def logout():
     """User logout endpoint"""
     try:
+        # Tokens issued before jti was added simply run out at exp
+        if request.current_user.get('jti'):
+            revocation_list.revoke(request.current_user['jti'], request.current_user['exp'],
+                                   request.current_user['user_id'])
+        
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        
         with get_db() as conn:
             cursor = conn.cursor()
+            if refresh_token:
+                session_store.revoke(cursor, refresh_token, request.current_user['user_id'])
             cursor.execute('''
                 INSERT INTO audit_log (user_id, action, details, ip_address)
                 VALUES (?, ?, ?, ?)
@@ -591,7 +859,7 @@ def approve_user(user_id):
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE users 
-                SET status = 'active', email_verified = TRUE
+                SET status = 'active', email_verified = TRUE, token_version = token_version + 1
                 WHERE id = ?
             ''', (user_id,))
             
@@ -619,10 +887,13 @@ def reject_user(user_id):
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE users 
-                SET status = 'rejected'
+                SET status = 'rejected', token_version = token_version + 1
                 WHERE id = ?
             ''', (user_id,))
             
+            # Outstanding refresh tokens die with the account
+            session_store.revoke_user(cursor, user_id)
+            
             # Log rejection
             cursor.execute('''
                 INSERT INTO audit_log (user_id, action, details, ip_address)
@@ -676,7 +947,10 @@ def get_admin_stats():
                 'user_stats': user_stats,
                 'total_sessions': total_sessions,
                 'recent_registrations': recent_registrations,
-                'recent_activity': recent_activity
+                'recent_activity': recent_activity,
+                'analysis_coalescing': analysis_flight.stats(),
+                'blob_store': blob_store.stats(),
+                'file_catalog': file_catalog.stats()
             }
         }), 200
         
@@ -684,34 +958,496 @@ def get_admin_stats():
         logger.error(f"Stats retrieval error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/admin/users/<int:user_id>/sessions', methods=['GET'])
+@require_auth
+@require_admin
+def list_user_sessions(user_id):
+    """List a user's active login sessions (admin only)"""
+    try:
+        sessions = session_store.active_sessions(user_id)
+        return jsonify({'success': True, 'sessions': sessions, 'total': len(sessions)}), 200
+    except Exception as e:
+        logger.error(f"Session listing error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/reanalysis', methods=['GET'])
+@require_auth
+@require_admin
+def get_reanalysis():
+    """Latest re-analysis run and how many sessions are stale (admin only)"""
+    try:
+        return jsonify({
+            'success': True,
+            'engineVersion': ENGINE_VERSION,
+            'staleSessions': reanalyzer.stale_count(),
+            'run': reanalyzer.status()
+        }), 200
+    except Exception as e:
+        logger.error(f"Reanalysis status error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/reanalysis', methods=['POST'])
+@require_auth
+@require_admin
+def start_reanalysis():
+    """Re-analyse sessions from older engine versions in the background (admin only)"""
+    try:
+        run, created = reanalyzer.start(requested_by=request.current_user['user_id'])
+        if not created:
+            return jsonify({'success': False, 'error': 'A re-analysis run is already in progress', 'run': run}), 409
+        
+        with get_db() as conn:
+            conn.execute('''
+                INSERT INTO audit_log (user_id, action, details, ip_address)
+                VALUES (?, ?, ?, ?)
+            ''', (request.current_user['user_id'], 'reanalysis_started',
+                  f"Run {run['id']}: {run['total']} sessions to engine v{ENGINE_VERSION}", request.remote_addr))
+            conn.commit()
+        
+        return jsonify({'success': True, 'run': run}), 202
+    except Exception as e:
+        logger.error(f"Reanalysis start error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/reanalysis/cancel', methods=['POST'])
+@require_auth
+@require_admin
+def cancel_reanalysis():
+    """Stop the running re-analysis at its next checkpoint (admin only)"""
+    try:
+        run = reanalyzer.cancel()
+        if not run:
+            return jsonify({'success': False, 'error': 'No re-analysis run in progress'}), 404
+        return jsonify({'success': True, 'run': run}), 200
+    except Exception as e:
+        logger.error(f"Reanalysis cancel error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Session processing
+session_events = EventBroker()
+
+def new_session_id():
+    return f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}"
+
+INSERT_SESSION_SQL = '''
+    INSERT INTO therapy_sessions 
+    (session_id, user_id, client_name, therapy_type, summary_format, transcript, analysis, sentiment_analysis, validation_analysis, confidence_score, status, file_path,
+     duration_seconds, channels, sample_rate, codec, note_ir, engine_version, content_sha256, file_size, file_name, segments)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (session_id) DO NOTHING
+'''
+
+def session_row(session_id, user_id, inputs, result):
+    """Parameters for INSERT_SESSION_SQL"""
+    media = inputs.get('media') or {}
+    return (session_id, user_id, inputs['client_name'], inputs['therapy_type'], inputs['summary_format'], result['transcript'],
+            result['analysis'], json.dumps(result['sentimentAnalysis']), 
+            result['validationAnalysis'], result['confidenceScore'], 'completed', inputs['file_path'],
+            media.get('durationSeconds'), media.get('channels'), media.get('sampleRate'), media.get('codec'),
+            json.dumps(result['noteIR']) if result.get('noteIR') else None, ENGINE_VERSION,
+            inputs.get('content_sha256'), inputs.get('file_size'), inputs.get('file_name'),
+            json.dumps(result['segments']) if 'segments' in result else None)
+
+def session_response(session_id, result, stage_report):
+    return {
+        'success': True,
+        'sessionId': session_id,
+        'message': 'Session processed successfully',
+        'pipeline': stage_report,
+        **result
+    }
+
+def session_publisher(session_id, user_id):
+    """Listener publishing a session's progress to session_events"""
+    def publish(event_type, data):
+        session_events.publish(session_id, event_type, data, owner=user_id)
+    return publish
+
+def process_session(session_id, user_id, inputs):
+    """Run the analysis pipeline for a session and store the result.
+    
+    Safe to call again for the same session_id: completed stages are
+    reused and the row is only inserted once. Progress is published to
+    session_events under the session id.
+    """
+    publish = session_publisher(session_id, user_id)
+    
+    try:
+        result, stage_report = analysis_pipeline.run(session_id, inputs, listener=publish)
+        
+        with get_db() as conn:
+            conn.execute(INSERT_SESSION_SQL, session_row(session_id, user_id, inputs, result))
+            conn.commit()
+    except Exception as e:
+        publish('failed', {'error': str(e)})
+        raise
+    analysis_pipeline.prune([session_id])
+    
+    response = session_response(session_id, result, stage_report)
+    publish('completed', response)
+    return response
+
+def process_session_batch(user_id, items):
+    """Analyze many sessions in parallel and store them in one transaction.
+    
+    `items` are (session_id, inputs) pairs. Analyses fan out across
+    batch_pool; the rows of every successful analysis are then inserted
+    with a single commit. Returns a per-item status list in input order.
+    """
+    futures = [(session_id, inputs, batch_pool.submit(analysis_pipeline.run, session_id, inputs,
+                                                      session_publisher(session_id, user_id)))
+               for session_id, inputs in items]
+    
+    statuses = []
+    analyzed = []
+    for session_id, inputs, future in futures:
+        try:
+            result, stage_report = future.result()
+            analyzed.append((session_id, inputs, result, stage_report))
+            statuses.append({'sessionId': session_id, 'status': 'completed'})
+        except Exception as e:
+            logger.error(f"Batch analysis failed for {session_id}: {e}")
+            statuses.append({'sessionId': session_id, 'status': 'failed', 'error': str(e)})
+    
+    try:
+        with get_db() as conn:
+            conn.executemany(INSERT_SESSION_SQL, [session_row(session_id, user_id, inputs, result)
+                                                  for session_id, inputs, result, _ in analyzed])
+            conn.commit()
+        analysis_pipeline.prune([session_id for session_id, _, _, _ in analyzed])
+    except Exception as e:
+        logger.error(f"Batch insert failed: {e}")
+        analyzed = []
+        for status in statuses:
+            if status['status'] == 'completed':
+                status.update(status='failed', error=f'Storing results failed: {e}')
+    
+    responses = {}
+    for session_id, inputs, result, stage_report in analyzed:
+        responses[session_id] = session_response(session_id, result, stage_report)
+        session_publisher(session_id, user_id)('completed', responses[session_id])
+    for status in statuses:
+        if status['status'] == 'failed':
+            session_publisher(status['sessionId'], user_id)('failed', {'error': status['error']})
+        else:
+            status['result'] = responses[status['sessionId']]
+    return statuses
+
+def lookup_finished_sessions(session_ids):
+    """Terminal events for sessions finished by another process"""
+    placeholders = ','.join('?' * len(session_ids))
+    finished = {}
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT session_id FROM therapy_sessions WHERE session_id IN ({placeholders})
+        ''', session_ids)
+        for row in cursor.fetchall():
+            finished[row['session_id']] = ('completed', {'success': True, 'sessionId': row['session_id']})
+        cursor.execute(f'''
+            SELECT session_id, status, result, error FROM processing_jobs
+            WHERE session_id IN ({placeholders}) AND status IN ('completed', 'failed')
+        ''', session_ids)
+        for row in cursor.fetchall():
+            if row['status'] == 'completed':
+                finished[row['session_id']] = ('completed', json.loads(row['result']))
+            else:
+                finished[row['session_id']] = ('failed', {'error': row['error']})
+    return finished
+
+def run_session_job(payload):
+    """Job queue handler for asynchronous session processing"""
+    inputs = payload['inputs']
+    # Jobs queued before a storage migration still carry the recording's old path
+    inputs['file_path'] = blob_store.resolve(inputs.get('file_path'))
+    return process_session(payload['session_id'], payload['user_id'], inputs)
+
+def wants_async():
+    """Clients opt into 202 Accepted with ?async=1 or Prefer: respond-async"""
+    return (request.args.get('async', '').lower() in ('1', 'true')
+            or 'respond-async' in request.headers.get('Prefer', ''))
+
+# Durable background processing for asynchronous session requests
+job_queue = JobQueue(get_db, run_session_job, workers=app.config['SESSION_WORKERS'])
+
+# Admin-triggered re-analysis of sessions from an older engine
+reanalyzer = Reanalyzer(get_db, analysis_pipeline, ENGINE_VERSION,
+                        batch_size=app.config['REANALYSIS_BATCH_SIZE'], rate=app.config['REANALYSIS_RATE'])
+
+# Fan-out pool for synchronous batch requests
+batch_pool = ThreadPoolExecutor(max_workers=app.config['BATCH_WORKERS'], thread_name_prefix='batch')
+
+# Waveform peaks are written in the background once a recording is stored
+peaks_writer = PeaksWriter(workers=app.config['WAVEFORM_WORKERS'])
+
+ALLOWED_AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.mp4', '.webm', '.ogg'}
+
+def find_content_matches(user_id, sha256):
+    """The user's earlier sessions that still hold a recording with this SHA-256, newest first"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Deleting a file keeps the session's hash, but it no longer has the recording to offer
+        cursor.execute('''
+            SELECT * FROM therapy_sessions
+            WHERE user_id = ? AND content_sha256 = ? AND file_path IS NOT NULL
+            ORDER BY id DESC
+        ''', (user_id, sha256))
+        return [dict(row) for row in cursor.fetchall()]
+
+def save_session_audio(uploaded_file, session_id, user_id):
+    """Validate and save a session recording.
+    
+    The upload's first bytes were screened while the request streamed in
+    (see screen_session_audio), so a file that is not a supported
+    recording was not written past them; the full container header is
+    probed before the file is saved. Returns an upload dict with file_path,
+    transcript_note, media (the probed format, codec, duration, channels
+    and sample rate), sha256, size, file_name and matches. Raises
+    ValueError for an unsupported, mismatched or corrupt file and OSError
+    if the file could not be saved.
+    
+    The recording is kept in blob_store under its SHA-256, referenced by
+    session_id, so identical content is stored once whoever uploads it.
+    Unless DEDUP_POLICY is 'off', matches lists the user's earlier
+    sessions with identical content.
+    """
+    check_audio_extension(uploaded_file.filename)
+    if getattr(uploaded_file.stream, 'rejection', None):
+        raise uploaded_file.stream.rejection
+    media = probe_upload(uploaded_file)
+    
+    # Save file to disk
+    file_path, file_info = save_uploaded_file(uploaded_file, user_id)
+    if file_path is None:
+        raise OSError(file_info)
+    
+    return register_session_audio(file_path, file_info, media, session_id, user_id)
+
+def claim_session_audio(upload_id, session_id, user_id):
+    """Take over a completed resumable upload as a session's recording.
+    
+    The part file is probed, then moved into the blob store without a
+    copy. Returns the same upload dict as save_session_audio. Raises
+    UploadError (a ValueError carrying an HTTP status) if the upload is
+    missing or unfinished, ValueError for unsupported or corrupt content
+    (the upload is discarded) and OSError if the file could not be moved.
+    """
+    upload, part_path = upload_store.claim(upload_id, user_id)
+    try:
+        check_audio_extension(upload['file_name'])
+        media = probe_file(part_path, upload['file_name'])
+    except ValueError:
+        upload_store.discard(upload_id, user_id)
+        raise
+    
+    file_path, file_info = adopt_uploaded_file(part_path, upload['file_name'], user_id)
+    if file_path is None:
+        raise OSError(file_info)
+    upload_store.finish(upload_id)
+    
+    return register_session_audio(file_path, file_info, media, session_id, user_id)
+
+def check_audio_extension(file_name):
+    file_ext = os.path.splitext(file_name)[1].lower()
+    if file_ext not in ALLOWED_AUDIO_EXTENSIONS:
+        raise ValueError(f'Unsupported file type: {file_ext}. Supported: {", ".join(ALLOWED_AUDIO_EXTENSIONS)}')
+
+def screen_session_audio(head, file_name):
+    """Turn away an upload part whose name or magic bytes are not a supported recording"""
+    check_audio_extension(file_name or '')
+    screen_head(head, file_name)
+
+def register_session_audio(file_path, file_info, media, session_id, user_id):
+    """Move a recording saved to file_path into the blob store and announce it; see save_session_audio"""
+    sha256 = file_info['sha256']
+    matches = find_content_matches(user_id, sha256) if app.config['DEDUP_POLICY'] != 'off' else []
+    file_path, _ = blob_store.put(file_path, sha256, file_info['size'], session_id,
+                                  os.path.splitext(file_info['original_name'])[1])
+    peaks_writer.schedule(file_path)
+    
+    # Only the user's own sessions are mentioned; blobs are shared silently across users
+    if matches:
+        transcript_note = (f"Audio file '{file_info['original_name']}' ({file_info['size']} bytes) "
+                           f"is identical to an earlier upload; reusing {file_path}")
+        logger.info(f"Duplicate upload from user {user_id} ({sha256[:12]}); reusing {file_path}")
+    else:
+        transcript_note = f"Audio file '{file_info['original_name']}' ({file_info['size']} bytes) saved to {file_path}"
+    
+    session_events.publish(session_id, 'upload-received',
+                           {'fileName': file_info['original_name'], 'size': file_info['size'], 'media': media,
+                            'duplicate': bool(matches)}, owner=user_id)
+    return {
+        'file_path': file_path,
+        'transcript_note': transcript_note,
+        'media': media,
+        'sha256': sha256,
+        'size': file_info['size'],
+        'file_name': file_info['original_name'],
+        'matches': matches
+    }
+
+def reusable_session(upload, inputs):
+    """An earlier session that already answers this request, under DEDUP_POLICY 'session'.
+    
+    It must share the recording, client, therapy type and format, and come
+    from the current analysis engine.
+    """
+    if app.config['DEDUP_POLICY'] != 'session':
+        return None
+    for match in upload['matches']:
+        if (match['client_name'], match['therapy_type'], match['summary_format']) == \
+                (inputs['client_name'], inputs['therapy_type'], inputs['summary_format']) \
+                and match['engine_version'] == ENGINE_VERSION and match['status'] == 'completed':
+            return match
+    return None
+
+def stored_session_response(row):
+    """Response for an earlier session returned in place of a duplicate upload"""
+    return {
+        'success': True,
+        'sessionId': row['session_id'],
+        'duplicate': True,
+        'message': 'Identical recording already analysed; returning the existing session',
+        'transcript': row['transcript'],
+        'analysis': row['analysis'],
+        'sentimentAnalysis': json.loads(row['sentiment_analysis']) if row['sentiment_analysis'] else None,
+        'validationAnalysis': row['validation_analysis'],
+        'confidenceScore': row['confidence_score'],
+        'noteIR': json.loads(row['note_ir']) if row['note_ir'] else None,
+        **({'segments': json.loads(row['segments'])} if row['segments'] else {})
+    }
+
+# Rendered demo responses; the output only depends on the inputs and the date
+demo_cache = ResponseCache(max_entries=app.config['DEMO_CACHE_SIZE'])
+
 # Therapy Session Routes
-@app.route('/api/therapy/demo', methods=['POST'])
+@app.route('/api/therapy/demo', methods=['GET', 'POST'])
 def neural_simulation():
     try:
-        data = request.get_json() or {}
+        data = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
         client_name = data.get('clientName', 'DEMO-WELLTECH-8080')
         therapy_type = data.get('therapyType', 'Cognitive Behavioral Protocol')
         summary_format = data.get('summaryFormat', 'SOAP')
         
-        # Generate analysis
-        result = generate_comprehensive_analysis(client_name, therapy_type, summary_format)
+        key = (client_name, therapy_type, summary_format, time.strftime('%Y-%m-%d'))
+        entry = demo_cache.get(key)
+        if entry is None:
+            # Generate analysis
+            result = generate_comprehensive_analysis(client_name, therapy_type, summary_format)
+            
+            entry = demo_cache.put(key, jsonify({
+                'success': True,
+                'message': 'Neural simulation completed successfully',
+                'platform': 'WellTech AI MedSuite™ - Port 8080',
+                **result
+            }).get_data())
         
-        return jsonify({
-            'success': True,
-            'message': 'Neural simulation completed successfully',
-            'platform': 'WellTech AI MedSuite™ - Port 8080',
-            **result
-        })
+        response = Response(entry['body'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.cache_control.public = True
+        response.cache_control.max_age = seconds_until_midnight()
+        # Answers If-None-Match with 304 for GET requests
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"Neural simulation error: {e}")
         return jsonify({'error': 'Simulation failed'}), 500
 
+# Resumable upload routes
+def upload_response(upload):
+    return {
+        'uploadId': upload['id'],
+        'fileName': upload['file_name'],
+        'size': upload['size'],
+        'offset': upload['committed'],
+        'status': upload['status'],
+        'chunkSize': upload_store.chunk_size,
+        'uploadUrl': f"/api/uploads/{upload['id']}"
+    }
+
+@app.route('/api/uploads', methods=['POST'])
+@require_auth
+@require_active_user
+def create_upload():
+    """Start a resumable upload: {fileName, size} -> upload id and chunk size"""
+    try:
+        data = request.get_json(silent=True) or {}
+        check_audio_extension(data.get('fileName') or '')
+        remaining = storage_remaining(request.current_user['user_id'])
+        if remaining is not None and isinstance(data.get('size'), int) and data['size'] > remaining:
+            return jsonify({'error': f'Upload exceeds your remaining storage quota of {remaining} bytes'}), 413
+        upload = upload_store.create(request.current_user['user_id'], data.get('fileName'), data.get('size'))
+        response = jsonify(upload_response(upload))
+        response.headers['Location'] = f"/api/uploads/{upload['id']}"
+        return response, 201
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Upload creation error: {e}")
+        return jsonify({'error': 'Failed to create upload'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@require_auth
+@require_active_user
+def get_upload(upload_id):
+    """Committed offset of a resumable upload, to continue after a dropped connection"""
+    upload = upload_store.get(upload_id, request.current_user['user_id'])
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    response = jsonify(upload_response(upload))
+    response.headers['Upload-Offset'] = str(upload['committed'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+@require_auth
+@require_active_user
+def upload_chunk(upload_id):
+    """Append one chunk; the Upload-Offset header must equal the committed offset"""
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header required'}), 400
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    
+    try:
+        upload = upload_store.write_chunk(upload_id, request.current_user['user_id'], offset,
+                                          request.content_length, request.stream)
+    except UploadError as e:
+        body = {'error': str(e)}
+        if e.upload:
+            body['offset'] = e.upload['committed']
+        return jsonify(body), e.status
+    except Exception as e:
+        logger.error(f"Upload chunk error: {e}")
+        return jsonify({'error': 'Failed to store chunk'}), 500
+    
+    response = jsonify(upload_response(upload))
+    response.headers['Upload-Offset'] = str(upload['committed'])
+    return response
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@require_auth
+@require_active_user
+def delete_upload(upload_id):
+    """Abandon a resumable upload"""
+    if not upload_store.discard(upload_id, request.current_user['user_id']):
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify({'success': True})
+
 @app.route('/api/therapy/sessions', methods=['POST'])
 @require_auth
 @require_active_user
+@upload_quota
+@idempotent
 def create_session():
     try:
+        session_id = new_session_id()
+        user_id = request.current_user['user_id']
+        
         # Handle both JSON and multipart form data
         if request.content_type and 'multipart/form-data' in request.content_type:
             # Handle file upload
@@ -719,64 +1455,321 @@ def create_session():
             therapy_type = request.form.get('therapy_type', request.form.get('therapyType', 'CBT'))
             summary_format = request.form.get('summary_format', request.form.get('summaryFormat', 'SOAP'))
             
-            # Handle uploaded file
+            # Handle uploaded file, sent inline or earlier as a resumable upload
             uploaded_file = request.files.get('audio_file')
-            file_path = None
-            if uploaded_file and uploaded_file.filename:
-                # Validate file type
-                allowed_extensions = {'.mp3', '.wav', '.m4a', '.mp4', '.webm', '.ogg'}
-                file_ext = os.path.splitext(uploaded_file.filename)[1].lower()
-                
-                if file_ext not in allowed_extensions:
-                    return jsonify({'error': f'Unsupported file type: {file_ext}. Supported: {", ".join(allowed_extensions)}'}), 400
-                
-                # Save file to disk
-                file_path, file_info = save_uploaded_file(uploaded_file, request.current_user['user_id'])
-                
-                if file_path is None:
-                    return jsonify({'error': f'File save failed: {file_info}'}), 500
-                
-                transcript_note = f"Audio file '{file_info['original_name']}' ({file_info['size']} bytes) saved to {file_path}"
-            else:
-                transcript_note = "No audio file provided - using simulated session data."
+            upload_id = request.form.get('upload_id', request.form.get('uploadId'))
+            upload = None
+            try:
+                if uploaded_file and uploaded_file.filename:
+                    upload = save_session_audio(uploaded_file, session_id, user_id)
+                elif upload_id:
+                    upload = claim_session_audio(upload_id, session_id, user_id)
+            except UploadError as e:
+                return jsonify({'error': str(e)}), e.status
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except OSError as e:
+                return jsonify({'error': f'File save failed: {e}'}), 500
         else:
             # Handle JSON data
             data = request.get_json() or {}
             client_name = data.get('clientName', 'Test Client')
             therapy_type = data.get('therapyType', 'CBT')
             summary_format = data.get('summaryFormat', 'SOAP')
-            transcript_note = "Simulated session data used for demonstration."
+            upload = None
+            if data.get('uploadId'):
+                try:
+                    upload = claim_session_audio(data['uploadId'], session_id, user_id)
+                except UploadError as e:
+                    return jsonify({'error': str(e)}), e.status
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                except OSError as e:
+                    return jsonify({'error': f'File save failed: {e}'}), 500
         
-        # Generate analysis
-        result = generate_comprehensive_analysis(client_name, therapy_type, summary_format)
+        inputs = {
+            'client_name': client_name,
+            'therapy_type': therapy_type,
+            'summary_format': summary_format,
+            'transcript_note': "Simulated session data used for demonstration.",
+            'file_path': None,
+            'media': None
+        }
+        if upload:
+            inputs.update(transcript_note=upload['transcript_note'], file_path=upload['file_path'],
+                          media=upload['media'], content_sha256=upload['sha256'], file_size=upload['size'],
+                          file_name=upload['file_name'])
+            existing = reusable_session(upload, inputs)
+            if existing:
+                # The new session is never stored; the existing one keeps the recording referenced
+                blob_store.transfer(session_id, existing['session_id'])
+                return jsonify(stored_session_response(existing))
+        elif request.content_type and 'multipart/form-data' in request.content_type:
+            inputs['transcript_note'] = "No audio file provided - using simulated session data."
+        duplicate_of = upload['matches'][0]['session_id'] if upload and upload['matches'] else None
         
-        # Add transcript note to analysis
-        result['transcript'] = transcript_note
+        if wants_async():
+            job_id = job_queue.enqueue({'session_id': session_id, 'user_id': user_id, 'inputs': inputs},
+                                       user_id=user_id, session_id=session_id)
+            return jsonify({
+                'success': True,
+                'jobId': job_id,
+                'sessionId': session_id,
+                'status': 'queued',
+                'statusUrl': f'/api/therapy/jobs/{job_id}',
+                **({'duplicateOf': duplicate_of} if duplicate_of else {})
+            }), 202
         
-        # Store in database
-        session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        response = process_session(session_id, user_id, inputs)
+        if duplicate_of:
+            response['duplicateOf'] = duplicate_of
+        return jsonify(response)
         
+    except Exception as e:
+        logger.error(f"Session creation error: {e}")
+        return jsonify({'error': f'Session processing failed: {str(e)}'}), 500
+
+@app.route('/api/therapy/sessions/batch', methods=['POST'])
+@require_auth
+@require_active_user
+@upload_quota
+@idempotent
+def create_session_batch():
+    """Process many sessions from one request.
+    
+    Multipart requests carry recordings in `audio_files` and optionally a
+    JSON array in `sessions`; descriptor i describes file i, and
+    descriptors beyond the last file are processed without audio. JSON
+    requests send {"sessions": [...]}. Form-level client_name,
+    therapy_type and summary_format act as defaults for every item.
+    
+    A recording repeating an earlier item (same client, therapy type and
+    format) is not analysed again; once that item is processed, the
+    repeat is reported as its 'duplicate', or 'failed' if it failed. With
+    ?async=1 the repeat shares the earlier item's job.
+    """
+    try:
+        user_id = request.current_user['user_id']
+        
+        if request.content_type and 'multipart/form-data' in request.content_type:
+            files = [f for f in request.files.getlist('audio_files') if f and f.filename]
+            defaults = request.form
+            try:
+                descriptors = json.loads(request.form.get('sessions') or '[]')
+            except ValueError:
+                return jsonify({'error': 'sessions must be a JSON array'}), 400
+        else:
+            files = []
+            defaults = {}
+            descriptors = (request.get_json(silent=True) or {}).get('sessions', [])
+        
+        if not isinstance(descriptors, list) or not all(isinstance(d, dict) for d in descriptors):
+            return jsonify({'error': 'sessions must be a JSON array of objects'}), 400
+        
+        count = max(len(files), len(descriptors))
+        if count == 0:
+            return jsonify({'error': 'No sessions provided'}), 400
+        if count > app.config['MAX_BATCH_SESSIONS']:
+            return jsonify({'error': f"At most {app.config['MAX_BATCH_SESSIONS']} sessions per batch"}), 400
+        
+        statuses = [None] * count
+        items = []
+        repeats = []
+        for index in range(count):
+            descriptor = descriptors[index] if index < len(descriptors) else {}
+            session_id = new_session_id()
+            
+            def field(name, form_name, default):
+                return descriptor.get(name, defaults.get(form_name, defaults.get(name, default)))
+            
+            inputs = {
+                'client_name': field('clientName', 'client_name', 'Test Client'),
+                'therapy_type': field('therapyType', 'therapy_type', 'CBT'),
+                'summary_format': field('summaryFormat', 'summary_format', 'SOAP'),
+                'transcript_note': "Simulated session data used for demonstration.",
+                'file_path': None,
+                'media': None
+            }
+            
+            if index < len(files):
+                try:
+                    upload = save_session_audio(files[index], session_id, user_id)
+                except (ValueError, OSError) as e:
+                    statuses[index] = {'index': index, 'sessionId': session_id, 'fileName': files[index].filename,
+                                       'status': 'rejected', 'error': str(e)}
+                    continue
+                inputs.update(transcript_note=upload['transcript_note'], file_path=upload['file_path'],
+                              media=upload['media'], content_sha256=upload['sha256'], file_size=upload['size'],
+                              file_name=upload['file_name'])
+                
+                # Identical requests, stored or earlier in this batch, are answered once
+                existing = reusable_session(upload, inputs)
+                if existing:
+                    blob_store.transfer(session_id, existing['session_id'])
+                    statuses[index] = {'index': index, 'sessionId': existing['session_id'],
+                                       'fileName': files[index].filename, 'status': 'duplicate',
+                                       'duplicateOf': existing['session_id']}
+                    continue
+                if app.config['DEDUP_POLICY'] == 'session':
+                    earlier_index = next((earlier_index for earlier_index, _, earlier in items
+                                          if earlier.get('content_sha256') == upload['sha256']
+                                          and all(earlier[k] == inputs[k] for k in ('client_name', 'therapy_type', 'summary_format'))),
+                                         None)
+                    if earlier_index is not None:
+                        # Resolved once the earlier item is processed, since it may still fail
+                        repeats.append((index, session_id, files[index].filename, earlier_index))
+                        continue
+            
+            items.append((index, session_id, inputs))
+        
+        if wants_async():
+            for index, session_id, inputs in items:
+                job_id = job_queue.enqueue({'session_id': session_id, 'user_id': user_id, 'inputs': inputs},
+                                           user_id=user_id, session_id=session_id)
+                statuses[index] = {'index': index, 'sessionId': session_id, 'status': 'queued',
+                                   'jobId': job_id, 'statusUrl': f'/api/therapy/jobs/{job_id}'}
+            status_code = 202
+        else:
+            results = process_session_batch(user_id, [(session_id, inputs) for _, session_id, inputs in items])
+            for (index, session_id, _), status in zip(items, results):
+                statuses[index] = dict(status, index=index)
+                if status['status'] == 'failed':
+                    # Never stored, so nothing else will drop its recording's reference
+                    blob_store.release(session_id)
+            status_code = 200
+        
+        # A repeat takes the outcome of the earlier item it repeats; that item holds the recording
+        for index, session_id, file_name, earlier_index in repeats:
+            blob_store.release(session_id)
+            earlier = statuses[earlier_index]
+            if earlier['status'] == 'failed':
+                statuses[index] = {'index': index, 'sessionId': session_id, 'fileName': file_name, 'status': 'failed',
+                                   'error': f"Identical to item {earlier_index}, which failed: {earlier['error']}"}
+            else:
+                statuses[index] = dict(earlier, index=index, fileName=file_name, status='duplicate',
+                                       duplicateOf=earlier['sessionId'])
+        
+        return jsonify({
+            'success': all(s['status'] in ('completed', 'queued', 'duplicate') for s in statuses),
+            'total': count,
+            'accepted': len(items),
+            'sessions': statuses
+        }), status_code
+        
+    except Exception as e:
+        logger.error(f"Batch session error: {e}")
+        return jsonify({'error': f'Batch processing failed: {str(e)}'}), 500
+
+@app.route('/api/therapy/sessions/<session_id>/note', methods=['GET'])
+@require_auth
+@require_active_user
+def get_session_note(session_id):
+    """Session note in another format (?format=SOAP|BIRP|DAP|Markdown|JSON|plain)"""
+    try:
+        summary_format = canonical_format(request.args.get('format', 'SOAP'))
+        if summary_format is None:
+            return jsonify({'error': f"Unsupported format: {request.args['format']}",
+                            'supportedFormats': SUPPORTED_FORMATS}), 400
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO therapy_sessions 
-                (session_id, user_id, client_name, therapy_type, summary_format, transcript, analysis, sentiment_analysis, validation_analysis, confidence_score, status, file_path)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (session_id, request.current_user['user_id'], client_name, therapy_type, summary_format, transcript_note,
-                  result['analysis'], json.dumps(result['sentimentAnalysis']), 
-                  result['validationAnalysis'], result['confidenceScore'], 'completed', file_path))
-            conn.commit()
+                SELECT client_name, therapy_type, created_at, note_ir FROM therapy_sessions
+                WHERE session_id = ? AND user_id = ?
+            ''', (session_id, request.current_user['user_id']))
+            session = cursor.fetchone()
+        
+        if not session:
+            return jsonify({'error': 'Session not found or access denied'}), 404
+        
+        note_ir = session['note_ir']
+        if not note_ir:
+            # Sessions analysed before structured notes were stored
+            note_ir = json.dumps(build_note_ir(session['client_name'], session['therapy_type'],
+                                               session['created_at'][:10]))
         
+        if summary_format == 'JSON':
+            return jsonify({'sessionId': session_id, 'format': 'JSON', 'note': json.loads(note_ir)})
         return jsonify({
-            'success': True,
             'sessionId': session_id,
-            'message': 'Session processed successfully',
-            **result
+            'format': summary_format,
+            'supportedFormats': SUPPORTED_FORMATS,
+            'note': render_session_note(session_id, summary_format, note_ir)
         })
+    except Exception as e:
+        logger.error(f"Session note error: {e}")
+        return jsonify({'error': 'Failed to render note'}), 500
+
+@app.route('/api/therapy/sessions/<session_id>/events/ticket', methods=['POST'])
+@require_auth
+@require_active_user
+def session_event_ticket(session_id):
+    """Single-use ticket for opening the session's event stream with EventSource"""
+    ticket = generate_stream_ticket(request.current_user['user_id'], session_id)
+    return jsonify({
+        'ticket': ticket,
+        'expiresIn': app.config['STREAM_TICKET_SECONDS'],
+        'streamUrl': f'/api/therapy/sessions/{session_id}/events?ticket={ticket}'
+    })
+
+@app.route('/api/therapy/sessions/<session_id>/events', methods=['GET'])
+@require_stream_ticket
+def session_event_stream(session_id):
+    """Server-Sent Events stream of a session's processing progress
+    
+    Clients that can send headers use the access token; EventSource asks
+    for a ticket first and passes it as ?ticket= (a new one for every
+    reconnect).
+    """
+    try:
+        owner = session_events.owner(session_id)
+        if owner is None:
+            # Not processed in this worker: check ownership and completion in the database
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT user_id FROM therapy_sessions WHERE session_id = ?
+                    UNION ALL
+                    SELECT user_id FROM processing_jobs WHERE session_id = ?
+                ''', (session_id, session_id))
+                row = cursor.fetchone()
+            owner = row['user_id'] if row else None
+            if owner == request.current_user['user_id']:
+                for event_type, data in lookup_finished_sessions([session_id]).values():
+                    session_events.publish(session_id, event_type, data, owner=owner)
         
+        if owner != request.current_user['user_id']:
+            return jsonify({'error': 'Session not found or access denied'}), 404
+        
+        return Response(session_events.stream(session_id), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     except Exception as e:
-        logger.error(f"Session creation error: {e}")
-        return jsonify({'error': f'Session processing failed: {str(e)}'}), 500
+        logger.error(f"Session event stream error: {e}")
+        return jsonify({'error': 'Failed to open event stream'}), 500
+
+@app.route('/api/therapy/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_job(job_id):
+    """Report the state of an asynchronous session job"""
+    try:
+        job = job_queue.get(job_id)
+        if not job or job['user_id'] != request.current_user['user_id']:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'jobId': job['id'],
+            'sessionId': job['session_id'],
+            'status': job['status'],
+            'attempts': job['attempts'],
+            'error': job['error'],
+            'createdAt': job['created_at'],
+            'updatedAt': job['updated_at'],
+            'finishedAt': job['finished_at'],
+            'result': job['result']
+        })
+    except Exception as e:
+        logger.error(f"Job status error: {e}")
+        return jsonify({'error': 'Failed to retrieve job'}), 500
 
 @app.route('/api/therapy/sessions', methods=['GET'])
 @require_auth
@@ -795,11 +1788,14 @@ def list_sessions():
             sessions = []
             for row in cursor.fetchall():
                 session = dict(row)
+                session.pop('note_ir', None)
                 if session['sentiment_analysis']:
                     try:
                         session['sentiment_analysis'] = json.loads(session['sentiment_analysis'])
                     except:
                         pass
+                if session['segments']:
+                    session['segments'] = json.loads(session['segments'])
                 sessions.append(session)
         
         return jsonify({
@@ -813,7 +1809,38 @@ def list_sessions():
 
 
 # Register file management routes
-add_file_management_routes(app, get_db, require_auth)
+add_file_management_routes(app, get_db, require_auth, blob_store, file_catalog, peaks_writer, analysis_pipeline)
+
+# Background services run once per process: gunicorn workers fork after import, and threads do not survive a fork
+_services_lock = threading.Lock()
+_services_pid = None
+
+def start_background_services():
+    """Initialize the database and start the reapers, collectors and job workers in this process"""
+    global _services_pid
+    if _services_pid == os.getpid():
+        return
+    with _services_lock:
+        if _services_pid == os.getpid():
+            return
+        init_database()
+        email_filter.build()
+        session_store.start_reaper()
+        idempotency_store.start_reaper()
+        upload_store.start_reaper()
+        blob_store.start_collector()
+        file_catalog.start_reconciler(interval=app.config['FILE_RECONCILE_MINUTES'] * 60)
+        job_queue.start()
+        reanalyzer.resume()
+        session_events.start_poller(lookup_finished_sessions)
+        _services_pid = os.getpid()
+        logger.info(f"Background services started in process {_services_pid}")
+
+@app.before_request
+def ensure_background_services():
+    # Tests drive the app without background threads
+    if not app.testing:
+        start_background_services()
 
 if __name__ == '__main__':
     print()
@@ -838,8 +1865,8 @@ if __name__ == '__main__':
     print("🔗 Local URL: http://localhost:8080")
     print()
     
-    # Initialize database
-    init_database()
+    # Initialize database and start background services
+    start_background_services()
     
     # Run the application on port 8080
     app.run(host='0.0.0.0', port=8080, debug=False)
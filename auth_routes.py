@@ -6,7 +6,7 @@ Complete Authentication & User Management API
 """
 
 from flask import Blueprint, request, jsonify, render_template_string
-from user_management import UserManager, require_auth, require_admin, require_active_user
+from user_management import UserManager, require_auth, require_admin, require_active_user, revocation_list
 import re
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -69,7 +69,9 @@ def login():
 def logout():
     """User logout endpoint"""
     try:
-        # In a full implementation, we would invalidate the session token
+        if request.current_user.get('jti'):
+            revocation_list.revoke(request.current_user['jti'], request.current_user['exp'],
+                                   request.current_user['user_id'])
         return jsonify({'success': True, 'message': 'Logged out successfully'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
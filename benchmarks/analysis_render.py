@@ -0,0 +1,36 @@
+"""
+Analysis Rendering Benchmark for WellTech AI MedSuite
+Per-call cost of generate_comprehensive_analysis with and without the render cache
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_engine import _render_analysis, generate_comprehensive_analysis  # noqa: E402
+from note_renderer import SUPPORTED_FORMATS  # noqa: E402
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time analysis rendering with and without the render cache')
+    parser.add_argument('--calls', type=int, default=20000, help='calls per measurement (default 20000)')
+    args = parser.parse_args()
+
+    today = time.strftime('%Y-%m-%d')
+    formats = [f for f in SUPPORTED_FORMATS if f != 'JSON']
+    uncached = per_call_us(lambda i: dict(_render_analysis.__wrapped__('Client', 'CBT', formats[i % len(formats)], today)),
+                           args.calls)
+    cached = per_call_us(lambda i: generate_comprehensive_analysis('Client', 'CBT', formats[i % len(formats)]),
+                         args.calls)
+    print(f"uncached render: {uncached:8.1f} us/call")
+    print(f"cached render:   {cached:8.1f} us/call ({uncached / cached:.0f}x)")
@@ -0,0 +1,52 @@
+"""
+Sentiment Scoring Benchmark for WellTech AI MedSuite
+Throughput of the lexicon scorer on a batch of transcripts, batched vs one at a time
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment_engine import LEXICON, NEGATORS, analyze_sentiment, score_transcripts  # noqa: E402
+
+FILLER = ('i', 'the', 'and', 'it', 'was', 'week', 'work', 'at', 'with', 'my', 'we', 'talked', 'about', 'that',
+          'really', 'just', 'so', 'then', 'home', 'family', 'day', 'thought', 'said', 'again')
+
+
+def make_transcripts(count, words, seed=0):
+    """Synthetic transcripts; about one word in seven is a lexicon or negator word"""
+    rng = random.Random(seed)
+    affect = list(LEXICON) + list(NEGATORS)
+    return [' '.join(rng.choice(affect) if rng.random() < 0.15 else rng.choice(FILLER) for _ in range(words))
+            for _ in range(count)]
+
+
+def timed(fn, transcripts):
+    started = time.perf_counter()
+    fn(transcripts)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time sentiment scoring of a batch of transcripts')
+    parser.add_argument('--batch', type=int, default=1000, help='transcripts per batch (default 1000)')
+    parser.add_argument('--words', type=int, default=1500, help='words per transcript (default 1500)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement; the best is kept (default 3)')
+    args = parser.parse_args()
+
+    transcripts = make_transcripts(args.batch, args.words)
+    measurements = [
+        ('scores, batched', score_transcripts),
+        ('scores, singly', lambda batch: [score_transcripts([text]) for text in batch]),
+        ('full, batched', analyze_sentiment),
+        ('full, singly', lambda batch: [analyze_sentiment([text]) for text in batch])
+    ]
+    # 'scores' is the vectorised pass alone; 'full' adds the sentimentAnalysis summaries
+    print(f"{args.batch} transcripts of {args.words} words")
+    for label, fn in measurements:
+        best = min(timed(fn, transcripts) for _ in range(args.repeat))
+        print(f"{label + ':':18s}{best * 1000:9.0f} ms  ({args.batch / best:8.0f} transcripts/s)")
@@ -0,0 +1,217 @@
+"""
+Blob Migration Module for WellTech AI MedSuite
+Moves recordings from the flat uploads directory into the blob store, online and throttled
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+from waveform import peaks_path
+from file_catalog import hash_file
+
+logger = logging.getLogger(__name__)
+
+
+def stage_file(source_path, target_path):
+    """Give a temp path beside target_path the content of source_path, ready for os.replace.
+
+    Hard-linked where the filesystem allows, copied otherwise; returns the
+    temp path.
+    """
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = f"{target_path}.{os.getpid()}.migrating"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copyfile(source_path, temp_path)
+    return temp_path
+
+
+class LegacyMigrator:
+    """Migrates therapy_sessions recordings saved outside the blob store.
+
+    Each file is hashed, then, in one write transaction, becomes (or joins)
+    its blob: the sessions sharing the file get blob references, their
+    file_path switches to the blob path, and the move is recorded in
+    blob_moves so BlobStore.resolve() still finds the recording from its
+    old path. The blob file is staged beside its blob path (hard link, or
+    a copy across filesystems) before that transaction starts and renamed
+    into place before it commits, so every committed path exists and no
+    copy runs under the write lock; the old file is only unlinked
+    afterwards. Files are processed in batches of
+    `batch_size`, at most `rate` per second, while the server keeps
+    running. An interrupted run is simply started again.
+    """
+
+    def __init__(self, get_db, blob_store, batch_size=50, rate=20.0):
+        self.get_db = get_db
+        self.blob_store = blob_store
+        self.batch_size = batch_size
+        self.rate = rate
+
+    def _legacy_rows(self, after_id, limit):
+        prefix = self.blob_store.root + os.sep
+        with self.get_db() as conn:
+            return conn.execute('''
+                SELECT id, file_path, file_name FROM therapy_sessions
+                WHERE id > ? AND file_path IS NOT NULL AND substr(file_path, 1, ?) != ?
+                ORDER BY id LIMIT ?
+            ''', (after_id, len(prefix), prefix, limit)).fetchall()
+
+    def pending(self):
+        """Sessions whose recording is still outside the blob store"""
+        prefix = self.blob_store.root + os.sep
+        with self.get_db() as conn:
+            return conn.execute('''
+                SELECT COUNT(*) FROM therapy_sessions
+                WHERE file_path IS NOT NULL AND substr(file_path, 1, ?) != ?
+            ''', (len(prefix), prefix)).fetchone()[0]
+
+    def migrate_file(self, old_path, file_name=None):
+        """Move one legacy recording into the blob store.
+
+        Returns 'migrated', 'missing' (no file on disk; the rows are left
+        for the reconciler) or 'unreferenced' (no session uses it any more).
+        """
+        if not os.path.exists(old_path):
+            return 'missing'
+        sha256, size = hash_file(old_path)
+        ext = os.path.splitext(file_name or old_path)[1]
+        target_path = self.blob_store.blob_path(sha256, ext)
+        staged = None if os.path.exists(target_path) else stage_file(old_path, target_path)
+        try:
+            blob_path = self._commit_move(old_path, sha256, size, target_path, staged)
+        finally:
+            if staged and os.path.exists(staged):
+                os.remove(staged)
+        if blob_path is None:
+            return 'unreferenced'
+
+        if self.blob_store.catalog:
+            self.blob_store.catalog.record(blob_path, sha256)
+        self._retire(old_path, blob_path)
+        return 'migrated'
+
+    def _commit_move(self, old_path, sha256, size, target_path, staged):
+        """Point the file's sessions at its blob in one write transaction; returns the blob path, or None if unused"""
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                sessions = [row[0] for row in conn.execute(
+                    'SELECT session_id FROM therapy_sessions WHERE file_path = ?', (old_path,))]
+                if not sessions:
+                    conn.execute('COMMIT')
+                    return None
+
+                conn.execute('''
+                    INSERT INTO blobs (sha256, path, size) VALUES (?, ?, ?)
+                    ON CONFLICT (sha256) DO NOTHING
+                ''', (sha256, target_path, size))
+                added = sum(conn.execute('INSERT OR IGNORE INTO blob_refs (session_id, sha256) VALUES (?, ?)',
+                                         (session_id, sha256)).rowcount for session_id in sessions)
+                conn.execute('UPDATE blobs SET refcount = refcount + ?, orphaned_at = NULL WHERE sha256 = ?',
+                             (added, sha256))
+                blob_path = conn.execute('SELECT path FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()[0]
+                conn.execute('INSERT OR REPLACE INTO blob_moves (old_path, sha256) VALUES (?, ?)', (old_path, sha256))
+                conn.execute('''
+                    UPDATE therapy_sessions
+                    SET file_path = ?, content_sha256 = COALESCE(content_sha256, ?), file_size = COALESCE(file_size, ?),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE file_path = ?
+                ''', (blob_path, sha256, size, old_path))
+
+                # Renamed in under the write lock, so the blob collector cannot remove it before the commit.
+                # An existing blob's path differs from target_path only by extension: same directory.
+                if not os.path.exists(blob_path):
+                    if staged is None:
+                        # Collected since the check before BEGIN; rare enough to stage under the lock
+                        staged = stage_file(old_path, target_path)
+                    os.replace(staged, blob_path)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return blob_path
+
+    def _retire(self, old_path, blob_path):
+        """Remove a migrated file from its old location, keeping its peaks if the blob has none"""
+        old_peaks = peaks_path(old_path)
+        if os.path.exists(old_peaks):
+            if os.path.exists(peaks_path(blob_path)):
+                os.remove(old_peaks)
+            else:
+                os.replace(old_peaks, peaks_path(blob_path))
+        if os.path.exists(old_path):
+            os.remove(old_path)
+        if self.blob_store.catalog:
+            self.blob_store.catalog.forget([old_path])
+        with self.get_db() as conn:
+            conn.execute('UPDATE blob_moves SET retired = 1 WHERE old_path = ?', (old_path,))
+            conn.commit()
+
+    def _retire_leftovers(self):
+        """Finish moves whose old file survived an interrupted run"""
+        with self.get_db() as conn:
+            rows = conn.execute('''
+                SELECT m.old_path, b.path FROM blob_moves m JOIN blobs b ON b.sha256 = m.sha256
+                WHERE m.retired = 0
+            ''').fetchall()
+        for old_path, blob_path in rows:
+            if os.path.exists(blob_path):
+                self._retire(old_path, blob_path)
+
+    def run(self, limit=None, progress=None):
+        """Migrate up to `limit` sessions' recordings (all by default); returns per-outcome counts"""
+        self._retire_leftovers()
+        counts = {'migrated': 0, 'missing': 0, 'unreferenced': 0, 'failed': 0}
+        last_id = 0
+        done = 0
+        while limit is None or done < limit:
+            started = time.monotonic()
+            rows = self._legacy_rows(last_id, self.batch_size if limit is None else min(self.batch_size, limit - done))
+            if not rows:
+                break
+            seen = set()
+            for row in rows:
+                if row['file_path'] in seen:
+                    continue
+                seen.add(row['file_path'])
+                try:
+                    counts[self.migrate_file(row['file_path'], row['file_name'])] += 1
+                except Exception as e:
+                    counts['failed'] += 1
+                    logger.error(f"Migration failed for {row['file_path']}: {e}")
+            last_id = rows[-1]['id']
+            done += len(rows)
+            if progress:
+                progress(counts)
+
+            # Throttle: a batch takes at least len(seen) / rate seconds
+            time.sleep(max(0.0, len(seen) / self.rate - (time.monotonic() - started)))
+        logger.info(f"Legacy migration: {counts}")
+        return counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Move flat uploads/ recordings into the blob store')
+    parser.add_argument('--batch-size', type=int, default=50, help='files per batch (default 50)')
+    parser.add_argument('--rate', type=float, default=20.0, help='maximum files per second (default 20)')
+    parser.add_argument('--limit', type=int, help='stop after this many sessions')
+    parser.add_argument('--status', action='store_true', help='only report how many sessions are left')
+    args = parser.parse_args()
+
+    from app import get_db, blob_store, init_database
+    init_database()
+    migrator = LegacyMigrator(get_db, blob_store, batch_size=args.batch_size, rate=args.rate)
+    print(f"{migrator.pending()} sessions with recordings outside the blob store")
+    if args.status:
+        sys.exit(0)
+    print(migrator.run(limit=args.limit, progress=lambda counts: print(counts, flush=True)))
+    print(f"{migrator.pending()} left")
@@ -0,0 +1,229 @@
+"""
+Blob Store Module for WellTech AI MedSuite
+Content-addressed recording storage with per-session reference counts
+"""
+
+import os
+import time
+import logging
+import threading
+from waveform import peaks_path
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """Recordings stored once per SHA-256 under hash-prefix directories.
+
+    A blob lives at <root>/ab/cd/<sha256><ext>. Each session holding a
+    recording has one row in blob_refs, and blobs.refcount counts them.
+    Releasing the last reference schedules the blob for collection
+    (orphaned_at); collect() deletes it after `grace_seconds`, unless a
+    new reference revived it in the meantime.
+
+    Writers take their reference before placing the file, and collect()
+    deletes files while holding the database write lock, so a blob being
+    written is never collected underneath its writer. Placed and collected
+    files are recorded in `catalog` (a FileCatalog), when given.
+    """
+
+    def __init__(self, get_db, root='uploads/blobs', grace_seconds=3600, catalog=None):
+        self.get_db = get_db
+        self.root = root
+        self.grace_seconds = grace_seconds
+        self.catalog = catalog
+        self._collector = None
+
+    def init_schema(self):
+        """Create the blobs and blob_refs tables if needed"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL DEFAULT 0,
+                    orphaned_at REAL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS blob_refs (
+                    session_id TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL REFERENCES blobs (sha256)
+                )
+            ''')
+            # Recordings moved in from the flat uploads directory (see blob_migration)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS blob_moves (
+                    old_path TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    retired INTEGER DEFAULT 0
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_blobs_orphaned ON blobs (orphaned_at) WHERE orphaned_at IS NOT NULL')
+            conn.commit()
+
+    def blob_path(self, sha256, ext=''):
+        """Where content with this hash is stored"""
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}{ext.lower()}")
+
+    def resolve(self, file_path):
+        """Current location of a stored file_path.
+
+        Callers hand over whatever path a row or job carries; a recording
+        since migrated into the blob store is found through blob_moves, so
+        paths captured before the migration keep working.
+        """
+        if not file_path or os.path.exists(file_path):
+            return file_path
+        with self.get_db() as conn:
+            row = conn.execute('''
+                SELECT b.path FROM blob_moves m JOIN blobs b ON b.sha256 = m.sha256 WHERE m.old_path = ?
+            ''', (file_path,)).fetchone()
+        return row[0] if row else file_path
+
+    def put(self, source_path, sha256, size, session_id, ext=''):
+        """Store a file under its hash and reference it from a session.
+
+        source_path is consumed: it is moved into place, or removed when
+        the blob already exists. Returns (blob_path, created).
+        """
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('''
+                    INSERT INTO blobs (sha256, path, size) VALUES (?, ?, ?)
+                    ON CONFLICT (sha256) DO NOTHING
+                ''', (sha256, self.blob_path(sha256, ext), size))
+                cursor = conn.execute('INSERT OR IGNORE INTO blob_refs (session_id, sha256) VALUES (?, ?)',
+                                      (session_id, sha256))
+                if cursor.rowcount:
+                    conn.execute('UPDATE blobs SET refcount = refcount + 1, orphaned_at = NULL WHERE sha256 = ?',
+                                 (sha256,))
+                path = conn.execute('SELECT path FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()[0]
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        # Referenced now, so the collector leaves the path alone
+        created = not os.path.exists(path)
+        if created:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(source_path, path)
+            except OSError:
+                self.release(session_id)
+                raise
+            logger.info(f"Blob stored: {path} ({size} bytes)")
+        else:
+            os.remove(source_path)
+        if self.catalog:
+            self.catalog.record(path, sha256)
+        return path, created
+
+    def release(self, session_id):
+        """Drop a session's reference; returns the blob's remaining refcount, or None if it had none"""
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT sha256 FROM blob_refs WHERE session_id = ?', (session_id,)).fetchone()
+                if not row:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute('DELETE FROM blob_refs WHERE session_id = ?', (session_id,))
+                conn.execute('''
+                    UPDATE blobs
+                    SET refcount = refcount - 1,
+                        orphaned_at = CASE WHEN refcount - 1 <= 0 THEN ? ELSE NULL END
+                    WHERE sha256 = ?
+                ''', (time.time(), row[0]))
+                refcount = conn.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (row[0],)).fetchone()[0]
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if refcount <= 0:
+            logger.info(f"Blob {row[0][:12]} unreferenced; collectable in {self.grace_seconds}s")
+        return refcount
+
+    def transfer(self, session_id, to_session_id):
+        """Hand a session's reference over to the session standing in for it.
+
+        Used when an upload duplicates an earlier session. If that session
+        already references a blob, the new reference is simply released; if
+        not (its file predates the blob store), it takes the reference over,
+        so the blob keeps a holder. Returns the blob's remaining refcount,
+        or None if session_id had no reference.
+        """
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT 1 FROM blob_refs WHERE session_id = ?', (to_session_id,)).fetchone():
+                    conn.execute('COMMIT')
+                    return self.release(session_id)
+                conn.execute('UPDATE blob_refs SET session_id = ? WHERE session_id = ?', (to_session_id, session_id))
+                row = conn.execute('SELECT b.refcount FROM blob_refs r JOIN blobs b ON b.sha256 = r.sha256 '
+                                   'WHERE r.session_id = ?', (to_session_id,)).fetchone()
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return row[0] if row else None
+
+    def collect(self, batch_size=100):
+        """Delete blobs unreferenced for longer than the grace period; returns the number removed"""
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute('''
+                    SELECT sha256, path FROM blobs
+                    WHERE orphaned_at IS NOT NULL AND orphaned_at < ? AND refcount <= 0
+                    LIMIT ?
+                ''', (time.time() - self.grace_seconds, batch_size)).fetchall()
+                for sha256, path in rows:
+                    conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                    for stale in (path, peaks_path(path)):
+                        if os.path.exists(stale):
+                            os.remove(stale)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if rows:
+            if self.catalog:
+                self.catalog.forget([path for _, path in rows])
+            logger.info(f"Blob collector removed {len(rows)} unreferenced blobs")
+        return len(rows)
+
+    def stats(self):
+        """Blob counts and sizes, for the admin dashboard"""
+        with self.get_db() as conn:
+            row = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount), 0),
+                       COALESCE(SUM(refcount <= 0), 0)
+                FROM blobs
+            ''').fetchone()
+        return {'blobs': row[0], 'bytes': row[1], 'references': row[2], 'orphaned': row[3]}
+
+    def start_collector(self, interval=600):
+        """Run collect every `interval` seconds on a daemon thread"""
+        if self._collector and self._collector.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    self.collect()
+                except Exception as e:
+                    logger.error(f"Blob collector error: {e}")
+                time.sleep(interval)
+
+        self._collector = threading.Thread(target=run, name='blob-collector', daemon=True)
+        self._collector.start()
@@ -0,0 +1,140 @@
+"""
+Email Filter Module for WellTech AI MedSuite
+Bloom filter of registered emails used to reject unknown logins early
+"""
+
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EmailBloomFilter:
+    """In-memory Bloom filter of every email in the users table.
+
+    A negative answer is definitive, so the login route can reject the
+    request without opening a database connection. Positives fall through
+    to the normal lookup. New rows are picked up incrementally by id and the
+    whole filter is rebuilt periodically so deleted accounts age out.
+    """
+
+    def __init__(self, get_db, capacity=100000, error_rate=0.001,
+                 refresh_interval=5, rebuild_interval=600):
+        self.get_db = get_db
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+
+        self._lock = threading.Lock()
+        # (bits, num_bits, num_hashes), swapped as one reference on rebuild
+        self._filter = None
+        self._last_user_id = 0
+        self._built_at = 0.0
+        self._refreshed_at = 0.0
+
+        # Moving average of real lookup latency, used to pad negatives
+        self._lookup_seconds = 0.002
+
+    def _size_for(self, count):
+        """Return (num_bits, num_hashes) for the expected number of emails"""
+        expected = max(self.capacity, count * 2, 1)
+        num_bits = int(math.ceil(-expected * math.log(self.error_rate) / (math.log(2) ** 2)))
+        num_bits = (num_bits + 7) // 8 * 8
+        num_hashes = max(1, int(round(num_bits / expected * math.log(2))))
+        return num_bits, num_hashes
+
+    def _positions(self, email, num_bits, num_hashes):
+        digest = hashlib.blake2b(email.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+    def _set(self, bloom, email):
+        bits, num_bits, num_hashes = bloom
+        for position in self._positions(email, num_bits, num_hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def build(self):
+        """Rebuild the filter from the users table"""
+        with self._lock:
+            self._build_locked()
+
+    def _build_locked(self):
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, email FROM users')
+            rows = cursor.fetchall()
+
+        num_bits, num_hashes = self._size_for(len(rows))
+        bits = bytearray(num_bits // 8)
+        last_user_id = 0
+        for row in rows:
+            self._set((bits, num_bits, num_hashes), row['email'])
+            last_user_id = max(last_user_id, row['id'])
+
+        self._filter = (bits, num_bits, num_hashes)
+        self._last_user_id = last_user_id
+        self._built_at = self._refreshed_at = time.monotonic()
+
+        logger.info(f"Email filter built: {len(rows)} emails, {num_bits // 8} bytes, {num_hashes} hashes")
+
+    def add(self, email):
+        """Record a newly registered email"""
+        with self._lock:
+            if self._filter is not None:
+                self._set(self._filter, email)
+
+    def _refresh(self):
+        """Pick up rows registered by other workers since the last refresh"""
+        now = time.monotonic()
+        if now - self._refreshed_at < self.refresh_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._built_at >= self.rebuild_interval:
+                self._build_locked()
+                return
+            with self.get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, email FROM users WHERE id > ?', (self._last_user_id,))
+                for row in cursor.fetchall():
+                    self._set(self._filter, row['email'])
+                    self._last_user_id = max(self._last_user_id, row['id'])
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def might_contain(self, email):
+        """Return False only if the email is definitely not registered"""
+        try:
+            if self._filter is None:
+                self.build()
+            else:
+                self._refresh()
+        except Exception as e:
+            # Fail open: the database lookup stays authoritative
+            logger.error(f"Email filter refresh error: {e}")
+            return True
+
+        bits, num_bits, num_hashes = self._filter
+        for position in self._positions(email, num_bits, num_hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def record_lookup(self, seconds):
+        """Feed the latency of a real user lookup into the moving average"""
+        self._lookup_seconds = 0.9 * self._lookup_seconds + 0.1 * seconds
+
+    def pad_response(self, started):
+        """Sleep so a rejected lookup takes as long as a real one"""
+        target = self._lookup_seconds * random.uniform(0.9, 1.1)
+        remaining = target - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
@@ -0,0 +1,165 @@
+"""
+File Catalog Module for WellTech AI MedSuite
+Size, mtime, hash and presence of stored recordings, kept in the database
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per hash update
+HASH_CHUNK_SIZE = 1024 * 1024
+
+CATALOG_FIELDS = ('path', 'size', 'mtime', 'sha256', 'present', 'checked_at')
+
+
+def hash_file(path):
+    """(sha256 hex digest, size) of a file"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class FileCatalog:
+    """What is on disk for each stored recording path, in the file_catalog table.
+
+    Writers record a file when they place it and forget it when they
+    remove it, so listings read sizes and presence from the database
+    instead of stat-ing every file. reconcile() corrects drift (files
+    removed, restored or changed behind the application's back) a batch
+    at a time, oldest check first, and catalogs session paths it has not
+    seen yet; a file is only re-hashed when its size or mtime changed.
+    """
+
+    def __init__(self, get_db):
+        self.get_db = get_db
+        self._reconciler = None
+
+    def init_schema(self):
+        """Create the file_catalog table and the session file_path index"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_catalog (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime REAL,
+                    sha256 TEXT,
+                    present INTEGER NOT NULL DEFAULT 1,
+                    checked_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_file_catalog_checked ON file_catalog (checked_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_therapy_sessions_file ON therapy_sessions (file_path)')
+            conn.commit()
+
+    def record(self, path, sha256):
+        """Catalog a file just written (or found) at path, whose content hash is known"""
+        stat = os.stat(path)
+        with self.get_db() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO file_catalog (path, size, mtime, sha256, present, checked_at)
+                VALUES (?, ?, ?, ?, 1, ?)
+            ''', (path, stat.st_size, stat.st_mtime, sha256, time.time()))
+            conn.commit()
+
+    def forget(self, paths):
+        """Drop removed files from the catalog"""
+        with self.get_db() as conn:
+            conn.executemany('DELETE FROM file_catalog WHERE path = ?', [(path,) for path in paths])
+            conn.commit()
+
+    def _inspect(self, path, known=None):
+        """Current catalog values for a path; only hashes when the file looks changed"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return (None, None, known['sha256'] if known else None, 0)
+        if known and known['present'] and (known['size'], known['mtime']) == (stat.st_size, stat.st_mtime):
+            return (stat.st_size, stat.st_mtime, known['sha256'], 1)
+        sha256, size = hash_file(path)
+        return (size, stat.st_mtime, sha256, 1)
+
+    def reconcile(self, batch_size=200, max_age=0):
+        """Check one batch not checked for `max_age` seconds; returns {'discovered', 'checked', 'drifted'}"""
+        now = time.time()
+        with self.get_db() as conn:
+            unseen = [row[0] for row in conn.execute('''
+                SELECT DISTINCT ts.file_path FROM therapy_sessions ts
+                LEFT JOIN file_catalog fc ON fc.path = ts.file_path
+                WHERE ts.file_path IS NOT NULL AND fc.path IS NULL
+                LIMIT ?
+            ''', (batch_size,))]
+            known = [dict(zip(CATALOG_FIELDS, row)) for row in conn.execute(f'''
+                SELECT {', '.join(CATALOG_FIELDS)} FROM file_catalog
+                WHERE checked_at <= ? ORDER BY checked_at LIMIT ?
+            ''', (now - max_age, batch_size))]
+
+        discovered = [(path, *self._inspect(path), now) for path in unseen]
+        checked = []
+        drifted = 0
+        for entry in known:
+            size, mtime, sha256, present = self._inspect(entry['path'], entry)
+            if (size, sha256, present) != (entry['size'], entry['sha256'], entry['present']):
+                drifted += 1
+                logger.warning(f"File catalog drift for {entry['path']}: "
+                               f"{'missing' if not present else f'{size} bytes, sha256 {sha256[:12]}'}")
+            checked.append((size, mtime, sha256, present, now, entry['path']))
+
+        with self.get_db() as conn:
+            # A concurrent writer's newer entry wins over this pass's
+            conn.executemany('''
+                INSERT INTO file_catalog (path, size, mtime, sha256, present, checked_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (path) DO NOTHING
+            ''', discovered)
+            conn.executemany('''
+                UPDATE file_catalog SET size = ?, mtime = ?, sha256 = ?, present = ?, checked_at = ?
+                WHERE path = ? AND checked_at <= ?
+            ''', [values + (now,) for values in checked])
+            conn.commit()
+
+        if discovered or drifted:
+            logger.info(f"File catalog: {len(discovered)} files discovered, {drifted} corrected")
+        return {'discovered': len(discovered), 'checked': len(checked), 'drifted': drifted}
+
+    def stats(self):
+        """Tracked and missing file counts, for the admin dashboard"""
+        with self.get_db() as conn:
+            row = conn.execute('SELECT COUNT(*), COALESCE(SUM(present = 0), 0), MIN(checked_at) FROM file_catalog').fetchone()
+        return {'files': row[0], 'missing': row[1],
+                'oldestCheckSeconds': round(time.time() - row[2]) if row[2] else None}
+
+    def start_reconciler(self, interval=900, batch_size=200, pause=1.0):
+        """Re-check every file about once per `interval` seconds on a daemon thread.
+
+        Each pass works through the files not checked for `interval`
+        seconds in batches, pausing `pause` seconds between batches.
+        """
+        if self._reconciler and self._reconciler.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    while True:
+                        result = self.reconcile(batch_size, max_age=interval)
+                        if result['checked'] < batch_size and result['discovered'] < batch_size:
+                            break
+                        time.sleep(pause)
+                except Exception as e:
+                    logger.error(f"File reconciler error: {e}")
+                time.sleep(interval)
+
+        self._reconciler = threading.Thread(target=run, name='file-reconciler', daemon=True)
+        self._reconciler.start()
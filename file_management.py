@@ -4,14 +4,31 @@ Handles file upload, download, and management
 """
 
 import os
+import hashlib
 import logging
+import secrets
 from flask import jsonify, send_from_directory, request
 from functools import wraps
+from waveform import peaks_path, PeaksWriter
+from upload_ingest import IngestFile
 
 logger = logging.getLogger(__name__)
 
-def add_file_management_routes(app, get_db, require_auth):
-    """Add file management routes to the Flask app"""
+# Bytes copied (and hashed) per read while saving an upload
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def add_file_management_routes(app, get_db, require_auth, blob_store=None, file_catalog=None, peaks_writer=None,
+                               analysis_pipeline=None):
+    """Add file management routes to the Flask app
+    
+    Recordings in blob_store are released rather than deleted; listings
+    read file sizes and presence from file_catalog's table. Missing
+    waveform peaks are queued on peaks_writer. Deleting a recording drops
+    the stage outputs analysis_pipeline kept from it.
+    """
+    # Stored paths go through the resolver, so the routes never depend on the storage layout
+    resolve = blob_store.resolve if blob_store else (lambda file_path: file_path)
+    peaks_writer = peaks_writer or PeaksWriter()
     
     @app.route('/api/files/<int:session_id>/download')
     @require_auth
@@ -21,7 +38,7 @@ def add_file_management_routes(app, get_db, require_auth):
             with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT file_path, client_name FROM therapy_sessions 
+                    SELECT file_path, file_name, client_name FROM therapy_sessions 
                     WHERE id = ? AND user_id = ?
                 ''', (session_id, request.current_user['user_id']))
                 session = cursor.fetchone()
@@ -29,49 +46,107 @@ def add_file_management_routes(app, get_db, require_auth):
                 if not session:
                     return jsonify({'error': 'Session not found or access denied'}), 404
                 
-                file_path = session['file_path']
+                file_path = resolve(session['file_path'])
                 if not file_path or not os.path.exists(file_path):
                     return jsonify({'error': 'File not found'}), 404
                 
                 return send_from_directory(
-                    os.path.dirname(file_path),
+                    os.path.dirname(os.path.abspath(file_path)),
                     os.path.basename(file_path),
                     as_attachment=True,
-                    download_name=f"{session['client_name']}_{os.path.basename(file_path)}"
+                    download_name=f"{session['client_name']}_{session['file_name'] or os.path.basename(file_path)}"
                 )
         except Exception as e:
             logger.error(f"File download error: {e}")
             return jsonify({'error': 'Download failed'}), 500
 
+    @app.route('/api/files/<int:session_id>/peaks')
+    @require_auth
+    def get_waveform_peaks(session_id):
+        """Serve the waveform peaks blob for a session's recording
+        
+        Answers 202 while the blob is still being written and 404 when the
+        recording's format has no peaks.
+        """
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT file_path FROM therapy_sessions 
+                    WHERE id = ? AND user_id = ?
+                ''', (session_id, request.current_user['user_id']))
+                session = cursor.fetchone()
+            
+            if not session:
+                return jsonify({'error': 'Session not found or access denied'}), 404
+            
+            file_path = resolve(session['file_path'])
+            if not file_path or not os.path.exists(file_path):
+                return jsonify({'error': 'File not found'}), 404
+            
+            # Peaks are written in the background after upload; older recordings are queued on first request
+            peaks_file = peaks_path(file_path)
+            if not os.path.exists(peaks_file):
+                if not peaks_writer.schedule(file_path):
+                    return jsonify({'error': 'Waveform not available for this format'}), 404
+                if not os.path.exists(peaks_file):
+                    return jsonify({'status': 'pending', 'message': 'Waveform is being prepared'}), 202, {'Retry-After': '2'}
+            
+            # Upload paths are unique, so the peaks never change for a given URL's file
+            response = send_from_directory(
+                os.path.dirname(os.path.abspath(peaks_file)),
+                os.path.basename(peaks_file),
+                mimetype='application/octet-stream',
+                max_age=365 * 24 * 3600
+            )
+            response.cache_control.public = False
+            response.cache_control.private = True
+            response.cache_control.immutable = True
+            return response
+        except Exception as e:
+            logger.error(f"Waveform peaks error: {e}")
+            return jsonify({'error': 'Failed to load waveform'}), 500
+
     @app.route('/api/files/list')
     @require_auth
     def list_files():
-        """List all uploaded files for the current user"""
+        """List all uploaded files for the current user
+        
+        Sizes and presence come from the file catalog, so listing touches no
+        files; fileExists is null for a file the reconciler has not seen yet.
+        """
         try:
             with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT id, session_id, client_name, file_path, created_at 
-                    FROM therapy_sessions 
-                    WHERE user_id = ? AND file_path IS NOT NULL
-                    ORDER BY created_at DESC
+                    SELECT ts.id, ts.session_id, ts.client_name, ts.file_path, ts.file_name, ts.created_at,
+                           ts.duration_seconds, ts.channels, ts.sample_rate, ts.codec,
+                           fc.size AS stored_size, fc.present
+                    FROM therapy_sessions ts
+                    LEFT JOIN file_catalog fc ON fc.path = ts.file_path
+                    WHERE ts.user_id = ? AND ts.file_path IS NOT NULL
+                    ORDER BY ts.created_at DESC
                 ''', (request.current_user['user_id'],))
                 sessions = cursor.fetchall()
                 
                 files = []
                 for session in sessions:
                     file_path = session['file_path']
-                    file_exists = os.path.exists(file_path) if file_path else False
-                    file_size = os.path.getsize(file_path) if file_exists else 0
+                    file_exists = bool(session['present']) if session['present'] is not None else None
+                    file_size = session['stored_size'] if file_exists else 0
                     
                     files.append({
                         'id': session['id'],
                         'sessionId': session['session_id'],
                         'clientName': session['client_name'],
-                        'fileName': os.path.basename(file_path) if file_path else None,
+                        'fileName': session['file_name'] or (os.path.basename(file_path) if file_path else None),
                         'fileSize': file_size,
                         'uploadDate': session['created_at'],
-                        'fileExists': file_exists
+                        'fileExists': file_exists,
+                        'durationSeconds': session['duration_seconds'],
+                        'channels': session['channels'],
+                        'sampleRate': session['sample_rate'],
+                        'codec': session['codec']
                     })
                 
                 return jsonify({'success': True, 'files': files})
@@ -87,7 +162,7 @@ def add_file_management_routes(app, get_db, require_auth):
             with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    SELECT file_path FROM therapy_sessions 
+                    SELECT session_id, file_path FROM therapy_sessions 
                     WHERE id = ? AND user_id = ?
                 ''', (session_id, request.current_user['user_id']))
                 session = cursor.fetchone()
@@ -96,9 +171,6 @@ def add_file_management_routes(app, get_db, require_auth):
                     return jsonify({'error': 'Session not found or access denied'}), 404
                 
                 file_path = session['file_path']
-                if file_path and os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"File deleted: {file_path}")
                 
                 # Update database to remove file_path
                 cursor.execute('''
@@ -108,6 +180,24 @@ def add_file_management_routes(app, get_db, require_auth):
                 ''', (session_id,))
                 conn.commit()
                 
+                if analysis_pipeline:
+                    analysis_pipeline.forget(session['session_id'])
+                
+                # Blobs are collected once their last reference is released
+                if blob_store and blob_store.release(session['session_id']) is not None:
+                    return jsonify({'success': True, 'message': 'File deleted successfully'})
+                
+                # Files saved before the blob store: shared duplicates go with their last session
+                cursor.execute('SELECT 1 FROM therapy_sessions WHERE file_path = ? LIMIT 1', (file_path,))
+                if file_path and not cursor.fetchone():
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                        logger.info(f"File deleted: {file_path}")
+                    if os.path.exists(peaks_path(file_path)):
+                        os.remove(peaks_path(file_path))
+                    if file_catalog:
+                        file_catalog.forget([file_path])
+                
                 return jsonify({'success': True, 'message': 'File deleted successfully'})
         except Exception as e:
             logger.error(f"File deletion error: {e}")
@@ -123,7 +213,8 @@ def save_uploaded_file(uploaded_file, user_id, upload_dir='uploads'):
         upload_dir: Directory to save files to
         
     Returns:
-        tuple: (file_path, file_info) or (None, error_message)
+        tuple: (file_path, file_info) or (None, error_message);
+        file_info['sha256'] is the content hash, computed as the file is written
     """
     try:
         from datetime import datetime
@@ -131,20 +222,36 @@ def save_uploaded_file(uploaded_file, user_id, upload_dir='uploads'):
         # Create uploads directory if it doesn't exist
         os.makedirs(upload_dir, exist_ok=True)
         
-        # Generate unique filename
+        # Generate unique filename (batch uploads can share a name within the same second)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safe_filename = f"{user_id}_{timestamp}_{uploaded_file.filename}"
+        safe_filename = f"{user_id}_{timestamp}_{secrets.token_hex(3)}_{uploaded_file.filename}"
         file_path = os.path.join(upload_dir, safe_filename)
         
-        # Save file to disk
-        uploaded_file.save(file_path)
-        file_size = os.path.getsize(file_path)
+        stream = uploaded_file.stream
+        if isinstance(stream, IngestFile) and os.path.samefile(os.path.dirname(stream.temp_path), upload_dir):
+            # Already streamed to disk (hashed and sized) while the request was parsed
+            stream.commit(file_path)
+            file_size, sha256 = stream.size, stream.sha256
+        else:
+            # Save file to disk, hashing each chunk on the way
+            digest = hashlib.sha256()
+            file_size = 0
+            with open(file_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    file_size += len(chunk)
+            sha256 = digest.hexdigest()
         
         file_info = {
             'original_name': uploaded_file.filename,
             'size': file_size,
             'type': uploaded_file.content_type,
-            'path': file_path
+            'path': file_path,
+            'sha256': sha256
         }
         
         logger.info(f"File saved: {file_path} ({file_size} bytes)")
@@ -155,3 +262,45 @@ def save_uploaded_file(uploaded_file, user_id, upload_dir='uploads'):
         logger.error(f"File save error: {e}")
         return None, str(e)
 
+def adopt_uploaded_file(source_path, original_name, user_id, upload_dir='uploads'):
+    """
+    Move a fully received upload (e.g. a resumable upload's part file) into
+    the uploads directory under the same naming scheme as save_uploaded_file
+    
+    The file is renamed rather than copied; it is read once for its hash.
+    
+    Returns:
+        tuple: (file_path, file_info) or (None, error_message)
+    """
+    try:
+        from datetime import datetime
+        
+        os.makedirs(upload_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        safe_filename = f"{user_id}_{timestamp}_{secrets.token_hex(3)}_{original_name}"
+        file_path = os.path.join(upload_dir, safe_filename)
+        
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            while True:
+                chunk = f.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+        os.replace(source_path, file_path)
+        
+        file_info = {
+            'original_name': original_name,
+            'size': os.path.getsize(file_path),
+            'type': None,
+            'path': file_path,
+            'sha256': digest.hexdigest()
+        }
+        
+        logger.info(f"File adopted: {source_path} -> {file_path} ({file_info['size']} bytes)")
+        
+        return file_path, file_info
+        
+    except Exception as e:
+        logger.error(f"File adopt error: {e}")
+        return None, str(e)
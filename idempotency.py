@@ -0,0 +1,205 @@
+"""
+Idempotency Module for WellTech AI MedSuite
+Idempotency-Key store: one execution per key, stored responses replayed
+"""
+
+import time
+import zlib
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+# How often a waiting duplicate re-checks the table (covers other processes)
+WAIT_POLL_SECONDS = 0.25
+
+
+def key_digest(key):
+    """Keys are stored as 16-byte digests, so the table stays fixed-width however long clients make them"""
+    return hashlib.sha256(key.encode()).digest()[:16]
+
+
+class IdempotencyStore:
+    """Responses of key-carrying requests in the idempotency_keys table.
+
+    The first request with a (user, key) pair claims it with an
+    in-progress row and runs; its response is then stored zlib-compressed
+    and replayed to every later request with that key until the TTL runs
+    out. Requests arriving while the first is still running wait for its
+    result rather than running again. A claim whose process died is
+    released once its lease expires. Keys are scoped per user, and reusing
+    a key for a different request body is refused.
+    """
+
+    def __init__(self, get_db, ttl_seconds=24 * 3600, lease_seconds=600):
+        self.get_db = get_db
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+
+        self._finished = {}
+        self._finished_lock = threading.Lock()
+        self._reaper = None
+
+    def init_schema(self):
+        """Create the idempotency_keys table if needed"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    user_id INTEGER NOT NULL,
+                    key_hash BLOB NOT NULL,
+                    fingerprint BLOB NOT NULL,
+                    status_code INTEGER,
+                    content_type TEXT,
+                    body BLOB,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, key_hash)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at)')
+            conn.commit()
+
+    def _event(self, user_id, key_hash):
+        with self._finished_lock:
+            return self._finished.setdefault((user_id, key_hash), threading.Event())
+
+    def _lookup(self, conn, user_id, key_hash, fingerprint, now):
+        """Outcome for a live row, or None when the key is free (absent or expired)"""
+        row = conn.execute('''
+            SELECT fingerprint, status_code, content_type, body, expires_at FROM idempotency_keys
+            WHERE user_id = ? AND key_hash = ?
+        ''', (user_id, key_hash)).fetchone()
+        if not row or row['expires_at'] < now:
+            return None
+        if row['fingerprint'] != fingerprint:
+            return 'mismatch', None
+        if row['status_code'] is None:
+            return 'in-progress', None
+        return 'replay', self._record(row)
+
+    def peek(self, user_id, key, fingerprint):
+        """begin()'s outcome without claiming: a plain read, None when the key is free"""
+        with self.get_db() as conn:
+            return self._lookup(conn, user_id, key_digest(key), fingerprint, time.time())
+
+    def begin(self, user_id, key, fingerprint):
+        """Claim a key for this request.
+
+        Returns ('claimed', None) when the caller should run the request,
+        ('replay', record) when a stored response exists, ('in-progress',
+        None) when another request holds the key, or ('mismatch', None)
+        when the key was used for a different request.
+        """
+        key_hash = key_digest(key)
+        now = time.time()
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                outcome = self._lookup(conn, user_id, key_hash, fingerprint, now)
+                if outcome:
+                    conn.execute('COMMIT')
+                    return outcome
+                conn.execute('''
+                    INSERT OR REPLACE INTO idempotency_keys (user_id, key_hash, fingerprint, expires_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, key_hash, fingerprint, now + self.lease_seconds))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        self._event(user_id, key_hash).clear()
+        return 'claimed', None
+
+    def complete(self, user_id, key, status_code, body, content_type):
+        """Store the claimed request's response for replay"""
+        key_hash = key_digest(key)
+        with self.get_db() as conn:
+            conn.execute('''
+                UPDATE idempotency_keys
+                SET status_code = ?, content_type = ?, body = ?, expires_at = ?
+                WHERE user_id = ? AND key_hash = ?
+            ''', (status_code, content_type, zlib.compress(body), time.time() + self.ttl_seconds,
+                  user_id, key_hash))
+            conn.commit()
+        self._event(user_id, key_hash).set()
+
+    def release(self, user_id, key):
+        """Drop a claim whose request failed, so a retry runs afresh"""
+        key_hash = key_digest(key)
+        with self.get_db() as conn:
+            conn.execute('''
+                DELETE FROM idempotency_keys
+                WHERE user_id = ? AND key_hash = ? AND status_code IS NULL
+            ''', (user_id, key_hash))
+            conn.commit()
+        self._event(user_id, key_hash).set()
+
+    def wait(self, user_id, key, fingerprint, timeout):
+        """Wait for the request holding a key to finish.
+
+        Returns begin()'s outcome once the key is no longer in progress
+        (a released key is claimed for the caller), or ('in-progress',
+        None) if it is still running after `timeout` seconds. Polls with
+        plain reads; the write lock is only taken to claim a free key.
+        """
+        key_hash = key_digest(key)
+        event = self._event(user_id, key_hash)
+        deadline = time.monotonic() + timeout
+        while True:
+            outcome = self.peek(user_id, key, fingerprint) or self.begin(user_id, key, fingerprint)
+            remaining = deadline - time.monotonic()
+            if outcome[0] != 'in-progress' or remaining <= 0:
+                return outcome
+            event.wait(min(WAIT_POLL_SECONDS, remaining))
+
+    def _record(self, row):
+        return {
+            'status_code': row['status_code'],
+            'content_type': row['content_type'],
+            'body': zlib.decompress(row['body'])
+        }
+
+    def reap_expired(self, batch_size=500, max_seconds=1.0):
+        """Delete expired keys in small batches; returns the number deleted"""
+        deadline = time.monotonic() + max_seconds
+        deleted = 0
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute('''
+                    DELETE FROM idempotency_keys WHERE (user_id, key_hash) IN (
+                        SELECT user_id, key_hash FROM idempotency_keys WHERE expires_at < ? LIMIT ?
+                    )
+                ''', (time.time(), batch_size))
+                conn.commit()
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size or time.monotonic() >= deadline:
+                    break
+
+        with self._finished_lock:
+            for pair in [p for p, event in self._finished.items() if event.is_set()]:
+                del self._finished[pair]
+
+        if deleted:
+            logger.info(f"Idempotency reaper removed {deleted} expired keys")
+        return deleted
+
+    def start_reaper(self, interval=300, batch_size=500, max_seconds=1.0):
+        """Run reap_expired every `interval` seconds on a daemon thread"""
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    self.reap_expired(batch_size, max_seconds)
+                except Exception as e:
+                    logger.error(f"Idempotency reaper error: {e}")
+                time.sleep(interval)
+
+        self._reaper = threading.Thread(target=run, name='idempotency-reaper', daemon=True)
+        self._reaper.start()
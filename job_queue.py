@@ -0,0 +1,191 @@
+"""
+Job Queue Module for WellTech AI MedSuite
+Durable SQLite-backed queue drained by a pool of worker threads
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Durable job queue in the processing_jobs table.
+
+    Workers claim a job by leasing it for `lease_seconds`, and renew the
+    lease every `heartbeat_seconds` (a quarter of the lease by default)
+    for as long as the handler runs, so a long job is never claimed
+    twice. A job whose lease runs out (the process died or was restarted
+    mid-job) becomes claimable again, so in-flight work survives restarts
+    and can be picked up by any process sharing the database. Failed jobs
+    are retried up to `max_attempts` times.
+    """
+
+    def __init__(self, get_db, handler, workers=2, lease_seconds=600, poll_interval=2, max_attempts=3,
+                 heartbeat_seconds=None):
+        self.get_db = get_db
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds or lease_seconds / 4
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def init_schema(self):
+        """Create the processing_jobs table if needed"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS processing_jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER,
+                    session_id TEXT,
+                    payload TEXT NOT NULL,
+                    status TEXT DEFAULT 'queued',
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    lease_expires_at REAL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_processing_jobs_status ON processing_jobs (status, created_at)')
+            conn.commit()
+
+    def enqueue(self, payload, user_id=None, session_id=None):
+        """Persist a job and wake a worker; returns the job id"""
+        job_id = uuid.uuid4().hex
+        with self.get_db() as conn:
+            conn.execute('''
+                INSERT INTO processing_jobs (id, user_id, session_id, payload)
+                VALUES (?, ?, ?, ?)
+            ''', (job_id, user_id, session_id, json.dumps(payload)))
+            conn.commit()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Job record as a dict, or None"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, user_id, session_id, status, result, error, attempts,
+                       created_at, updated_at, finished_at
+                FROM processing_jobs WHERE id = ?
+            ''', (job_id,))
+            row = cursor.fetchone()
+        if not row:
+            return None
+        job = dict(zip(('id', 'user_id', 'session_id', 'status', 'result', 'error', 'attempts',
+                        'created_at', 'updated_at', 'finished_at'), row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def _claim(self):
+        """Lease the oldest runnable job; returns (job_id, payload, attempts) or None"""
+        now = time.time()
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('''
+                    SELECT id, payload, attempts FROM processing_jobs
+                    WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)
+                    ORDER BY created_at LIMIT 1
+                ''', (now,)).fetchone()
+                if not row:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute('''
+                    UPDATE processing_jobs
+                    SET status = 'running', attempts = attempts + 1, lease_expires_at = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (now + self.lease_seconds, row[0]))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def _renew(self, job_id):
+        """Extend a running job's lease; returns False if the job is no longer running"""
+        with self.get_db() as conn:
+            cursor = conn.execute('''
+                UPDATE processing_jobs SET lease_expires_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running'
+            ''', (time.time() + self.lease_seconds, job_id))
+            conn.commit()
+        return cursor.rowcount == 1
+
+    def _heartbeat(self, job_id, stop):
+        while not stop.wait(self.heartbeat_seconds):
+            try:
+                if not self._renew(job_id):
+                    return
+            except Exception as e:
+                logger.error(f"Lease renewal error for job {job_id}: {e}")
+
+    def _run(self, job_id, payload, attempts):
+        """Run a claimed job's handler, keeping its lease alive, and record the outcome"""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stop),
+                                     name=f'job-heartbeat-{job_id[:8]}', daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handler(payload)
+        except Exception as e:
+            status = 'queued' if attempts < self.max_attempts else 'failed'
+            logger.error(f"Job {job_id} attempt {attempts} failed: {e}")
+            self._finish(job_id, status, error=str(e))
+        else:
+            self._finish(job_id, 'completed', result=result)
+        finally:
+            # A renewal racing _finish matches no row once the job has left 'running'
+            stop.set()
+            heartbeat.join()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self.get_db() as conn:
+            conn.execute('''
+                UPDATE processing_jobs
+                SET status = ?, result = ?, error = ?, lease_expires_at = NULL,
+                    updated_at = CURRENT_TIMESTAMP,
+                    finished_at = CASE WHEN ? IN ('completed', 'failed') THEN CURRENT_TIMESTAMP END
+                WHERE id = ?
+            ''', (status, json.dumps(result) if result is not None else None, error, status, job_id))
+            conn.commit()
+
+    def _work(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                logger.error(f"Job claim error: {e}")
+                claimed = None
+
+            if not claimed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(*claimed)
+
+    def start(self):
+        """Start the worker threads"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Job queue started with {self.workers} workers")
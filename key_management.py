@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Key Management Module for WellTech AI MedSuite
+Shared JWT signing keyring with key ids and rotation
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import secrets
+import threading
+import jwt
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEYRING_FILE = 'jwt_keyring.json'
+
+
+def _new_kid():
+    return datetime.utcnow().strftime('%Y%m%d') + '-' + secrets.token_hex(4)
+
+
+def _write_keyring(path, keyring, replace=True):
+    """Write the keyring through a temp file so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(keyring, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        if replace:
+            os.replace(tmp_path, path)
+        else:
+            # Fails if another worker created the keyring first
+            os.link(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def create_keyring(path, initial_secret=None):
+    """Create a keyring with one active key unless one already exists"""
+    kid = _new_kid()
+    keyring = {
+        'active': kid,
+        'keys': {
+            kid: {
+                'secret': initial_secret or secrets.token_hex(32),
+                'created_at': datetime.utcnow().isoformat()
+            }
+        }
+    }
+    try:
+        _write_keyring(path, keyring, replace=False)
+        logger.info(f"Created JWT keyring {path} with key {kid}")
+    except FileExistsError:
+        pass
+
+
+def rotate_keyring(path, retire_after=timedelta(days=2)):
+    """Add a new active key and drop keys older than `retire_after`.
+
+    The previous active key stays in the ring so tokens it signed keep
+    verifying; `retire_after` must exceed the longest token lifetime.
+    """
+    with open(path) as f:
+        keyring = json.load(f)
+
+    kid = _new_kid()
+    now = datetime.utcnow()
+    keyring['keys'][kid] = {'secret': secrets.token_hex(32), 'created_at': now.isoformat()}
+    previous = keyring.get('active')
+    keyring['active'] = kid
+
+    for old_kid, key in list(keyring['keys'].items()):
+        if old_kid in (kid, previous):
+            continue
+        if datetime.fromisoformat(key['created_at']) < now - retire_after:
+            del keyring['keys'][old_kid]
+
+    _write_keyring(path, keyring)
+    logger.info(f"Rotated JWT keyring {path}: active key {kid}, {len(keyring['keys'])} keys")
+    return kid
+
+
+class KeyRing:
+    """JWT signer/verifier backed by a keyring file shared by all workers.
+
+    Every token header carries the `kid` of the key that signed it, and all
+    keys in the file verify, so a token minted by any worker or node that
+    shares the file verifies everywhere. The parsed keys are cached per
+    process and reloaded when the file's mtime changes.
+    """
+
+    def __init__(self, path=DEFAULT_KEYRING_FILE, legacy_secret=None, reload_interval=5):
+        self.path = path
+        self.legacy_secret = legacy_secret
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._active_kid = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _load(self, force=False):
+        if not force and time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if not os.path.exists(self.path):
+                create_keyring(self.path, self.legacy_secret)
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self._mtime:
+                with open(self.path) as f:
+                    keyring = json.load(f)
+                self._keys = {kid: key['secret'] for kid, key in keyring['keys'].items()}
+                self._active_kid = keyring['active']
+                self._mtime = mtime
+                logger.info(f"Loaded JWT keyring: active key {self._active_kid}, {len(self._keys)} keys")
+            self._checked_at = time.monotonic()
+
+    def encode(self, payload):
+        """Sign a payload with the active key"""
+        self._load()
+        kid = self._active_kid
+        return jwt.encode(payload, self._keys[kid], algorithm='HS256', headers={'kid': kid})
+
+    def decode(self, token):
+        """Verify a token against the key named in its header.
+
+        Raises jwt.InvalidTokenError (or a subclass) if the token is invalid.
+        """
+        self._load()
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            if not self.legacy_secret:
+                raise jwt.InvalidTokenError('Token has no key id')
+            key = self.legacy_secret
+        else:
+            key = self._keys.get(kid)
+            if key is None:
+                # Another worker may have rotated the keyring since our last check
+                self._load(force=True)
+                key = self._keys.get(kid)
+            if key is None:
+                raise jwt.InvalidTokenError(f'Unknown key id: {kid}')
+        return jwt.decode(token, key, algorithms=['HS256'])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    keyring_path = os.environ.get('JWT_KEYRING_FILE', DEFAULT_KEYRING_FILE)
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('init', 'rotate'):
+        print(f"Usage: {sys.argv[0]} init|rotate  (keyring: {keyring_path})")
+        sys.exit(1)
+
+    if sys.argv[1] == 'init':
+        create_keyring(keyring_path, os.environ.get('JWT_SECRET_KEY'))
+    else:
+        print(rotate_keyring(keyring_path))
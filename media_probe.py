@@ -0,0 +1,404 @@
+"""
+Media Probe Module for WellTech AI MedSuite
+Magic-byte validation and header parsing for uploaded session recordings
+"""
+
+import os
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start of an upload to identify it
+PROBE_BYTES = 64 * 1024
+
+# Largest MP4 'moov' box we are willing to read for metadata
+MAX_MOOV_BYTES = 16 * 1024 * 1024
+
+# Container formats each accepted extension may contain
+EXTENSION_FORMATS = {
+    '.wav': 'wav',
+    '.mp3': 'mp3',
+    '.m4a': 'mp4',
+    '.mp4': 'mp4',
+    '.webm': 'webm',
+    '.ogg': 'ogg'
+}
+
+
+class MediaProbeError(ValueError):
+    """Upload is not a recognizable recording or does not match its extension"""
+
+
+def _media(format_name, codec=None, duration=None, channels=None, sample_rate=None):
+    return {
+        'format': format_name,
+        'codec': codec,
+        'durationSeconds': round(duration, 3) if duration is not None else None,
+        'channels': channels,
+        'sampleRate': sample_rate
+    }
+
+
+def sniff_format(head):
+    """Container format from magic bytes, or None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[4:8] == b'ftyp':
+        return 'mp4'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    return None
+
+
+def _probe_wav(stream, head, size):
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(head):
+        chunk_id = head[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', head, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            if chunk_size < 16 or body + 16 > len(head):
+                raise MediaProbeError('Corrupt WAV header')
+            fmt = struct.unpack_from('<HHIIHH', head, body)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise MediaProbeError('Corrupt WAV header: data before fmt')
+            audio_format, channels, sample_rate, byte_rate, _, bits = fmt
+            if not channels or not sample_rate or not byte_rate:
+                raise MediaProbeError('Corrupt WAV header')
+            # Streaming writers leave the size as 0 or 0xFFFFFFFF
+            data_size = chunk_size
+            if size is not None and (data_size in (0, 0xFFFFFFFF) or body + data_size > size):
+                data_size = size - body
+            if audio_format == 1:
+                codec = 'pcm_u8' if bits == 8 else f'pcm_s{bits}le'
+            elif audio_format == 3:
+                codec = f'pcm_f{bits}le'
+            else:
+                codec = f'wav_0x{audio_format:04x}'
+            return _media('wav', codec, data_size / byte_rate, channels, sample_rate)
+        offset = body + chunk_size + (chunk_size & 1)
+    raise MediaProbeError('Corrupt WAV header: no data chunk')
+
+
+_MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+_MP3_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+
+def _mp3_frame(head, offset):
+    """Parse an MPEG audio frame header; returns a dict or None"""
+    if offset + 4 > len(head):
+        return None
+    b1, b2, b3 = head[offset + 1], head[offset + 2], head[offset + 3]
+    if head[offset] != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version = {3: 1, 2: 2, 0: 2.5}.get((b1 >> 3) & 3)
+    layer = {3: 1, 2: 2, 1: 3}.get((b1 >> 1) & 3)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        length, samples = (12 * bitrate // sample_rate + padding) * 4, 384
+    elif layer == 3 and version != 1:
+        length, samples = 72 * bitrate // sample_rate + padding, 576
+    else:
+        length, samples = 144 * bitrate // sample_rate + padding, 1152
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'channels': 1 if b3 >> 6 == 3 else 2, 'length': length, 'samples': samples}
+
+
+def _probe_mp3(stream, head, size):
+    start = 0
+    if head[:3] == b'ID3':
+        # ID3v2 size is syncsafe; embedded artwork can push audio past the probe window
+        tag_size = 10 + ((head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | head[9] & 0x7F)
+        stream.seek(tag_size)
+        head = stream.read(PROBE_BYTES)
+        start = tag_size
+
+    for offset in range(min(len(head) - 4, 4096)):
+        frame = _mp3_frame(head, offset)
+        if frame is None:
+            continue
+        # Require a second frame right behind the first to rule out a false sync
+        following = offset + frame['length']
+        if following + 4 <= len(head):
+            if _mp3_frame(head, following) is None:
+                continue
+        elif len(head) < PROBE_BYTES and following != len(head):
+            # Whole file is in view and the frame does not end where the file does
+            continue
+        break
+    else:
+        raise MediaProbeError('Corrupt MP3: no audio frames found')
+
+    duration = None
+    mono = frame['channels'] == 1
+    xing = offset + 4 + ((17 if mono else 32) if frame['version'] == 1 else (9 if mono else 17))
+    if head[xing:xing + 4] in (b'Xing', b'Info') and head[xing + 7] & 1:
+        frames = struct.unpack_from('>I', head, xing + 8)[0]
+        duration = frames * frame['samples'] / frame['sample_rate']
+    elif head[offset + 36:offset + 40] == b'VBRI':
+        frames = struct.unpack_from('>I', head, offset + 50)[0]
+        duration = frames * frame['samples'] / frame['sample_rate']
+    elif size is not None:
+        duration = (size - start - offset) * 8 / frame['bitrate']
+
+    codec = {1: 'mp1', 2: 'mp2', 3: 'mp3'}[frame['layer']]
+    return _media('mp3', codec, duration, frame['channels'], frame['sample_rate'])
+
+
+def _mp4_boxes(data, offset=0, end=None):
+    """Yield (type, body_start, body_end) for the boxes in data[offset:end]"""
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if box_size == 1:
+            if offset + 16 > end:
+                return
+            box_size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header:
+            raise MediaProbeError('Corrupt MP4 box structure')
+        yield box_type, offset + header, min(offset + box_size, end)
+        offset += box_size
+
+
+def _mp4_find(data, path, offset=0, end=None):
+    """Body bounds of the first box along a path of nested box types"""
+    for box_type, body, box_end in _mp4_boxes(data, offset, end):
+        if box_type == path[0]:
+            return (body, box_end) if len(path) == 1 else _mp4_find(data, path[1:], body, box_end)
+    return None
+
+
+def _probe_mp4(stream, head, size):
+    # Walk top-level boxes by seeking; 'moov' often sits after the media data
+    offset = 0
+    moov = None
+    while size is None or offset + 8 <= size:
+        stream.seek(offset)
+        header = stream.read(16)
+        if len(header) < 8:
+            break
+        box_size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if box_size == 1 and len(header) == 16:
+            box_size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif box_size == 0 and size is not None:
+            box_size = size - offset
+        if box_size < header_size:
+            raise MediaProbeError('Corrupt MP4 box structure')
+        if box_type == b'moov':
+            if box_size > MAX_MOOV_BYTES:
+                raise MediaProbeError('MP4 metadata too large')
+            stream.seek(offset + header_size)
+            moov = stream.read(box_size - header_size)
+            break
+        offset += box_size
+
+    if moov is None:
+        raise MediaProbeError('Corrupt MP4: no moov box')
+
+    duration = None
+    mvhd = _mp4_find(moov, [b'mvhd'])
+    if mvhd:
+        body = mvhd[0]
+        if moov[body] == 1:
+            timescale, length = struct.unpack_from('>IQ', moov, body + 20)
+        else:
+            timescale, length = struct.unpack_from('>II', moov, body + 12)
+        duration = length / timescale if timescale else None
+
+    for box_type, body, box_end in _mp4_boxes(moov):
+        if box_type != b'trak':
+            continue
+        hdlr = _mp4_find(moov, [b'mdia', b'hdlr'], body, box_end)
+        if not hdlr or moov[hdlr[0] + 8:hdlr[0] + 12] != b'soun':
+            continue
+        stsd = _mp4_find(moov, [b'mdia', b'minf', b'stbl', b'stsd'], body, box_end)
+        if not stsd or stsd[0] + 44 > len(moov):
+            break
+        # Full box header and entry count, then the first sample entry
+        entry = stsd[0] + 8
+        fourcc = moov[entry + 4:entry + 8].decode('latin-1')
+        channels, = struct.unpack_from('>H', moov, entry + 24)
+        sample_rate = struct.unpack_from('>I', moov, entry + 32)[0] >> 16
+        codec = {'mp4a': 'aac', 'Opus': 'opus', 'fLaC': 'flac'}.get(fourcc, fourcc.strip().lower())
+        return _media('mp4', codec, duration, channels, sample_rate)
+
+    return _media('mp4', None, duration)
+
+
+def _probe_ogg(stream, head, size):
+    segments = head[26] if len(head) > 26 else 0
+    packet = head[27 + segments:]
+    if packet[:7] == b'\x01vorbis' and len(packet) >= 16:
+        codec, channels, sample_rate = 'vorbis', packet[11], struct.unpack_from('<I', packet, 12)[0]
+        granule_rate, pre_skip = sample_rate, 0
+    elif packet[:8] == b'OpusHead' and len(packet) >= 16:
+        codec, channels = 'opus', packet[9]
+        pre_skip, sample_rate = struct.unpack_from('<HI', packet, 10)
+        granule_rate = 48000
+    elif packet[:5] == b'\x7fFLAC':
+        return _media('ogg', 'flac')
+    else:
+        raise MediaProbeError('Corrupt or unsupported Ogg stream')
+
+    # The last page's granule position is the stream length in samples
+    duration = None
+    if size is not None and granule_rate:
+        tail_start = max(0, size - PROBE_BYTES)
+        stream.seek(tail_start)
+        tail = stream.read(PROBE_BYTES)
+        last_page = tail.rfind(b'OggS')
+        if last_page != -1 and last_page + 14 <= len(tail):
+            granule = struct.unpack_from('<q', tail, last_page + 6)[0]
+            if granule > 0:
+                duration = max(0, granule - pre_skip) / granule_rate
+    return _media('ogg', codec, duration, channels, sample_rate or None)
+
+
+# Matroska element ids that are descended into rather than skipped
+_EBML_MASTERS = {0x1A45DFA3, 0x18538067, 0x1549A966, 0x1654AE6B, 0xAE, 0xE1}
+_EBML_CLUSTER = 0x1F43B675
+
+
+def _ebml_vint(data, offset, keep_marker):
+    first = data[offset]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise MediaProbeError('Corrupt WebM header')
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+
+def _probe_webm(stream, head, size):
+    info = {'scale': 1000000}
+    offset = 0
+    while offset < len(head):
+        element_id, id_length, _ = _ebml_vint(head, offset, True)
+        if element_id == _EBML_CLUSTER:
+            break
+        data_size, size_length, unknown = _ebml_vint(head, offset + id_length, False)
+        body = offset + id_length + size_length
+        if element_id in _EBML_MASTERS or unknown:
+            offset = body
+            continue
+        if body + data_size > len(head):
+            break
+        value = head[body:body + data_size]
+        if element_id == 0x4282:
+            info['doctype'] = value.decode('latin-1')
+        elif element_id == 0x2AD7B1:
+            info['scale'] = int.from_bytes(value, 'big')
+        elif element_id == 0x4489:
+            info['duration'] = struct.unpack('>f' if data_size == 4 else '>d', value)[0]
+        elif element_id == 0x86 and value.startswith(b'A_') and 'codec' not in info:
+            info['codec'] = value.decode('latin-1')
+        elif element_id == 0x9F and 'channels' not in info:
+            info['channels'] = int.from_bytes(value, 'big')
+        elif element_id == 0xB5 and 'sample_rate' not in info:
+            info['sample_rate'] = int(struct.unpack('>f' if data_size == 4 else '>d', value)[0])
+        offset = body + data_size
+
+    if info.get('doctype') not in ('webm', 'matroska'):
+        raise MediaProbeError('Corrupt WebM header')
+    # Browser MediaRecorder output usually has no Duration element
+    duration = info['duration'] * info['scale'] / 1e9 if 'duration' in info else None
+    codec = info['codec'][2:].lower() if 'codec' in info else None
+    return _media('webm', codec, duration, info.get('channels'), info.get('sample_rate'))
+
+
+_PROBES = {
+    'wav': _probe_wav,
+    'mp3': _probe_mp3,
+    'mp4': _probe_mp4,
+    'ogg': _probe_ogg,
+    'webm': _probe_webm
+}
+
+
+def probe_stream(stream, size=None):
+    """Identify and parse a recording from a seekable binary stream.
+
+    Reads the first PROBE_BYTES plus, where the container keeps metadata
+    elsewhere (MP4 'moov', Ogg last page, large ID3 tags), a few seeks'
+    worth more. The stream is left at position 0. Returns a dict with
+    'format', 'codec', 'durationSeconds', 'channels' and 'sampleRate';
+    fields the container does not record are None. Raises
+    MediaProbeError for unrecognized or corrupt files.
+    """
+    stream.seek(0)
+    head = stream.read(PROBE_BYTES)
+    try:
+        format_name = sniff_format(head)
+        if format_name is None:
+            raise MediaProbeError('Unrecognized media file')
+        try:
+            return _PROBES[format_name](stream, head, size)
+        except (struct.error, IndexError, UnicodeDecodeError, ZeroDivisionError):
+            raise MediaProbeError(f'Corrupt {format_name.upper()} header')
+    finally:
+        stream.seek(0)
+
+
+def check_extension(media, file_name):
+    """Raise MediaProbeError when probed content contradicts the file extension"""
+    extension = os.path.splitext(file_name)[1].lower()
+    expected = EXTENSION_FORMATS.get(extension)
+    if expected is not None and media['format'] != expected:
+        raise MediaProbeError(f"File content is {media['format'].upper()}, which does not match extension {extension}")
+    return media
+
+
+def screen_head(head, file_name):
+    """Raise MediaProbeError unless an upload's first bytes look like the recording its name claims.
+
+    Needs only the magic bytes, so an upload can be turned away while it
+    is still arriving; probe_stream still checks the whole header later.
+    """
+    format_name = sniff_format(head)
+    if format_name is None:
+        raise MediaProbeError('Unrecognized media file')
+    return check_extension(_media(format_name), file_name)['format']
+
+
+def probe_upload(uploaded_file):
+    """Probe a werkzeug FileStorage and check its content matches its extension"""
+    stream = uploaded_file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    return check_extension(probe_stream(stream, size), uploaded_file.filename)
+
+
+def probe_file(path, file_name):
+    """Probe a recording on disk, checking it against the name it was uploaded under"""
+    with open(path, 'rb') as f:
+        return check_extension(probe_stream(f, os.path.getsize(path)), file_name)
@@ -0,0 +1,163 @@
+"""
+Note Renderer Module for WellTech AI MedSuite
+Renders one structured session note as SOAP, BIRP, DAP, Markdown, JSON or plain text
+"""
+
+import json
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+NOTE_IR_VERSION = 1
+
+# Rendered variants kept per (session, format, note)
+NOTE_CACHE_SIZE = 2048
+
+# Clinical formats: (heading, IR fields joined as paragraphs) in note order
+CLINICAL_SECTIONS = {
+    'SOAP': (
+        ('SUBJECTIVE', ('presentation',)),
+        ('OBJECTIVE', ('observations',)),
+        ('ASSESSMENT', ('assessment',)),
+        ('PLAN', ('plan',))
+    ),
+    'BIRP': (
+        ('BEHAVIOR', ('presentation', 'observations')),
+        ('INTERVENTION', ('interventions',)),
+        ('RESPONSE', ('response',)),
+        ('PLAN', ('plan',))
+    ),
+    'DAP': (
+        ('DATA', ('presentation', 'observations')),
+        ('ASSESSMENT', ('assessment',)),
+        ('PLAN', ('plan',))
+    )
+}
+
+# Document formats show every section of the note
+DOCUMENT_SECTIONS = (
+    ('Presentation', 'presentation'),
+    ('Observations', 'observations'),
+    ('Interventions', 'interventions'),
+    ('Response', 'response'),
+    ('Assessment', 'assessment'),
+    ('Plan', 'plan'),
+    ('Clinical Notes', 'clinicalNotes')
+)
+
+FORMAT_ALIASES = {
+    'MD': 'MARKDOWN',
+    'TEXT': 'PLAIN',
+    'TXT': 'PLAIN'
+}
+
+SUPPORTED_FORMATS = ('SOAP', 'BIRP', 'DAP', 'Markdown', 'JSON', 'plain')
+
+
+def canonical_format(summary_format):
+    """The SUPPORTED_FORMATS name for a format, matched case-insensitively with aliases, or None"""
+    key = (summary_format or '').strip().upper()
+    key = FORMAT_ALIASES.get(key, key)
+    return next((name for name in SUPPORTED_FORMATS if name.upper() == key), None)
+
+
+def _field(ir, name):
+    value = ir[name]
+    if isinstance(value, (list, tuple)):
+        return '\n'.join(f"{i}. {item}" for i, item in enumerate(value, 1))
+    return value
+
+
+def _bullets(items):
+    return '\n'.join(f"• {item}" for item in items)
+
+
+def _sentiment_lines(sentiment, bold):
+    def label(text):
+        return f"**{text}:**" if bold else f"{text}:"
+
+    return [
+        f"{label('Overall Emotional Tone')} {sentiment['overallEmotionalTone']}",
+        f"{label('Emotional Progression')} {sentiment['emotionalProgression']}",
+        f"{label('Key Emotional Indicators')}\n{_bullets(sentiment['keyEmotionalIndicators'])}",
+        f"{label('Therapeutic Engagement Level')} {sentiment['therapeuticEngagementLevel']}",
+        f"{label('Risk Assessment')} {sentiment['riskAssessment']}",
+        f"{label('Progress Indicators')}\n{_bullets(sentiment['progressIndicators'])}"
+    ]
+
+
+def _header_lines(ir):
+    return [
+        f"Client: {ir['clientName']}",
+        f"Therapy Type: {ir['therapyType']}",
+        f"Date: {ir['date']}",
+        f"Session Duration: {ir['durationMinutes']} minutes",
+        f"Platform: {ir['platform']}"
+    ]
+
+
+def render_clinical(ir, label, sections):
+    """SOAP-style note: bold headings, the sections of one protocol, then sentiment"""
+    blocks = [f"**{label} THERAPY SESSION SUMMARY**", '\n'.join(_header_lines(ir))]
+    for heading, fields in sections:
+        body = '\n\n'.join(_field(ir, name) for name in fields)
+        blocks.append(f"**{heading}:**\n{body}")
+    blocks.append(f"**CLINICAL NOTES:**\n{ir['clinicalNotes']}")
+    blocks.append('**SENTIMENT ANALYSIS:**')
+    blocks.extend(_sentiment_lines(ir['sentiment'], bold=True))
+    return '\n\n'.join(blocks)
+
+
+def render_markdown(ir):
+    blocks = [f"# {ir['therapyType']} Session Summary",
+              '\n'.join(f"- {line}" for line in _header_lines(ir))]
+    blocks.extend(f"## {heading}\n\n{_field(ir, name)}" for heading, name in DOCUMENT_SECTIONS)
+    blocks.append('## Sentiment')
+    blocks.extend(_sentiment_lines(ir['sentiment'], bold=True))
+    blocks.append('## Areas for Review\n\n' + '\n'.join(
+        f"- **{area['area']}** ({area['priority']}): {area['description']}" for area in ir['areasForReview']))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def render_plain(ir):
+    blocks = ['THERAPY SESSION SUMMARY', '\n'.join(_header_lines(ir))]
+    blocks.extend(f"{heading.upper()}\n{_field(ir, name)}" for heading, name in DOCUMENT_SECTIONS)
+    blocks.append('SENTIMENT\n' + '\n'.join(_sentiment_lines(ir['sentiment'], bold=False)))
+    blocks.append('AREAS FOR REVIEW\n' + '\n'.join(
+        f"- {area['area']} ({area['priority']}): {area['description']}" for area in ir['areasForReview']))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def render_note_ir(ir, summary_format):
+    """Render a structured note in the requested format.
+
+    Format names are case-insensitive. Labels other than the supported
+    formats (e.g. 'General') keep the SOAP layout under their own title,
+    as notes always had.
+    """
+    key = (summary_format or 'SOAP').strip().upper()
+    key = FORMAT_ALIASES.get(key, key)
+    if key in CLINICAL_SECTIONS:
+        return render_clinical(ir, key, CLINICAL_SECTIONS[key])
+    if key == 'MARKDOWN':
+        return render_markdown(ir)
+    if key == 'PLAIN':
+        return render_plain(ir)
+    if key == 'JSON':
+        return json.dumps(ir, indent=2, ensure_ascii=False)
+    return render_clinical(ir, summary_format, CLINICAL_SECTIONS['SOAP'])
+
+
+@lru_cache(maxsize=NOTE_CACHE_SIZE)
+def _render_stored(session_id, summary_format, ir_json):
+    return render_note_ir(json.loads(ir_json), summary_format)
+
+
+def render_session_note(session_id, summary_format, ir_json):
+    """Render a session's stored note (JSON text), cached per (session, format).
+
+    The stored note is part of the key, so a re-analysed session never
+    serves a stale rendering.
+    """
+    return _render_stored(session_id, summary_format, ir_json)
@@ -0,0 +1,286 @@
+"""
+Reanalysis Module for WellTech AI MedSuite
+Background re-analysis of sessions produced by an older analysis engine
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+from analysis_pipeline import RECORDING_STAGES
+
+logger = logging.getLogger(__name__)
+
+# Stage outputs that only depend on the recording, kept when re-analysing
+REUSED_STAGES = RECORDING_STAGES
+
+RUN_FIELDS = ('id', 'requested_by', 'target_version', 'status', 'last_version', 'last_id', 'total', 'processed',
+              'failed', 'error', 'created_at', 'updated_at', 'finished_at')
+
+
+class Reanalyzer:
+    """Re-runs the analysis pipeline over stale therapy_sessions rows.
+
+    A session is stale when its engine_version is below the current
+    engine's. Sessions are processed in (engine_version, id) order, walking
+    an index on those columns, `batch_size` at a time and at most `rate`
+    per second. Each batch's updates and the run's checkpoint (the last
+    (engine_version, id) done) commit together in reanalysis_runs, so a
+    restarted process
+    resumes where the run stopped. The running process holds a lease on
+    the run, renewed at every checkpoint, so only one process works it.
+    """
+
+    def __init__(self, get_db, pipeline, engine_version, batch_size=20, rate=5.0, lease_seconds=120):
+        self.get_db = get_db
+        self.pipeline = pipeline
+        self.engine_version = engine_version
+        self.batch_size = batch_size
+        self.rate = rate
+        self.lease_seconds = lease_seconds
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_schema(self):
+        """Create the runs table and the stale-session index"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reanalysis_runs (
+                    id TEXT PRIMARY KEY,
+                    requested_by INTEGER,
+                    target_version INTEGER NOT NULL,
+                    status TEXT DEFAULT 'running',
+                    last_version INTEGER DEFAULT -1,
+                    last_id INTEGER DEFAULT 0,
+                    total INTEGER DEFAULT 0,
+                    processed INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    error TEXT,
+                    lease_expires_at REAL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_reanalysis_runs_status ON reanalysis_runs (status, created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_therapy_sessions_engine ON therapy_sessions (engine_version, id)')
+            conn.commit()
+
+    def stale_count(self):
+        """Sessions analysed by an older engine"""
+        with self.get_db() as conn:
+            row = conn.execute('SELECT COUNT(*) FROM therapy_sessions WHERE engine_version < ?',
+                               (self.engine_version,)).fetchone()
+        return row[0]
+
+    def status(self, run_id=None):
+        """A run (default: the latest) as a dict, or None"""
+        with self.get_db() as conn:
+            if run_id:
+                row = conn.execute(f"SELECT {', '.join(RUN_FIELDS)} FROM reanalysis_runs WHERE id = ?",
+                                   (run_id,)).fetchone()
+            else:
+                row = conn.execute(f"SELECT {', '.join(RUN_FIELDS)} FROM reanalysis_runs "
+                                   f"ORDER BY created_at DESC, rowid DESC LIMIT 1").fetchone()
+        return dict(zip(RUN_FIELDS, row)) if row else None
+
+    def start(self, requested_by=None):
+        """Begin a run and work it in the background.
+
+        Returns (run, created); created is False when a run is already in
+        progress, in which case that run is returned instead.
+        """
+        run_id = uuid.uuid4().hex
+        with self.get_db() as conn:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute("SELECT id FROM reanalysis_runs WHERE status = 'running'").fetchone()
+                if running:
+                    conn.execute('COMMIT')
+                    return self.status(running[0]), False
+                total = conn.execute('SELECT COUNT(*) FROM therapy_sessions WHERE engine_version < ?',
+                                     (self.engine_version,)).fetchone()[0]
+                conn.execute('''
+                    INSERT INTO reanalysis_runs (id, requested_by, target_version, total, lease_expires_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (run_id, requested_by, self.engine_version, total, time.time() + self.lease_seconds))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        logger.info(f"Reanalysis run {run_id} started: {total} sessions below engine v{self.engine_version}")
+        self._launch(run_id)
+        return self.status(run_id), True
+
+    def cancel(self):
+        """Stop the running run at its next checkpoint; returns it, or None"""
+        with self.get_db() as conn:
+            row = conn.execute("SELECT id FROM reanalysis_runs WHERE status = 'running'").fetchone()
+            if not row:
+                return None
+            conn.execute('''
+                UPDATE reanalysis_runs
+                SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running'
+            ''', (row[0],))
+            conn.commit()
+        self._stop.set()
+        return self.status(row[0])
+
+    def resume(self):
+        """Take over a run left behind by a stopped process, if any.
+
+        A run started under an older engine restarts from the first
+        session, since everything it finished is stale again.
+        """
+        now = time.time()
+        with self.get_db() as conn:
+            row = conn.execute('''
+                SELECT id, target_version FROM reanalysis_runs
+                WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                ORDER BY created_at LIMIT 1
+            ''', (now,)).fetchone()
+            if not row:
+                return None
+            restart = row[1] != self.engine_version
+            cursor = conn.execute('''
+                UPDATE reanalysis_runs
+                SET lease_expires_at = ?, target_version = ?,
+                    last_version = CASE WHEN ? THEN -1 ELSE last_version END,
+                    last_id = CASE WHEN ? THEN 0 ELSE last_id END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+            ''', (now + self.lease_seconds, self.engine_version, restart, restart, row[0], now))
+            conn.commit()
+            if cursor.rowcount != 1:
+                return None
+        logger.info(f"Resuming reanalysis run {row[0]}")
+        self._launch(row[0])
+        return row[0]
+
+    def _launch(self, run_id):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                # Only a cancelled or finishing run can still be working; it stops at its next checkpoint
+                self._stop.set()
+                self._thread.join()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._work, args=(run_id,), name='reanalysis', daemon=True)
+            self._thread.start()
+
+    def _stale_batch(self, version, last_id):
+        """Next stale sessions after the (engine_version, id) cursor.
+
+        Each query is an equality seek on engine_version plus a range on
+        id, which the index answers directly; a single row-value range
+        would rescan the version's earlier rows on every batch.
+        """
+        rows = []
+        with self.get_db() as conn:
+            while version is not None and len(rows) < self.batch_size:
+                rows += conn.execute('''
+                    SELECT id, engine_version, session_id, client_name, therapy_type, summary_format, transcript,
+                           file_path, duration_seconds, channels, sample_rate, codec, created_at
+                    FROM therapy_sessions
+                    WHERE engine_version = ? AND id > ?
+                    ORDER BY id LIMIT ?
+                ''', (version, last_id, self.batch_size - len(rows))).fetchall()
+                if len(rows) < self.batch_size:
+                    version = conn.execute('''
+                        SELECT MIN(engine_version) FROM therapy_sessions
+                        WHERE engine_version > ? AND engine_version < ?
+                    ''', (version, self.engine_version)).fetchone()[0]
+                    last_id = 0
+        return rows
+
+    def _reanalyze(self, row):
+        """Fresh pipeline output for a stored session"""
+        media = None
+        if row['codec'] or row['duration_seconds'] is not None:
+            media = {'durationSeconds': row['duration_seconds'], 'channels': row['channels'],
+                     'sampleRate': row['sample_rate'], 'codec': row['codec']}
+        inputs = {
+            'client_name': row['client_name'],
+            'therapy_type': row['therapy_type'],
+            'summary_format': row['summary_format'],
+            'transcript_note': row['transcript'] or '',
+            'file_path': row['file_path'],
+            'media': media,
+            'date': (row['created_at'] or '')[:10] or time.strftime('%Y-%m-%d')
+        }
+        result, _ = self.pipeline.run(row['session_id'], inputs, reuse=REUSED_STAGES)
+        return result
+
+    def _checkpoint(self, run_id, last_version, last_id, updates, failed):
+        """Store a batch's results with the run's progress; False if the run was cancelled"""
+        with self.get_db() as conn:
+            cursor = conn.execute('''
+                UPDATE reanalysis_runs
+                SET last_version = ?, last_id = ?, processed = processed + ?, failed = failed + ?,
+                    lease_expires_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running'
+            ''', (last_version, last_id, len(updates), failed, time.time() + self.lease_seconds, run_id))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return False
+            conn.executemany('''
+                UPDATE therapy_sessions
+                SET analysis = ?, sentiment_analysis = ?, validation_analysis = ?, confidence_score = ?,
+                    note_ir = ?, engine_version = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND engine_version < ?
+            ''', updates)
+            conn.commit()
+        return True
+
+    def _finish(self, run_id, status, error=None):
+        with self.get_db() as conn:
+            conn.execute('''
+                UPDATE reanalysis_runs
+                SET status = ?, error = ?, lease_expires_at = NULL,
+                    updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'running'
+            ''', (status, error, run_id))
+            conn.commit()
+
+    def _work(self, run_id):
+        try:
+            run = self.status(run_id)
+            last_version, last_id = run['last_version'], run['last_id']
+            while not self._stop.is_set():
+                started = time.monotonic()
+                rows = self._stale_batch(last_version, last_id)
+                if not rows:
+                    self._finish(run_id, 'completed')
+                    logger.info(f"Reanalysis run {run_id} completed")
+                    return
+
+                updates = []
+                failed = 0
+                for row in rows:
+                    try:
+                        result = self._reanalyze(row)
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Reanalysis failed for {row['session_id']}: {e}")
+                        continue
+                    updates.append((result['analysis'], json.dumps(result['sentimentAnalysis']),
+                                    result['validationAnalysis'], result['confidenceScore'],
+                                    json.dumps(result['noteIR']) if result.get('noteIR') else None,
+                                    self.engine_version, row['id'], self.engine_version))
+                last_version, last_id = rows[-1]['engine_version'], rows[-1]['id']
+
+                if not self._checkpoint(run_id, last_version, last_id, updates, failed):
+                    logger.info(f"Reanalysis run {run_id} cancelled")
+                    return
+                self.pipeline.prune([row['session_id'] for row in rows])
+
+                # Rate limit: a batch takes at least len(rows) / rate seconds
+                self._stop.wait(max(0.0, len(rows) / self.rate - (time.monotonic() - started)))
+        except Exception as e:
+            logger.error(f"Reanalysis run {run_id} failed: {e}")
+            self._finish(run_id, 'failed', error=str(e))
@@ -0,0 +1,83 @@
+"""
+Response Cache Module for WellTech AI MedSuite
+Bounded in-memory cache of serialized responses with strong ETags and daily expiry
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until_midnight(now=None):
+    """Seconds until the next local midnight, when dated content changes"""
+    now = now or datetime.now()
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+class ResponseCache:
+    """LRU cache of response bodies keyed on their inputs.
+
+    Entries are {'body', 'etag', 'expires_at'}. The ETag is a hash of the
+    body bytes, so it is strong and identical across workers. Entries
+    expire at local midnight, and the cache is bounded both by entry count
+    and by total body bytes; the least recently used entries go first.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry['body'])
+
+    def get(self, key):
+        """Live entry for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] <= time.time():
+                self._evict(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body):
+        """Store a serialized body and return its entry"""
+        entry = {
+            'body': body,
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'expires_at': time.time() + seconds_until_midnight()
+        }
+        if len(body) > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+        return entry
+
+    def stats(self):
+        """Entry count, size and hit/miss counters"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
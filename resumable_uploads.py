@@ -0,0 +1,226 @@
+"""
+Resumable Uploads Module for WellTech AI MedSuite
+Chunked uploads written in place at their byte offsets, resumable after a dropped connection
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a chunk request per write
+COPY_BUFFER_SIZE = 256 * 1024
+
+UPLOAD_FIELDS = ('id', 'user_id', 'file_name', 'size', 'committed', 'status', 'created_at', 'expires_at')
+
+
+class UploadError(ValueError):
+    """Invalid upload or chunk; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, upload=None):
+        super().__init__(message)
+        self.status = status
+        self.upload = upload
+
+
+class UploadStore:
+    """Resumable uploads tracked in the resumable_uploads table.
+
+    An upload is created with its final size, then sent as fixed-size
+    chunks, each at the committed offset. Every chunk is streamed straight
+    into the upload's .part file at its offset, flushed to disk, and only
+    then committed, so the committed offset always covers durable bytes
+    and a client that lost a connection continues from it. A completed
+    upload is claimed once, by session creation, which takes over its
+    file. Uploads idle for `ttl_seconds` are reaped.
+    """
+
+    def __init__(self, get_db, upload_dir='uploads/partial', chunk_size=4 * 1024 * 1024,
+                 max_size=1024 * 1024 * 1024, ttl_seconds=24 * 3600):
+        self.get_db = get_db
+        self.upload_dir = upload_dir
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._reaper = None
+
+    def init_schema(self):
+        """Create the resumable_uploads table if needed"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS resumable_uploads (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    file_name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    committed INTEGER DEFAULT 0,
+                    status TEXT DEFAULT 'uploading',
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_resumable_uploads_expires ON resumable_uploads (expires_at)')
+            conn.commit()
+
+    def part_path(self, upload_id):
+        """Where an upload's bytes are assembled"""
+        return os.path.join(self.upload_dir, f"{upload_id}.part")
+
+    def _lock(self, upload_id):
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, user_id, file_name, size):
+        """Register an upload and its empty part file; returns the upload dict"""
+        if not file_name or os.path.basename(file_name) != file_name:
+            raise UploadError('A plain fileName is required')
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('size must be a positive number of bytes')
+        if size > self.max_size:
+            raise UploadError(f'Uploads are limited to {self.max_size} bytes', status=413)
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self.upload_dir, exist_ok=True)
+        open(self.part_path(upload_id), 'wb').close()
+        with self.get_db() as conn:
+            conn.execute('''
+                INSERT INTO resumable_uploads (id, user_id, file_name, size, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (upload_id, user_id, file_name, size, time.time() + self.ttl_seconds))
+            conn.commit()
+        logger.info(f"Upload {upload_id} created: {file_name} ({size} bytes) for user {user_id}")
+        return self.get(upload_id, user_id)
+
+    def get(self, upload_id, user_id):
+        """The user's upload as a dict, or None"""
+        with self.get_db() as conn:
+            row = conn.execute(f'''
+                SELECT {', '.join(UPLOAD_FIELDS)} FROM resumable_uploads WHERE id = ? AND user_id = ?
+            ''', (upload_id, user_id)).fetchone()
+        return dict(zip(UPLOAD_FIELDS, row)) if row else None
+
+    def write_chunk(self, upload_id, user_id, offset, length, stream):
+        """Write one chunk from `stream` at `offset` and commit it.
+
+        The chunk must start at the committed offset and be chunk_size
+        bytes long (the last chunk carries the remainder). Returns the
+        updated upload. Raises UploadError with status 404 for an unknown
+        upload and 409, carrying the upload, when the offset is not the
+        committed one.
+        """
+        with self._lock(upload_id):
+            upload = self.get(upload_id, user_id)
+            if not upload:
+                raise UploadError('Upload not found', status=404)
+            if upload['status'] != 'uploading':
+                raise UploadError('Upload is already complete', status=409, upload=upload)
+            if offset != upload['committed']:
+                raise UploadError(f"Chunk offset {offset} does not match committed offset {upload['committed']}",
+                                  status=409, upload=upload)
+            expected = min(self.chunk_size, upload['size'] - offset)
+            if length != expected:
+                raise UploadError(f'Chunk at offset {offset} must be {expected} bytes, got {length}')
+
+            written = 0
+            with open(self.part_path(upload_id), 'r+b') as f:
+                f.seek(offset)
+                while written < length:
+                    buffer = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                    if not buffer:
+                        break
+                    f.write(buffer)
+                    written += len(buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            if written != length:
+                # Truncated chunk: nothing past the committed offset counts
+                raise UploadError(f'Chunk ended after {written} of {length} bytes')
+
+            committed = offset + length
+            with self.get_db() as conn:
+                conn.execute('''
+                    UPDATE resumable_uploads
+                    SET committed = ?, status = CASE WHEN ? = size THEN 'complete' ELSE status END,
+                        expires_at = ?
+                    WHERE id = ? AND committed = ?
+                ''', (committed, committed, time.time() + self.ttl_seconds, upload_id, offset))
+                conn.commit()
+        return self.get(upload_id, user_id)
+
+    def claim(self, upload_id, user_id):
+        """Hand a completed upload over to its consumer, exactly once.
+
+        Returns (upload, part_path); the caller takes ownership of the part
+        file. Raises UploadError if the upload is unknown, unfinished or
+        already claimed.
+        """
+        with self.get_db() as conn:
+            cursor = conn.execute('''
+                UPDATE resumable_uploads SET status = 'claimed'
+                WHERE id = ? AND user_id = ? AND status = 'complete'
+            ''', (upload_id, user_id))
+            conn.commit()
+        upload = self.get(upload_id, user_id)
+        if cursor.rowcount != 1:
+            if not upload:
+                raise UploadError('Upload not found', status=404)
+            raise UploadError(f"Upload is {upload['status']}, not complete", status=409, upload=upload)
+        return upload, self.part_path(upload_id)
+
+    def discard(self, upload_id, user_id):
+        """Delete an upload and its part file; returns whether it existed"""
+        with self._lock(upload_id):
+            with self.get_db() as conn:
+                cursor = conn.execute('DELETE FROM resumable_uploads WHERE id = ? AND user_id = ?',
+                                      (upload_id, user_id))
+                conn.commit()
+            if cursor.rowcount and os.path.exists(self.part_path(upload_id)):
+                os.remove(self.part_path(upload_id))
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+        return cursor.rowcount == 1
+
+    def finish(self, upload_id):
+        """Forget a claimed upload once its consumer has taken the file"""
+        with self.get_db() as conn:
+            conn.execute("DELETE FROM resumable_uploads WHERE id = ? AND status = 'claimed'", (upload_id,))
+            conn.commit()
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+
+    def reap_expired(self, batch_size=100):
+        """Delete expired uploads and their part files; returns the number removed"""
+        with self.get_db() as conn:
+            rows = conn.execute('SELECT id FROM resumable_uploads WHERE expires_at < ? LIMIT ?',
+                                (time.time(), batch_size)).fetchall()
+            for row in rows:
+                if os.path.exists(self.part_path(row[0])):
+                    os.remove(self.part_path(row[0]))
+            conn.executemany('DELETE FROM resumable_uploads WHERE id = ?', [(row[0],) for row in rows])
+            conn.commit()
+        if rows:
+            logger.info(f"Upload reaper removed {len(rows)} expired uploads")
+        return len(rows)
+
+    def start_reaper(self, interval=600):
+        """Run reap_expired every `interval` seconds on a daemon thread"""
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    self.reap_expired()
+                except Exception as e:
+                    logger.error(f"Upload reaper error: {e}")
+                time.sleep(interval)
+
+        self._reaper = threading.Thread(target=run, name='upload-reaper', daemon=True)
+        self._reaper.start()
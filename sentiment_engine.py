@@ -0,0 +1,246 @@
+"""
+Sentiment Engine Module for WellTech AI MedSuite
+Vectorised clinical affect lexicon scoring of session transcripts
+"""
+
+import string
+import logging
+from itertools import chain, repeat
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Transcripts are split into this many equal spans to describe progression
+SEGMENTS = 3
+
+CATEGORIES = ('anxiety', 'sadness', 'anger', 'somatic', 'risk', 'hope', 'coping', 'engagement')
+NEGATIVE_CATEGORIES = ('anxiety', 'sadness', 'anger', 'somatic', 'risk')
+POSITIVE_CATEGORIES = ('hope', 'coping', 'engagement')
+
+# word -> (category, valence in [-1, 1])
+LEXICON = {
+    # anxiety
+    'anxious': ('anxiety', -0.6), 'anxiety': ('anxiety', -0.6), 'worried': ('anxiety', -0.5),
+    'worry': ('anxiety', -0.5), 'worrying': ('anxiety', -0.5), 'worries': ('anxiety', -0.5),
+    'nervous': ('anxiety', -0.5), 'panic': ('anxiety', -0.8), 'panicking': ('anxiety', -0.8),
+    'afraid': ('anxiety', -0.6), 'scared': ('anxiety', -0.6), 'fear': ('anxiety', -0.6),
+    'overwhelmed': ('anxiety', -0.7), 'stressed': ('anxiety', -0.5), 'stress': ('anxiety', -0.5),
+    'tense': ('anxiety', -0.4), 'racing': ('anxiety', -0.4), 'checking': ('anxiety', -0.3),
+    'perfect': ('anxiety', -0.2), 'perfectionist': ('anxiety', -0.4), 'deadline': ('anxiety', -0.3),
+    'deadlines': ('anxiety', -0.3), 'dread': ('anxiety', -0.7), 'uneasy': ('anxiety', -0.4),
+    # sadness
+    'sad': ('sadness', -0.6), 'down': ('sadness', -0.3), 'depressed': ('sadness', -0.8),
+    'hopeless': ('sadness', -0.9), 'empty': ('sadness', -0.6), 'lonely': ('sadness', -0.6),
+    'alone': ('sadness', -0.4), 'crying': ('sadness', -0.6), 'cried': ('sadness', -0.6),
+    'tired': ('sadness', -0.3), 'exhausted': ('sadness', -0.5), 'worthless': ('sadness', -0.9),
+    'guilty': ('sadness', -0.6), 'ashamed': ('sadness', -0.7), 'failure': ('sadness', -0.7),
+    'failing': ('sadness', -0.6), 'miserable': ('sadness', -0.8), 'grief': ('sadness', -0.7),
+    # anger
+    'angry': ('anger', -0.6), 'frustrated': ('anger', -0.5), 'frustrating': ('anger', -0.5),
+    'annoyed': ('anger', -0.4), 'irritable': ('anger', -0.5), 'furious': ('anger', -0.8),
+    'resentful': ('anger', -0.6), 'mad': ('anger', -0.5), 'hate': ('anger', -0.7),
+    # somatic
+    'sleep': ('somatic', -0.2), 'insomnia': ('somatic', -0.6), 'awake': ('somatic', -0.3),
+    'appetite': ('somatic', -0.3), 'headache': ('somatic', -0.4), 'headaches': ('somatic', -0.4),
+    'fatigue': ('somatic', -0.4), 'heart': ('somatic', -0.2), 'chest': ('somatic', -0.3),
+    'nausea': ('somatic', -0.4), 'shaking': ('somatic', -0.4), 'pain': ('somatic', -0.5),
+    # risk
+    'suicide': ('risk', -1.0), 'suicidal': ('risk', -1.0), 'kill': ('risk', -0.9),
+    'die': ('risk', -0.9), 'dying': ('risk', -0.8), 'dead': ('risk', -0.8),
+    'overdose': ('risk', -1.0), 'harm': ('risk', -0.8), 'hurt': ('risk', -0.6),
+    'cutting': ('risk', -0.8), 'unsafe': ('risk', -0.8), 'weapon': ('risk', -0.9),
+    # hope
+    'hope': ('hope', 0.6), 'hopeful': ('hope', 0.7), 'better': ('hope', 0.5),
+    'improving': ('hope', 0.6), 'improved': ('hope', 0.6), 'progress': ('hope', 0.6),
+    'optimistic': ('hope', 0.7), 'looking': ('hope', 0.2), 'forward': ('hope', 0.3),
+    'confident': ('hope', 0.6), 'proud': ('hope', 0.7), 'calm': ('hope', 0.5),
+    'calmer': ('hope', 0.6), 'relieved': ('hope', 0.6), 'happy': ('hope', 0.7),
+    'good': ('hope', 0.3), 'glad': ('hope', 0.5), 'grateful': ('hope', 0.7),
+    # coping
+    'breathing': ('coping', 0.4), 'breathe': ('coping', 0.4), 'exercise': ('coping', 0.4),
+    'walk': ('coping', 0.3), 'relax': ('coping', 0.4), 'relaxation': ('coping', 0.4),
+    'mindfulness': ('coping', 0.5), 'meditation': ('coping', 0.5), 'journal': ('coping', 0.4),
+    'boundaries': ('coping', 0.4), 'routine': ('coping', 0.3), 'support': ('coping', 0.4),
+    'manage': ('coping', 0.3), 'managed': ('coping', 0.4), 'coping': ('coping', 0.4),
+    'strategies': ('coping', 0.3), 'helped': ('coping', 0.5), 'helps': ('coping', 0.4),
+    # engagement
+    'homework': ('engagement', 0.4), 'practice': ('engagement', 0.3), 'practiced': ('engagement', 0.4),
+    'try': ('engagement', 0.3), 'tried': ('engagement', 0.3), 'willing': ('engagement', 0.5),
+    'commit': ('engagement', 0.5), 'goal': ('engagement', 0.3), 'goals': ('engagement', 0.3),
+    'understand': ('engagement', 0.3), 'noticed': ('engagement', 0.3), 'realize': ('engagement', 0.3),
+    'realized': ('engagement', 0.4), 'plan': ('engagement', 0.2), 'agree': ('engagement', 0.3)
+}
+
+NEGATORS = ('not', 'no', 'never', "don't", "didn't", "isn't", "wasn't", "can't", 'cannot', 'without', 'hardly')
+
+INDICATOR_LABELS = {
+    'anxiety': 'Anxiety and worry',
+    'sadness': 'Low mood and sadness',
+    'anger': 'Frustration and anger',
+    'somatic': 'Sleep and somatic complaints',
+    'risk': 'Risk-related language',
+    'hope': 'Hope and positive affect',
+    'coping': 'Use of coping strategies',
+    'engagement': 'Therapeutic engagement and motivation'
+}
+
+# Tokens are runs of letters and apostrophes; everything else separates them
+_SEPARATORS = str.maketrans({c: ' ' for c in string.punctuation.replace("'", '') + string.digits})
+
+# Precomputed vocabulary: lexicon words then negators, with aligned arrays.
+# Index len(VOCABULARY) stands for "not in the vocabulary".
+VOCABULARY = np.array(sorted(LEXICON) + sorted(NEGATORS))
+_WORD_INDEX = {word: i for i, word in enumerate(VOCABULARY.tolist())}
+_MISSING = len(VOCABULARY)
+_CATEGORY_INDEX = np.array([CATEGORIES.index(LEXICON[w][0]) if w in LEXICON else -1 for w in VOCABULARY] + [-1])
+_VALENCE = np.array([LEXICON[w][1] if w in LEXICON else 0.0 for w in VOCABULARY] + [0.0])
+_IS_NEGATOR = np.array([w in NEGATORS for w in VOCABULARY] + [False])
+
+
+def tokenize(text):
+    return text.lower().translate(_SEPARATORS).split()
+
+
+def score_transcripts(transcripts, segments=SEGMENTS):
+    """Score a batch of transcripts in one vectorised pass.
+
+    Returns a dict of arrays indexed [transcript, segment]:
+    'tokens' (word counts), 'matched' (lexicon words), 'hits' (lexicon
+    hits per category, with a trailing category axis) and 'valence'
+    (summed valence). A lexicon
+    word directly after a negator ("not hopeful") counts for no category
+    and contributes half its valence, inverted.
+    """
+    token_lists = [tokenize(text) for text in transcripts]
+    lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.intp)
+    count = len(token_lists)
+    total = int(lengths.sum())
+
+    # The only per-token Python work: one dict probe into the vocabulary
+    index = np.fromiter(map(_WORD_INDEX.get, chain.from_iterable(token_lists), repeat(_MISSING, total)),
+                        dtype=np.intp, count=total)
+
+    doc = np.repeat(np.arange(count), lengths)
+    starts = np.cumsum(lengths) - lengths
+    position = np.arange(total) - starts[doc]
+    cell = doc * segments + position * segments // np.maximum(lengths[doc], 1)
+
+    negated = np.zeros(total, dtype=bool)
+    negated[1:] = _IS_NEGATOR[index[:-1]] & (position[1:] > 0)
+
+    category = _CATEGORY_INDEX[index]
+    matched = category >= 0
+    counted = matched & ~negated
+    cells = count * segments
+    word_counts = np.bincount(cell, minlength=cells)
+    matched_counts = np.bincount(cell[matched], minlength=cells)
+
+    weights = np.where(negated, -0.5, 1.0) * _VALENCE[index]
+    valence = np.bincount(cell, weights=weights, minlength=cells)
+
+    hits = np.bincount(cell[counted] * len(CATEGORIES) + category[counted], minlength=cells * len(CATEGORIES))
+    shape = (count, segments)
+
+    return {
+        'tokens': word_counts.reshape(shape),
+        'matched': matched_counts.reshape(shape),
+        'hits': hits.reshape(shape + (len(CATEGORIES),)),
+        'valence': valence.reshape(shape)
+    }
+
+
+def _describe_affect(valence):
+    if valence < -0.3:
+        return 'heightened distress'
+    if valence < -0.1:
+        return 'some distress'
+    if valence < 0.1:
+        return 'neutral affect'
+    if valence < 0.3:
+        return 'some positive affect'
+    return 'hope and positive affect'
+
+
+def _intensity(per_hundred):
+    if per_hundred >= 4:
+        return 'Marked'
+    if per_hundred >= 1.5:
+        return 'Moderate'
+    return 'Mild'
+
+
+def summarize(tokens, matched, hits, valence):
+    """sentimentAnalysis fields for one transcript's segment arrays"""
+    total_tokens = int(tokens.sum())
+    totals = hits.sum(axis=0)
+    by_category = dict(zip(CATEGORIES, (int(n) for n in totals)))
+    affect_hits = int(totals.sum())
+    per_hundred = {c: n * 100.0 / total_tokens if total_tokens else 0.0 for c, n in by_category.items()}
+
+    # Mean valence per lexicon word in each segment
+    segment_valence = np.divide(valence, matched, out=np.zeros(len(valence)), where=matched > 0)
+    overall = float(valence.sum() / matched.sum()) if matched.sum() else 0.0
+
+    negative = max(NEGATIVE_CATEGORIES, key=lambda c: by_category[c])
+    positive = max(POSITIVE_CATEGORIES, key=lambda c: by_category[c])
+    if not affect_hits:
+        tone = 'Neutral - little affective language in the transcript'
+    elif by_category[negative] and by_category[positive]:
+        tone = (f"{_intensity(per_hundred[negative])} {INDICATOR_LABELS[negative].lower()} "
+                f"with {INDICATOR_LABELS[positive].lower()}")
+    elif by_category[negative]:
+        tone = f"{_intensity(per_hundred[negative])} {INDICATOR_LABELS[negative].lower()}"
+    else:
+        tone = f"Predominantly positive - {INDICATOR_LABELS[positive].lower()}"
+
+    progression = (f"Session began with {_describe_affect(segment_valence[0])}, "
+                   f"moved through {_describe_affect(segment_valence[len(segment_valence) // 2])}, "
+                   f"and ended with {_describe_affect(segment_valence[-1])}")
+
+    ranked = sorted((c for c in CATEGORIES if by_category[c]), key=lambda c: -by_category[c])
+    indicators = tuple(f"{INDICATOR_LABELS[c]} ({by_category[c]} mentions)" for c in ranked[:5])
+
+    engagement = per_hundred['engagement'] + per_hundred['coping']
+    if engagement >= 1.5:
+        engagement_level = 'High - client discusses practice, goals and coping strategies'
+    elif engagement >= 0.5:
+        engagement_level = 'Moderate - some discussion of practice and coping strategies'
+    else:
+        engagement_level = 'Low - little discussion of practice, goals or coping'
+
+    if by_category['risk']:
+        risk = (f"Elevated - risk-related language detected ({by_category['risk']} mentions). "
+                "Clinician review of safety is required.")
+    elif per_hundred['sadness'] >= 3:
+        risk = 'Low to moderate - marked low mood without risk language. Monitor mood at next session.'
+    else:
+        risk = 'Low risk - no risk-related language detected.'
+
+    progress = [f"{INDICATOR_LABELS[c]} ({by_category[c]} mentions)" for c in POSITIVE_CATEGORIES if by_category[c]]
+    if segment_valence[-1] - segment_valence[0] > 0.1:
+        progress.append('Affect improved over the course of the session')
+    elif segment_valence[0] - segment_valence[-1] > 0.1:
+        progress.append('Affect declined over the course of the session')
+
+    return {
+        'overallEmotionalTone': tone,
+        'emotionalProgression': progression,
+        'keyEmotionalIndicators': indicators,
+        'therapeuticEngagementLevel': engagement_level,
+        'riskAssessment': risk,
+        'progressIndicators': tuple(progress),
+        'scores': {
+            'valence': round(overall, 3),
+            'segmentValence': tuple(round(float(v), 3) for v in segment_valence),
+            'affectWords': affect_hits,
+            'words': total_tokens,
+            'categories': by_category
+        }
+    }
+
+
+def analyze_sentiment(transcripts):
+    """sentimentAnalysis dicts for a batch of transcripts, in order"""
+    scores = score_transcripts(transcripts)
+    return [summarize(scores['tokens'][i], scores['matched'][i], scores['hits'][i], scores['valence'][i])
+            for i in range(len(transcripts))]
@@ -0,0 +1,141 @@
+"""
+Session Events Module for WellTech AI MedSuite
+In-process pub/sub fanning session progress out to Server-Sent Events streams
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = ('completed', 'failed')
+
+
+def format_sse(event):
+    """Serialize an event dict in text/event-stream framing"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class EventBroker:
+    """Per-session topics with a short replay history.
+
+    Publishers never block: each subscriber has a bounded queue and a
+    subscriber that falls behind loses events rather than stalling the
+    pipeline. Late subscribers receive the topic's history first, so a
+    client that subscribes after the upload was received still sees it.
+    Topics are forgotten `history_ttl` seconds after their last event.
+    """
+
+    def __init__(self, history_size=50, history_ttl=600, queue_size=100):
+        self.history_size = history_size
+        self.history_ttl = history_ttl
+        self.queue_size = queue_size
+
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._next_id = 0
+        self._poller = None
+
+    def _topic(self, name):
+        topic = self._topics.get(name)
+        if topic is None:
+            topic = self._topics[name] = {
+                'history': deque(maxlen=self.history_size),
+                'subscribers': set(),
+                'owner': None,
+                'finished': False,
+                'updated': time.monotonic()
+            }
+        return topic
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.history_ttl
+        for name in [n for n, t in self._topics.items() if t['updated'] < cutoff and not t['subscribers']]:
+            del self._topics[name]
+
+    def publish(self, name, event_type, data=None, owner=None):
+        """Record an event and hand it to every current subscriber"""
+        with self._lock:
+            self._next_id += 1
+            event = {'id': self._next_id, 'event': event_type, 'data': data or {}, 'time': time.time()}
+            topic = self._topic(name)
+            if owner is not None:
+                topic['owner'] = owner
+            if event_type in TERMINAL_EVENTS:
+                topic['finished'] = True
+            topic['history'].append(event)
+            topic['updated'] = time.monotonic()
+            subscribers = list(topic['subscribers'])
+            self._expire()
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                logger.warning(f"Dropping event {event_type} for slow subscriber on {name}")
+
+    def owner(self, name):
+        """User id that published events for a topic, if known in this process"""
+        with self._lock:
+            topic = self._topics.get(name)
+            return topic['owner'] if topic else None
+
+    def stream(self, name, heartbeat=15, max_seconds=3600):
+        """Generator of SSE frames for one topic, ending at a terminal event"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            topic = self._topic(name)
+            history = list(topic['history'])
+            topic['subscribers'].add(subscriber)
+
+        try:
+            for event in history:
+                yield format_sse(event)
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+
+            deadline = time.monotonic() + max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event)
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+        finally:
+            with self._lock:
+                topic['subscribers'].discard(subscriber)
+                topic['updated'] = time.monotonic()
+
+    def start_poller(self, lookup, interval=2):
+        """Publish terminal events for work finished in other processes.
+
+        Every `interval` seconds, one thread calls `lookup(names)` with the
+        watched, unfinished topics and publishes whatever (event_type, data)
+        pairs it returns, so watchers cost one query per process rather
+        than one per connection.
+        """
+        if self._poller and self._poller.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    names = [n for n, t in self._topics.items() if t['subscribers'] and not t['finished']]
+                if not names:
+                    continue
+                try:
+                    for name, (event_type, data) in lookup(names).items():
+                        self.publish(name, event_type, data)
+                except Exception as e:
+                    logger.error(f"Event poller error: {e}")
+
+        self._poller = threading.Thread(target=run, name='event-poller', daemon=True)
+        self._poller.start()
@@ -0,0 +1,177 @@
+"""
+Session Store Module for WellTech AI MedSuite
+Refresh-token sessions in user_sessions with a background expiry reaper
+"""
+
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _utc_timestamp(dt=None):
+    """UTC timestamp in the same text format as SQLite's CURRENT_TIMESTAMP"""
+    return (dt or datetime.utcnow()).strftime(TIMESTAMP_FORMAT)
+
+
+def hash_session_token(session_token):
+    """Session tokens are stored hashed so a database leak exposes nothing usable"""
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+
+class SessionStore:
+    """Server-side sessions backed by the user_sessions table.
+
+    Rows are indexed on expires_at (for the reaper) and on
+    (user_id, expires_at) (for per-user views). A bounded in-memory cache
+    of recently created or looked-up sessions maps token hashes to row ids
+    so consuming a session deletes by primary key; the DELETE row count
+    stays authoritative, so a session can only be consumed once even
+    across workers.
+    """
+
+    def __init__(self, get_db, lifetime=timedelta(days=14), cache_size=10000):
+        self.get_db = get_db
+        self.lifetime = lifetime
+        self.cache_size = cache_size
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._reaper = None
+
+    def init_schema(self):
+        """Create the indexes the store relies on"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions (expires_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id, expires_at)')
+            conn.commit()
+
+    def _cache_put(self, token_hash, session):
+        with self._cache_lock:
+            self._cache[token_hash] = session
+            self._cache.move_to_end(token_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_pop(self, token_hash):
+        with self._cache_lock:
+            return self._cache.pop(token_hash, None)
+
+    def create(self, cursor, user_id, ip_address=None, user_agent=None, token_version=0):
+        """Insert a session using the caller's transaction and return its token.
+
+        token_version is the user's users.token_version when the session
+        starts; consumers compare it with the current one.
+        """
+        session_token = secrets.token_urlsafe(32)
+        token_hash = hash_session_token(session_token)
+        expires_at = _utc_timestamp(datetime.utcnow() + self.lifetime)
+        cursor.execute('''
+            INSERT INTO user_sessions (user_id, session_token, expires_at, ip_address, user_agent, token_version)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, token_hash, expires_at, ip_address, user_agent, token_version))
+        self._cache_put(token_hash, {'id': cursor.lastrowid, 'user_id': user_id, 'expires_at': expires_at,
+                                     'token_version': token_version})
+        return session_token
+
+    def consume(self, cursor, session_token):
+        """Delete a live session and return {'id', 'user_id', 'expires_at', 'token_version'}, or None.
+
+        Used for single-use refresh tokens: of two concurrent callers with
+        the same token, only one sees the row deleted.
+        """
+        token_hash = hash_session_token(session_token)
+        session = self._cache_pop(token_hash)
+        if session is None:
+            cursor.execute('SELECT id, user_id, expires_at, token_version FROM user_sessions WHERE session_token = ?',
+                           (token_hash,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            session = {'id': row[0], 'user_id': row[1], 'expires_at': row[2], 'token_version': row[3]}
+
+        cursor.execute('DELETE FROM user_sessions WHERE id = ? AND session_token = ?', (session['id'], token_hash))
+        if cursor.rowcount != 1 or session['expires_at'] < _utc_timestamp():
+            return None
+        return session
+
+    def revoke(self, cursor, session_token, user_id):
+        """End one of a user's sessions"""
+        token_hash = hash_session_token(session_token)
+        self._cache_pop(token_hash)
+        cursor.execute('DELETE FROM user_sessions WHERE session_token = ? AND user_id = ?', (token_hash, user_id))
+
+    def revoke_user(self, cursor, user_id):
+        """End every session belonging to a user"""
+        with self._cache_lock:
+            for token_hash in [h for h, s in self._cache.items() if s['user_id'] == user_id]:
+                del self._cache[token_hash]
+        cursor.execute('DELETE FROM user_sessions WHERE user_id = ?', (user_id,))
+
+    def active_sessions(self, user_id):
+        """Live sessions for one user, served from the (user_id, expires_at) index"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, created_at, expires_at, ip_address, user_agent
+                FROM user_sessions
+                WHERE user_id = ? AND expires_at > ?
+                ORDER BY expires_at DESC
+            ''', (user_id, _utc_timestamp()))
+            return [dict(zip(('id', 'created_at', 'expires_at', 'ip_address', 'user_agent'), row))
+                    for row in cursor.fetchall()]
+
+    def reap_expired(self, batch_size=500, max_seconds=1.0):
+        """Delete expired rows in small batches, committing between them.
+
+        Each batch holds the write lock only briefly; the run stops after
+        `max_seconds` and the remainder is picked up by the next run.
+        Returns the number of rows deleted.
+        """
+        deadline = time.monotonic() + max_seconds
+        deleted = 0
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute('''
+                    DELETE FROM user_sessions WHERE id IN (
+                        SELECT id FROM user_sessions WHERE expires_at < ? LIMIT ?
+                    )
+                ''', (_utc_timestamp(), batch_size))
+                conn.commit()
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size or time.monotonic() >= deadline:
+                    break
+
+        now = _utc_timestamp()
+        with self._cache_lock:
+            for token_hash in [h for h, s in self._cache.items() if s['expires_at'] < now]:
+                del self._cache[token_hash]
+
+        if deleted:
+            logger.info(f"Session reaper removed {deleted} expired sessions")
+        return deleted
+
+    def start_reaper(self, interval=60, batch_size=500, max_seconds=1.0):
+        """Run reap_expired every `interval` seconds on a daemon thread"""
+        if self._reaper and self._reaper.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    self.reap_expired(batch_size, max_seconds)
+                except Exception as e:
+                    logger.error(f"Session reaper error: {e}")
+                time.sleep(interval)
+
+        self._reaper = threading.Thread(target=run, name='session-reaper', daemon=True)
+        self._reaper.start()
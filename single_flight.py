@@ -0,0 +1,78 @@
+"""
+Single Flight Module for WellTech AI MedSuite
+Coalesces identical concurrent calls into one shared execution
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = None
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time within a process.
+
+    The first caller for a key executes the function; callers arriving
+    with the same key while it runs wait for it and receive the same
+    result (or exception). Nothing is kept once the call finishes; pair
+    it with a cache for results that should outlive the flight. A flight
+    only allocates an Event once a second caller joins it, so uncontended
+    calls stay cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs), shared with concurrent callers passing the same key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+                leader = True
+            else:
+                if flight.done is None:
+                    flight.done = threading.Event()
+                done = flight.done
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                done = flight.done
+            if done is not None:
+                done.set()
+
+    def stats(self):
+        """Execution and coalescing counters; coalescingRate is the share of calls that waited on another"""
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {'calls': calls, 'executions': self.executions, 'coalesced': self.coalesced,
+                    'coalescingRate': round(self.coalesced / calls, 4) if calls else 0.0,
+                    'inFlight': len(self._flights)}
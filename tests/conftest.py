@@ -0,0 +1,67 @@
+"""
+Test fixtures for WellTech AI MedSuite
+Each test runs against a fresh database and uploads directory in its own working directory
+"""
+
+import io
+import os
+import sys
+import wave
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN_LOGIN = {'email': 'admin', 'password': '3942-granite-35'}
+
+
+@pytest.fixture(scope='session')
+def appmod(tmp_path_factory):
+    """The app module, imported from a scratch directory so it leaves nothing in the checkout"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('import'))
+    try:
+        import app
+        # One keyring for the whole run: a cwd-relative one would be created afresh in each
+        # test's directory while keys cached from the previous test were still being used
+        app.keyring.path = os.path.abspath(app.keyring.path)
+    finally:
+        os.chdir(cwd)
+    # No reapers, collectors or job workers: each test initializes its own database
+    app.app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(appmod, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    appmod.init_database()
+    return appmod.app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    token = client.post('/api/auth/login', json=ADMIN_LOGIN).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def make_wav(seconds=1.0, sample_rate=8000, sample_width=2, tone=440):
+    """A mono sine-wave WAV file, as bytes"""
+    import math
+    frames = bytearray()
+    peak = (1 << (8 * sample_width - 1)) - 1
+    for i in range(int(seconds * sample_rate)):
+        value = int(peak * 0.5 * math.sin(2 * math.pi * tone * i / sample_rate))
+        frames += value.to_bytes(sample_width, 'little', signed=True)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def wav_bytes():
+    return make_wav()
@@ -0,0 +1,64 @@
+"""
+Analysis engine tests for WellTech AI MedSuite
+Memoized rendering and the read-only shared structures behind it
+"""
+
+import time
+
+import pytest
+
+from analysis_engine import (FrozenDict, VALIDATION_TEMPLATE, NOTE_CONTENT, SENTIMENT_ANALYSIS, AREAS_FOR_REVIEW,
+                             CONFIDENCE_SCORE, _render_analysis, generate_comprehensive_analysis, parse_template,
+                             render_template, build_note_ir)
+from note_renderer import render_note_ir
+
+
+@pytest.mark.parametrize('summary_format', ['SOAP', 'BIRP', 'DAP', 'General'])
+def test_cached_render_matches_uncached(summary_format):
+    args = ('Dana', 'CBT', summary_format)
+    first = generate_comprehensive_analysis(*args)
+    cached = generate_comprehensive_analysis(*args)
+
+    uncached = {
+        'analysis': render_note_ir(build_note_ir('Dana', 'CBT', time.strftime('%Y-%m-%d')), summary_format),
+        'sentimentAnalysis': SENTIMENT_ANALYSIS,
+        'validationAnalysis': VALIDATION_TEMPLATE.strip().format(summary_format=summary_format),
+        'confidenceScore': CONFIDENCE_SCORE,
+        'areasForReview': AREAS_FOR_REVIEW
+    }
+    assert first == cached == uncached
+    assert _render_analysis.cache_info().hits >= 1
+
+
+def test_parsed_template_renders_like_format():
+    template = 'Format {summary_format}: {count} items for {summary_format}.'
+    assert render_template(parse_template(template), summary_format='SOAP', count=3) == \
+        template.format(summary_format='SOAP', count=3)
+
+
+def test_results_are_copies_of_read_only_structures():
+    result = generate_comprehensive_analysis('Dana', 'CBT', 'SOAP')
+    result['extra'] = True
+    assert 'extra' not in generate_comprehensive_analysis('Dana', 'CBT', 'SOAP')
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda d: d.__setitem__('plan', ()),
+    lambda d: d.__delitem__('plan'),
+    lambda d: d.update(plan=()),
+    lambda d: d.setdefault('new', 1),
+    lambda d: d.pop('plan'),
+    lambda d: d.popitem(),
+    lambda d: d.clear(),
+])
+def test_frozen_dict_refuses_mutation(mutate):
+    with pytest.raises(TypeError):
+        mutate(NOTE_CONTENT)
+
+
+def test_frozen_dict_refuses_in_place_union():
+    frozen = FrozenDict(a=1)
+    with pytest.raises(TypeError):
+        frozen |= {'b': 2}
+    assert frozen == {'a': 1}
+    assert frozen | {'b': 2} == {'a': 1, 'b': 2}
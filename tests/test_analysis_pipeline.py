@@ -0,0 +1,28 @@
+"""
+Analysis pipeline tests for WellTech AI MedSuite
+Retention of per-stage results once sessions are stored
+"""
+
+import io
+
+from conftest import make_wav
+
+
+def stage_rows(appmod):
+    with appmod.get_db() as conn:
+        return sorted(tuple(row) for row in conn.execute('SELECT session_id, stage FROM pipeline_stage_results'))
+
+
+def test_stored_session_keeps_only_recording_stages(appmod, client, auth_headers):
+    session_id = client.post('/api/therapy/sessions', headers=auth_headers, json={}).get_json()['sessionId']
+    assert stage_rows(appmod) == [(session_id, 'transcribe')]
+
+
+def test_deleting_the_recording_drops_its_stage_rows(appmod, client, auth_headers):
+    client.post('/api/therapy/sessions', headers=auth_headers, content_type='multipart/form-data',
+                data={'audio_file': (io.BytesIO(make_wav()), 'session.wav')})
+    file_id = client.get('/api/files/list', headers=auth_headers).get_json()['files'][0]['id']
+    assert stage_rows(appmod)
+
+    client.delete(f'/api/files/{file_id}', headers=auth_headers)
+    assert stage_rows(appmod) == []
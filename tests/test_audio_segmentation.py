@@ -0,0 +1,42 @@
+"""
+Audio segmentation tests for WellTech AI MedSuite
+Window levels across sample widths, and segments stored with the session
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from analysis_pipeline import SegmentStage, load_stages
+from audio_segmentation import segment_audio
+from conftest import make_wav
+
+
+@pytest.mark.parametrize('sample_width', [2, 3, 4])
+def test_levels_match_across_sample_widths(tmp_path, sample_width):
+    path = tmp_path / 'tone.wav'
+    path.write_bytes(make_wav(seconds=3, sample_width=sample_width))
+
+    with ThreadPoolExecutor() as pool:
+        result = segment_audio(str(path), window_seconds=2, overlap_seconds=1, executor=pool)
+
+    assert [(s['start'], s['end']) for s in result['segments']] == [(0.0, 2.0), (1.0, 3.0)]
+    for segment in result['segments']:
+        # A half-scale sine: RMS is 0.5 / sqrt(2)
+        assert segment['rms'] == pytest.approx(0.3536, abs=1e-3)
+        assert segment['peak'] == pytest.approx(0.5, abs=1e-3)
+        assert segment['active']
+
+
+def test_segments_are_stored_with_the_session(appmod, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(SegmentStage, '_pool', ThreadPoolExecutor())
+    monkeypatch.setattr(appmod.analysis_pipeline, 'stages',
+                        load_stages('segment,transcribe,sentiment,analyze,validate'))
+
+    response = client.post('/api/therapy/sessions', headers=auth_headers, content_type='multipart/form-data',
+                           data={'audio_file': (io.BytesIO(make_wav(seconds=2, sample_width=3)), 'session.wav')})
+    assert len(response.get_json()['segments']) == 1
+
+    sessions = client.get('/api/therapy/sessions', headers=auth_headers).get_json()['sessions']
+    assert sessions[0]['segments'] == response.get_json()['segments']
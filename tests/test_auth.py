@@ -0,0 +1,46 @@
+"""
+Authentication tests for WellTech AI MedSuite
+Refresh-token rotation against account changes
+"""
+
+USER = {'email': 'dana@clinic.example', 'password': 'long-enough-pass', 'full_name': 'Dana Reyes',
+        'license_type': 'LCSW', 'license_number': 'A-1234', 'state_of_licensure': 'OR'}
+
+
+def approved_user(client, auth_headers):
+    client.post('/api/auth/register', json=USER)
+    users = client.get('/api/admin/users', headers=auth_headers).get_json()['users']
+    user_id = next(u['id'] for u in users if u['email'] == USER['email'])
+    assert client.post(f'/api/admin/users/{user_id}/approve', headers=auth_headers).status_code == 200
+    return user_id
+
+
+def login(client):
+    return client.post('/api/auth/login', json={'email': USER['email'], 'password': USER['password']}).get_json()
+
+
+def test_refresh_rotates(client, auth_headers):
+    approved_user(client, auth_headers)
+    refresh_token = login(client)['refresh_token']
+
+    response = client.post('/api/auth/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    assert client.post('/api/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+
+
+def test_refresh_fails_after_account_change(client, auth_headers):
+    user_id = approved_user(client, auth_headers)
+    refresh_token = login(client)['refresh_token']
+
+    # Any token_version bump retires sessions started before it
+    client.post(f'/api/admin/users/{user_id}/approve', headers=auth_headers)
+    assert client.post('/api/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+    assert client.post('/api/auth/refresh', json={'refresh_token': login(client)['refresh_token']}).status_code == 200
+
+
+def test_refresh_fails_after_rejection(client, auth_headers):
+    user_id = approved_user(client, auth_headers)
+    refresh_token = login(client)['refresh_token']
+
+    client.post(f'/api/admin/users/{user_id}/reject', headers=auth_headers)
+    assert client.post('/api/auth/refresh', json={'refresh_token': refresh_token}).status_code in (401, 403)
@@ -0,0 +1,24 @@
+"""
+Background service tests for WellTech AI MedSuite
+Workers and reapers start from the first request, once per process
+"""
+
+
+def test_services_start_once_per_process(appmod, client, monkeypatch):
+    started = []
+    monkeypatch.setattr(appmod, 'init_database', lambda: started.append('database'))
+    for component, method in [(appmod.email_filter, 'build'), (appmod.session_store, 'start_reaper'),
+                              (appmod.idempotency_store, 'start_reaper'), (appmod.upload_store, 'start_reaper'),
+                              (appmod.blob_store, 'start_collector'), (appmod.file_catalog, 'start_reconciler'),
+                              (appmod.job_queue, 'start'), (appmod.reanalyzer, 'resume'),
+                              (appmod.session_events, 'start_poller')]:
+        monkeypatch.setattr(component, method, lambda *args, name=method, **kwargs: started.append(name))
+    monkeypatch.setattr(appmod, '_services_pid', None)
+    monkeypatch.setitem(appmod.app.config, 'TESTING', False)
+
+    client.get('/api/health')
+    client.get('/api/health')
+
+    assert started.count('database') == 1
+    assert started.count('start') == 1
+    assert len(started) == 10
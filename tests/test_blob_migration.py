@@ -0,0 +1,77 @@
+"""
+Blob migration tests for WellTech AI MedSuite
+Legacy recordings moved into the blob store without copying under the write lock
+"""
+
+import os
+import sqlite3
+
+import blob_migration
+from blob_migration import LegacyMigrator
+
+
+def add_legacy_session(appmod, session_id, path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    with appmod.get_db() as conn:
+        conn.execute('''
+            INSERT INTO therapy_sessions (session_id, user_id, client_name, therapy_type, summary_format, file_path)
+            VALUES (?, 1, 'Client', 'CBT', 'SOAP', ?)
+        ''', (session_id, path))
+        conn.commit()
+
+
+def write_lock_free():
+    conn = sqlite3.connect('welltech_medsuite.db', timeout=0)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('ROLLBACK')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def test_cross_filesystem_copy_runs_outside_the_transaction(client, appmod, monkeypatch):
+    add_legacy_session(appmod, 'legacy-1', os.path.join('uploads', 'legacy.wav'), b'legacy recording')
+
+    def no_link(source, target):
+        raise OSError('cross-device link')
+
+    copies = []
+    copyfile = blob_migration.shutil.copyfile
+
+    def tracked_copyfile(source, target):
+        copies.append(write_lock_free())
+        return copyfile(source, target)
+
+    monkeypatch.setattr(blob_migration.os, 'link', no_link)
+    monkeypatch.setattr(blob_migration.shutil, 'copyfile', tracked_copyfile)
+
+    migrator = LegacyMigrator(appmod.get_db, appmod.blob_store)
+    assert migrator.migrate_file(os.path.join('uploads', 'legacy.wav'), 'legacy.wav') == 'migrated'
+    assert copies == [True]
+
+    with appmod.get_db() as conn:
+        blob_path = conn.execute("SELECT file_path FROM therapy_sessions WHERE session_id = 'legacy-1'").fetchone()[0]
+    assert open(blob_path, 'rb').read() == b'legacy recording'
+    assert not os.path.exists(os.path.join('uploads', 'legacy.wav'))
+    assert not [name for name in os.listdir(os.path.dirname(blob_path)) if name.endswith('.migrating')]
+
+
+def test_existing_blob_leaves_no_staged_file(client, appmod):
+    content = b'shared recording'
+    add_legacy_session(appmod, 'legacy-1', os.path.join('uploads', 'first.wav'), content)
+    add_legacy_session(appmod, 'legacy-2', os.path.join('uploads', 'second.wav'), content)
+
+    migrator = LegacyMigrator(appmod.get_db, appmod.blob_store)
+    assert migrator.run() == {'migrated': 2, 'missing': 0, 'unreferenced': 0, 'failed': 0}
+
+    with appmod.get_db() as conn:
+        paths = {row[0] for row in conn.execute('SELECT file_path FROM therapy_sessions')}
+        refcount = conn.execute('SELECT refcount FROM blobs').fetchone()[0]
+    assert len(paths) == 1 and refcount == 2
+    blob_path = paths.pop()
+    assert os.listdir(os.path.dirname(blob_path)) == [os.path.basename(blob_path)]
@@ -0,0 +1,91 @@
+"""
+Blob store tests for WellTech AI MedSuite
+Reference counting under concurrent writers, releases and collection
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from blob_store import BlobStore
+
+CONTENT = {f"{i:064x}": f"recording {i}".encode() for i in range(4)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    @contextmanager
+    def get_db():
+        conn = sqlite3.connect(str(tmp_path / 'blobs.db'), timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    store = BlobStore(get_db, root=str(tmp_path / 'blobs'), grace_seconds=0)
+    store.init_schema()
+    store.staging = tmp_path / 'staging'
+    store.staging.mkdir()
+    return store
+
+
+def put(store, session_id, sha256):
+    source = store.staging / session_id
+    source.write_bytes(CONTENT[sha256])
+    return store.put(str(source), sha256, len(CONTENT[sha256]), session_id, '.wav')[0]
+
+
+def test_concurrent_writers_keep_referenced_blobs(store):
+    errors = []
+
+    def writer(worker):
+        try:
+            for n in range(40):
+                sha256 = list(CONTENT)[(worker + n) % len(CONTENT)]
+                session_id = f"s-{worker}-{n}"
+                path = put(store, session_id, sha256)
+                assert open(path, 'rb').read() == CONTENT[sha256]
+                if n % 3:
+                    store.release(session_id)
+                store.collect()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.collect()
+
+    assert not errors
+    with store.get_db() as conn:
+        blobs = conn.execute('SELECT sha256, path, refcount FROM blobs').fetchall()
+        refs = dict(conn.execute('SELECT sha256, COUNT(*) FROM blob_refs GROUP BY sha256').fetchall())
+    assert blobs
+    for sha256, path, refcount in blobs:
+        assert refcount == refs.get(sha256, 0)
+        assert refcount > 0 and open(path, 'rb').read() == CONTENT[sha256]
+
+
+def test_transfer_to_session_without_a_reference_keeps_the_blob(store):
+    sha256 = next(iter(CONTENT))
+    path = put(store, 'new', sha256)
+
+    assert store.transfer('new', 'legacy') == 1
+    store.collect()
+    assert os.path.exists(path)
+    assert store.release('legacy') == 0
+
+
+def test_transfer_to_referencing_session_releases(store):
+    sha256 = next(iter(CONTENT))
+    put(store, 'earlier', sha256)
+    put(store, 'new', sha256)
+
+    assert store.transfer('new', 'earlier') == 1
+    assert store.release('new') is None
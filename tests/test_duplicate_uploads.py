@@ -0,0 +1,38 @@
+"""
+Duplicate upload tests for WellTech AI MedSuite
+Content matching and blob references when the same recording is uploaded again
+"""
+
+import io
+
+
+def upload(client, headers, data, name='session.wav'):
+    return client.post('/api/therapy/sessions', headers=headers, content_type='multipart/form-data',
+                       data={'client_name': 'Dana', 'audio_file': (io.BytesIO(data), name)})
+
+
+def test_reupload_is_duplicate(appmod, client, auth_headers, wav_bytes, monkeypatch):
+    first = upload(client, auth_headers, wav_bytes).get_json()
+    second = upload(client, auth_headers, wav_bytes).get_json()
+    assert second['duplicate'] is True
+    assert second['sessionId'] == first['sessionId']
+
+    # The dropped upload's reference must not take the stored recording with it
+    monkeypatch.setattr(appmod.blob_store, 'grace_seconds', 0)
+    appmod.blob_store.collect()
+    files = client.get('/api/files/list', headers=auth_headers).get_json()['files']
+    assert client.get(f"/api/files/{files[0]['id']}/download", headers=auth_headers).data == wav_bytes
+
+
+def test_reupload_after_delete_is_stored(client, auth_headers, wav_bytes):
+    upload(client, auth_headers, wav_bytes)
+    files = client.get('/api/files/list', headers=auth_headers).get_json()['files']
+    assert client.delete(f"/api/files/{files[0]['id']}", headers=auth_headers).status_code == 200
+
+    response = upload(client, auth_headers, wav_bytes).get_json()
+    assert not response.get('duplicate')
+    files = client.get('/api/files/list', headers=auth_headers).get_json()['files']
+    assert [f['sessionId'] for f in files] == [response['sessionId']]
+    download = client.get(f"/api/files/{files[0]['id']}/download", headers=auth_headers)
+    assert download.status_code == 200
+    assert download.data == wav_bytes
@@ -0,0 +1,41 @@
+"""
+Event stream authentication tests for WellTech AI MedSuite
+Single-use stream tickets instead of access tokens in URLs
+"""
+
+import pytest
+
+
+@pytest.fixture
+def session_id(client, auth_headers):
+    return client.post('/api/therapy/sessions', headers=auth_headers, json={}).get_json()['sessionId']
+
+
+def events(client, url):
+    return client.get(url, headers={'Accept': 'text/event-stream'}, buffered=False)
+
+
+def test_ticket_opens_the_stream_once(client, auth_headers, session_id):
+    url = client.post(f'/api/therapy/sessions/{session_id}/events/ticket', headers=auth_headers).get_json()['streamUrl']
+
+    first = events(client, url)
+    assert first.status_code == 200
+    assert first.mimetype == 'text/event-stream'
+    first.close()
+    assert events(client, url).status_code == 401
+
+
+def test_access_token_is_not_accepted_in_the_url(client, auth_headers, session_id):
+    token = auth_headers['Authorization'].split(' ')[1]
+    assert events(client, f'/api/therapy/sessions/{session_id}/events?access_token={token}').status_code == 401
+    assert events(client, f'/api/therapy/sessions/{session_id}/events?ticket={token}').status_code == 401
+
+
+def test_ticket_is_not_an_access_token(client, auth_headers, session_id):
+    ticket = client.post(f'/api/therapy/sessions/{session_id}/events/ticket', headers=auth_headers).get_json()['ticket']
+    assert client.get('/api/files/list', headers={'Authorization': f'Bearer {ticket}'}).status_code == 401
+
+
+def test_ticket_is_bound_to_its_session(client, auth_headers, session_id):
+    ticket = client.post('/api/therapy/sessions/other/events/ticket', headers=auth_headers).get_json()['ticket']
+    assert events(client, f'/api/therapy/sessions/{session_id}/events?ticket={ticket}').status_code == 401
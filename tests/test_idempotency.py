@@ -0,0 +1,69 @@
+"""
+Idempotency store tests for WellTech AI MedSuite
+Waiting duplicates poll with reads and only lock to claim
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from idempotency import IdempotencyStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    statements = []
+
+    @contextmanager
+    def get_db():
+        conn = sqlite3.connect(str(tmp_path / 'keys.db'), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.set_trace_callback(statements.append)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    store = IdempotencyStore(get_db)
+    store.init_schema()
+    store.statements = statements
+    return store
+
+
+def write_locks(store):
+    return sum(statement == 'BEGIN IMMEDIATE' for statement in store.statements)
+
+
+def test_waiter_replays_without_taking_the_write_lock(store):
+    assert store.begin(1, 'key', b'fp') == ('claimed', None)
+    threading.Timer(0.8, store.complete, (1, 'key', 200, b'{"ok": true}', 'application/json')).start()
+
+    store.statements.clear()
+    status, record = store.wait(1, 'key', b'fp', timeout=5)
+
+    assert status == 'replay' and record['body'] == b'{"ok": true}'
+    assert write_locks(store) == 0
+
+
+def test_waiter_claims_a_released_key(store):
+    store.begin(1, 'key', b'fp')
+    threading.Timer(0.3, store.release, (1, 'key')).start()
+
+    store.statements.clear()
+    assert store.wait(1, 'key', b'fp', timeout=5) == ('claimed', None)
+    assert write_locks(store) == 1
+
+
+def test_waiter_times_out_while_in_progress(store):
+    store.begin(1, 'key', b'fp')
+    store.statements.clear()
+    assert store.wait(1, 'key', b'fp', timeout=0.6) == ('in-progress', None)
+    assert write_locks(store) == 0
+
+
+def test_reused_key_with_other_request_is_refused(store):
+    store.begin(1, 'key', b'fp')
+    assert store.begin(1, 'key', b'other') == ('mismatch', None)
+    assert store.begin(2, 'key', b'other') == ('claimed', None)
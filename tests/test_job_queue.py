@@ -0,0 +1,89 @@
+"""
+Job queue tests for WellTech AI MedSuite
+Leases: reclaimed after they run out, renewed while a job is still running
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def get_db(tmp_path):
+    @contextmanager
+    def get_db():
+        conn = sqlite3.connect(str(tmp_path / 'jobs.db'), timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return get_db
+
+
+def make_queue(get_db, handler=lambda payload: {'ok': True}, **options):
+    queue = JobQueue(get_db, handler, **options)
+    queue.init_schema()
+    return queue
+
+
+def test_expired_lease_is_reclaimed(get_db):
+    queue = make_queue(get_db, lease_seconds=0.2)
+    job_id = queue.enqueue({'n': 1})
+
+    # A worker claims the job and dies without finishing it
+    assert queue._claim() == (job_id, {'n': 1}, 1)
+    assert queue._claim() is None
+
+    time.sleep(0.3)
+    assert queue._claim() == (job_id, {'n': 1}, 2)
+    assert queue.get(job_id)['status'] == 'running'
+
+
+def test_running_job_keeps_its_lease(get_db):
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def handler(payload):
+        runs.append(payload)
+        started.set()
+        release.wait(5)
+        return {'done': True}
+
+    queue = make_queue(get_db, handler, lease_seconds=0.2, heartbeat_seconds=0.05)
+    job_id = queue.enqueue({'n': 1})
+    worker = threading.Thread(target=queue._run, args=queue._claim())
+    worker.start()
+    assert started.wait(5)
+
+    # Several lease lengths later, another worker still finds nothing to claim
+    deadline = time.monotonic() + 0.8
+    while time.monotonic() < deadline:
+        assert queue._claim() is None
+        time.sleep(0.05)
+
+    release.set()
+    worker.join()
+    job = queue.get(job_id)
+    assert (job['status'], job['attempts'], job['result']) == ('completed', 1, {'done': True})
+    assert runs == [{'n': 1}]
+
+
+def test_failed_job_is_retried_then_failed(get_db):
+    def handler(payload):
+        raise RuntimeError('analysis unavailable')
+
+    queue = make_queue(get_db, handler, max_attempts=2)
+    job_id = queue.enqueue({'n': 1})
+
+    queue._run(*queue._claim())
+    assert queue.get(job_id)['status'] == 'queued'
+    queue._run(*queue._claim())
+    job = queue.get(job_id)
+    assert (job['status'], job['attempts'], job['error']) == ('failed', 2, 'analysis unavailable')
+    assert queue._claim() is None
@@ -0,0 +1,136 @@
+"""
+Resumable upload tests for WellTech AI MedSuite
+Chunked uploads at byte offsets, resumed after a dropped connection and handed to session creation
+"""
+
+import os
+
+import pytest
+
+CHUNK_SIZE = 4096
+
+
+@pytest.fixture
+def store(appmod, client, monkeypatch):
+    monkeypatch.setattr(appmod.upload_store, 'chunk_size', CHUNK_SIZE)
+    return appmod.upload_store
+
+
+def create(client, headers, size, file_name='session.wav'):
+    return client.post('/api/uploads', headers=headers, json={'fileName': file_name, 'size': size})
+
+
+def patch(client, headers, upload_id, offset, data):
+    return client.patch(f'/api/uploads/{upload_id}', headers=dict(headers, **{'Upload-Offset': str(offset)}),
+                        data=data, content_type='application/offset+octet-stream')
+
+
+def send(client, headers, upload_id, data, start=0):
+    for offset in range(start, len(data), CHUNK_SIZE):
+        response = patch(client, headers, upload_id, offset, data[offset:offset + CHUNK_SIZE])
+        assert response.status_code == 200, response.get_json()
+    return response
+
+
+def test_create_returns_the_upload(store, client, auth_headers, wav_bytes):
+    response = create(client, auth_headers, len(wav_bytes))
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body['offset'], body['status'], body['chunkSize']) == (0, 'uploading', CHUNK_SIZE)
+    assert response.headers['Location'] == body['uploadUrl'] == f"/api/uploads/{body['uploadId']}"
+    assert os.path.getsize(store.part_path(body['uploadId'])) == 0
+
+
+def test_sequential_chunks_complete_the_upload(store, client, auth_headers, wav_bytes):
+    upload_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+    first = patch(client, auth_headers, upload_id, 0, wav_bytes[:CHUNK_SIZE])
+    assert first.headers['Upload-Offset'] == str(CHUNK_SIZE)
+    assert first.get_json()['status'] == 'uploading'
+
+    last = send(client, auth_headers, upload_id, wav_bytes, start=CHUNK_SIZE)
+    assert last.get_json()['status'] == 'complete'
+    assert last.headers['Upload-Offset'] == str(len(wav_bytes))
+    with open(store.part_path(upload_id), 'rb') as f:
+        assert f.read() == wav_bytes
+
+
+def test_stale_offset_gets_409_with_the_committed_offset(store, client, auth_headers, wav_bytes):
+    upload_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+    send(client, auth_headers, upload_id, wav_bytes[:2 * CHUNK_SIZE])
+
+    # A retried chunk whose first attempt was committed after all
+    response = patch(client, auth_headers, upload_id, CHUNK_SIZE, wav_bytes[CHUNK_SIZE:2 * CHUNK_SIZE])
+    assert response.status_code == 409
+    assert response.get_json()['offset'] == 2 * CHUNK_SIZE
+
+    # Chunks must be chunkSize long
+    response = patch(client, auth_headers, upload_id, 2 * CHUNK_SIZE, wav_bytes[2 * CHUNK_SIZE:2 * CHUNK_SIZE + 10])
+    assert response.status_code == 400
+
+
+def test_get_resumes_from_the_committed_offset(store, client, auth_headers, wav_bytes):
+    upload_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+    send(client, auth_headers, upload_id, wav_bytes[:CHUNK_SIZE])
+
+    # The connection dropped; ask where to continue
+    response = client.get(f'/api/uploads/{upload_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers['Upload-Offset'] == str(CHUNK_SIZE)
+    assert response.headers['Cache-Control'] == 'no-store'
+    offset = response.get_json()['offset']
+
+    assert send(client, auth_headers, upload_id, wav_bytes, start=offset).get_json()['status'] == 'complete'
+
+
+def test_finished_upload_becomes_the_session_recording(store, client, auth_headers, wav_bytes):
+    upload_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+
+    # Not before the last chunk is in
+    response = client.post('/api/therapy/sessions', headers=auth_headers, json={'uploadId': upload_id})
+    assert response.status_code == 409
+
+    send(client, auth_headers, upload_id, wav_bytes)
+    response = client.post('/api/therapy/sessions', headers=auth_headers,
+                           json={'uploadId': upload_id, 'clientName': 'Dana'})
+    assert response.status_code == 200
+    session_id = response.get_json()['sessionId']
+
+    files = client.get('/api/files/list', headers=auth_headers).get_json()['files']
+    assert [f['sessionId'] for f in files] == [session_id]
+    assert client.get(f"/api/files/{files[0]['id']}/download", headers=auth_headers).data == wav_bytes
+
+    # The part file was moved, not copied, and the upload is gone
+    assert not os.path.exists(store.part_path(upload_id))
+    assert client.get(f'/api/uploads/{upload_id}', headers=auth_headers).status_code == 404
+    response = client.post('/api/therapy/sessions', headers=auth_headers, json={'uploadId': upload_id})
+    assert response.status_code == 404
+
+
+def test_size_cap(store, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(store, 'max_size', 10000)
+    response = create(client, auth_headers, 10001)
+    assert response.status_code == 413
+    assert create(client, auth_headers, 10000).status_code == 201
+
+    assert create(client, auth_headers, 0).status_code == 400
+    assert create(client, auth_headers, 100, file_name='notes.txt').status_code == 400
+
+
+def test_expired_uploads_are_reaped(store, client, auth_headers, wav_bytes, monkeypatch):
+    monkeypatch.setattr(store, 'ttl_seconds', -1)
+    expired_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+    monkeypatch.setattr(store, 'ttl_seconds', 3600)
+    live_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+
+    assert store.reap_expired() == 1
+    assert not os.path.exists(store.part_path(expired_id))
+    assert client.get(f'/api/uploads/{expired_id}', headers=auth_headers).status_code == 404
+    assert patch(client, auth_headers, expired_id, 0, wav_bytes[:CHUNK_SIZE]).status_code == 404
+    assert client.get(f'/api/uploads/{live_id}', headers=auth_headers).status_code == 200
+
+
+def test_delete_abandons_the_upload(store, client, auth_headers, wav_bytes):
+    upload_id = create(client, auth_headers, len(wav_bytes)).get_json()['uploadId']
+    assert client.delete(f'/api/uploads/{upload_id}', headers=auth_headers).status_code == 200
+    assert not os.path.exists(store.part_path(upload_id))
+    assert client.delete(f'/api/uploads/{upload_id}', headers=auth_headers).status_code == 404
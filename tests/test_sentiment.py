@@ -0,0 +1,54 @@
+"""
+Sentiment tests for WellTech AI MedSuite
+Lexicon scoring of real transcripts through the sentiment stage
+"""
+
+from analysis_engine import SENTIMENT_ANALYSIS
+from analysis_pipeline import SentimentStage
+from sentiment_engine import analyze_sentiment
+
+TRANSCRIPT = (
+    "Therapist: How has the week been? "
+    "Client: Honestly I have been anxious and overwhelmed. I keep worrying about deadlines at work, "
+    "and I lie awake most nights with my heart racing. I feel exhausted and a bit hopeless. "
+    "Therapist: What did you try when that happened? "
+    "Client: I practiced the breathing exercise and did the homework journal twice. It helped. "
+    "Therapist: That is real progress. "
+    "Client: Yes, by the weekend I felt calmer and more hopeful, and I want to keep that routine going."
+)
+
+
+def run_stage(transcript):
+    return SentimentStage().run({'transcribe': {'transcript': transcript}})['sentimentAnalysis']
+
+
+def test_transcript_is_scored():
+    sentiment = run_stage(TRANSCRIPT)
+
+    assert sentiment is not SENTIMENT_ANALYSIS
+    categories = sentiment['scores']['categories']
+    assert categories['anxiety'] >= 4
+    assert categories['coping'] >= 3 and categories['engagement'] >= 2
+    assert categories['risk'] == 0
+    assert sentiment['riskAssessment'].startswith('Low risk')
+    assert 'Affect improved over the course of the session' in sentiment['progressIndicators']
+    assert sentiment['keyEmotionalIndicators'][0].startswith('Anxiety and worry')
+
+
+def test_negated_words_do_not_count():
+    scores = run_stage("I am not anxious and never hopeless these days, I feel calm.")['scores']
+    assert scores['categories']['anxiety'] == 0
+    assert scores['categories']['sadness'] == 0
+    assert scores['categories']['hope'] == 1
+
+
+def test_batch_matches_single_scoring():
+    transcripts = [TRANSCRIPT, "I thought about suicide last night.", "", TRANSCRIPT.upper()]
+    batch = analyze_sentiment(transcripts)
+    assert batch == [analyze_sentiment([t])[0] for t in transcripts]
+    assert batch[1]['riskAssessment'].startswith('Elevated')
+    assert batch[3] == batch[0]
+
+
+def test_placeholder_transcript_falls_back():
+    assert run_stage("Audio file 'session.wav' (16044 bytes) saved to uploads/blobs/ab/cd/x.wav") is SENTIMENT_ANALYSIS
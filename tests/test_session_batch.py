@@ -0,0 +1,132 @@
+"""
+Batch session tests for WellTech AI MedSuite
+Per-item statuses, in-batch duplicates, limits and asynchronous batches
+"""
+
+import io
+import json
+
+from conftest import make_wav
+
+
+def post_batch(client, headers, files=(), sessions=None, query='', **form):
+    data = dict(form, audio_files=[(io.BytesIO(content), name) for name, content in files])
+    if sessions is not None:
+        data['sessions'] = json.dumps(sessions)
+    return client.post(f'/api/therapy/sessions/batch{query}', headers=headers,
+                       content_type='multipart/form-data', data=data)
+
+
+def blob_refcounts(appmod):
+    with appmod.get_db() as conn:
+        return [row[0] for row in conn.execute('SELECT refcount FROM blobs ORDER BY created_at')]
+
+
+def stored_sessions(appmod):
+    with appmod.get_db() as conn:
+        return {row['session_id']: dict(row) for row in conn.execute('SELECT * FROM therapy_sessions')}
+
+
+def test_mixed_completed_rejected_and_duplicate_items(appmod, client, auth_headers, wav_bytes):
+    files = [('first.wav', wav_bytes), ('notes.txt', b'not a recording'), ('again.wav', wav_bytes),
+             ('other.wav', make_wav(tone=660))]
+    response = post_batch(client, auth_headers, files, client_name='Dana')
+    assert response.status_code == 200
+    body = response.get_json()
+    statuses = body['sessions']
+
+    assert [s['status'] for s in statuses] == ['completed', 'rejected', 'duplicate', 'completed']
+    assert [s['index'] for s in statuses] == [0, 1, 2, 3]
+    assert body['success'] is False and body['total'] == 4 and body['accepted'] == 2
+    assert 'Unsupported file type' in statuses[1]['error']
+
+    repeat = statuses[2]
+    assert repeat['duplicateOf'] == repeat['sessionId'] == statuses[0]['sessionId']
+    assert repeat['fileName'] == 'again.wav'
+    assert repeat['result'] == statuses[0]['result']
+
+    assert set(stored_sessions(appmod)) == {statuses[0]['sessionId'], statuses[3]['sessionId']}
+    # The repeat's reference was dropped; each stored session holds its own recording
+    assert blob_refcounts(appmod) == [1, 1]
+
+
+def test_repeat_of_a_failed_item_fails_too(appmod, client, auth_headers, wav_bytes, monkeypatch):
+    def fail(session_id, inputs, listener=None, reuse=None):
+        raise RuntimeError('analysis unavailable')
+
+    monkeypatch.setattr(appmod.analysis_pipeline, 'run', fail)
+    files = [('first.wav', wav_bytes), ('again.wav', wav_bytes)]
+    statuses = post_batch(client, auth_headers, files).get_json()['sessions']
+
+    assert [s['status'] for s in statuses] == ['failed', 'failed']
+    assert 'duplicateOf' not in statuses[1]
+    assert statuses[1]['sessionId'] != statuses[0]['sessionId']
+    assert statuses[1]['error'].startswith('Identical to item 0, which failed')
+    assert stored_sessions(appmod) == {}
+
+    # No session holds the recording any more, so the collector may take it
+    monkeypatch.setattr(appmod.blob_store, 'grace_seconds', 0)
+    assert blob_refcounts(appmod) == [0]
+    assert appmod.blob_store.collect() == 1
+
+
+def test_json_descriptors(appmod, client, auth_headers):
+    response = client.post('/api/therapy/sessions/batch', headers=auth_headers, json={'sessions': [
+        {'clientName': 'Dana', 'therapyType': 'DBT', 'summaryFormat': 'BIRP'},
+        {'clientName': 'Sam'}
+    ]})
+    assert response.status_code == 200
+    statuses = response.get_json()['sessions']
+    assert [s['status'] for s in statuses] == ['completed', 'completed']
+
+    stored = stored_sessions(appmod)
+    assert [(stored[s['sessionId']]['client_name'], stored[s['sessionId']]['therapy_type'],
+             stored[s['sessionId']]['summary_format']) for s in statuses] == [('Dana', 'DBT', 'BIRP'),
+                                                                              ('Sam', 'CBT', 'SOAP')]
+
+
+def test_descriptors_describe_files_and_extra_items(appmod, client, auth_headers, wav_bytes):
+    statuses = post_batch(client, auth_headers, [('first.wav', wav_bytes)], therapy_type='EMDR',
+                          sessions=[{'clientName': 'Dana'}, {'clientName': 'Sam'}]).get_json()['sessions']
+    assert [s['status'] for s in statuses] == ['completed', 'completed']
+
+    stored = stored_sessions(appmod)
+    with_audio, without_audio = (stored[s['sessionId']] for s in statuses)
+    assert (with_audio['client_name'], with_audio['therapy_type']) == ('Dana', 'EMDR')
+    assert with_audio['file_path'] is not None
+    assert (without_audio['client_name'], without_audio['file_path']) == ('Sam', None)
+
+
+def test_invalid_descriptors_are_refused(client, auth_headers):
+    response = client.post('/api/therapy/sessions/batch', headers=auth_headers, json={'sessions': ['Dana']})
+    assert response.status_code == 400
+    assert client.post('/api/therapy/sessions/batch', headers=auth_headers, json={}).status_code == 400
+
+
+def test_batch_size_limit(appmod, client, auth_headers, monkeypatch):
+    monkeypatch.setitem(appmod.app.config, 'MAX_BATCH_SESSIONS', 2)
+    response = client.post('/api/therapy/sessions/batch', headers=auth_headers,
+                           json={'sessions': [{'clientName': f'Client {i}'} for i in range(3)]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'At most 2 sessions per batch'
+    assert stored_sessions(appmod) == {}
+
+
+def test_async_batch_queues_jobs(appmod, client, auth_headers, wav_bytes):
+    response = post_batch(client, auth_headers, [('first.wav', wav_bytes), ('again.wav', wav_bytes)],
+                          query='?async=1')
+    assert response.status_code == 202
+    statuses = response.get_json()['sessions']
+    assert [s['status'] for s in statuses] == ['queued', 'duplicate']
+    # The repeat shares the earlier item's job
+    assert statuses[1]['jobId'] == statuses[0]['jobId']
+    assert statuses[1]['duplicateOf'] == statuses[0]['sessionId']
+    assert blob_refcounts(appmod) == [1]
+
+    job = client.get(statuses[0]['statusUrl'], headers=auth_headers).get_json()
+    assert (job['status'], job['sessionId']) == ('queued', statuses[0]['sessionId'])
+
+    appmod.job_queue._run(*appmod.job_queue._claim())
+    job = client.get(statuses[0]['statusUrl'], headers=auth_headers).get_json()
+    assert job['status'] == 'completed'
+    assert set(stored_sessions(appmod)) == {statuses[0]['sessionId']}
@@ -0,0 +1,25 @@
+"""
+Session note tests for WellTech AI MedSuite
+Format selection on the note endpoint
+"""
+
+import pytest
+
+
+@pytest.fixture
+def session_id(client, auth_headers):
+    return client.post('/api/therapy/sessions', headers=auth_headers, json={}).get_json()['sessionId']
+
+
+@pytest.mark.parametrize('requested, expected', [('birp', 'BIRP'), ('markdown', 'Markdown'), ('MD', 'Markdown'),
+                                                 ('Plain', 'plain'), ('json', 'JSON')])
+def test_formats_are_case_insensitive(client, auth_headers, session_id, requested, expected):
+    response = client.get(f'/api/therapy/sessions/{session_id}/note?format={requested}', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['format'] == expected
+
+
+def test_unknown_format_is_rejected(client, auth_headers, session_id):
+    response = client.get(f'/api/therapy/sessions/{session_id}/note?format=XML', headers=auth_headers)
+    assert response.status_code == 400
+    assert 'SOAP' in response.get_json()['supportedFormats']
@@ -0,0 +1,132 @@
+"""
+Single-flight tests for WellTech AI MedSuite
+Identical concurrent calls share one execution and are counted as coalesced
+"""
+
+import threading
+import time
+
+import pytest
+
+import analysis_engine
+from analysis_pipeline import AnalyzeStage
+from single_flight import SingleFlight
+
+CALLERS = 8
+HOPEFUL = dict(analysis_engine.SENTIMENT_ANALYSIS, overallEmotionalTone='Hopeful')
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def run_concurrently(target, callers=CALLERS):
+    results = [None] * callers
+    errors = []
+
+    def call(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def compute():
+        runs.append(1)
+        release.wait(5)
+        return {'value': 42}
+
+    threads, results, errors = run_concurrently(lambda: flight.do('key', compute))
+    wait_for(lambda: flight.stats()['coalesced'] == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(runs) == 1
+    assert all(result is results[0] for result in results) and results[0] == {'value': 42}
+    assert flight.stats() == {'calls': CALLERS, 'executions': 1, 'coalesced': CALLERS - 1,
+                              'coalescingRate': round((CALLERS - 1) / CALLERS, 4), 'inFlight': 0}
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError('analysis failed')
+
+    threads, results, errors = run_concurrently(lambda: flight.do('key', compute), callers=4)
+    wait_for(lambda: flight.stats()['coalesced'] == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 4 and all(isinstance(e, ValueError) for e in errors)
+    # Nothing is kept: the next call runs again
+    assert flight.do('key', lambda: 'retried') == 'retried'
+
+
+def test_distinct_keys_run_separately():
+    flight = SingleFlight()
+    assert [flight.do(i, lambda i=i: i * 2) for i in range(3)] == [0, 2, 4]
+    assert flight.stats()['executions'] == 3 and flight.stats()['coalesced'] == 0
+
+
+def test_analyze_stage_coalesces_identical_sessions(monkeypatch):
+    release = threading.Event()
+    runs = []
+    analyze = analysis_engine._analyze_note
+
+    def blocking_analyze(*args):
+        runs.append(args[:4])
+        release.wait(5)
+        return analyze(*args)
+
+    monkeypatch.setattr(analysis_engine, '_analyze_note', blocking_analyze)
+    before = analysis_engine.analysis_flight.stats()
+    context = {'client_name': 'Dana', 'therapy_type': 'CBT', 'summary_format': 'SOAP', 'date': '2026-10-19',
+               'sentiment': {'sentimentAnalysis': HOPEFUL}}
+
+    threads, results, errors = run_concurrently(lambda: AnalyzeStage().run(dict(context)))
+    wait_for(lambda: analysis_engine.analysis_flight.stats()['coalesced'] - before['coalesced'] == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert runs == [('Dana', 'CBT', 'SOAP', '2026-10-19')]
+    assert all(result == results[0] for result in results)
+    assert results[0]['noteIR']['sentiment'] == HOPEFUL
+    # Each caller gets its own copy of the shared result
+    results[0]['extra'] = True
+    assert 'extra' not in results[1]
+
+    after = analysis_engine.analysis_flight.stats()
+    assert after['executions'] - before['executions'] == 1
+    assert after['coalescingRate'] > 0
+
+
+@pytest.mark.parametrize('field, value', [
+    ('summary_format', 'BIRP'),
+    ('sentiment', {'sentimentAnalysis': dict(HOPEFUL, overallEmotionalTone='Calm')})
+])
+def test_analyze_stage_keys_on_format_and_sentiment(field, value):
+    context = {'client_name': 'Dana', 'therapy_type': 'CBT', 'summary_format': 'SOAP', 'date': '2026-10-19',
+               'sentiment': {'sentimentAnalysis': HOPEFUL}}
+    other = dict(context, **{field: value})
+    assert AnalyzeStage().run(context) != AnalyzeStage().run(other)
@@ -0,0 +1,104 @@
+"""
+Upload ingest tests for WellTech AI MedSuite
+Screening and metering file parts while the request body streams to disk
+"""
+
+import io
+import os
+
+from media_probe import screen_head
+from upload_ingest import IngestFile, UploadBudget
+from conftest import make_wav
+
+
+def test_rejected_part_stops_being_written(tmp_path):
+    part = IngestFile(str(tmp_path), UploadBudget(), screen_head, 'session.wav')
+    for _ in range(100):
+        part.write(b'\0' * 64 * 1024)
+
+    assert isinstance(part.rejection, ValueError)
+    assert os.path.getsize(part.temp_path) == 0
+    part.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_accepted_part_is_written_whole(tmp_path):
+    data = make_wav(seconds=2)
+    part = IngestFile(str(tmp_path), UploadBudget(), screen_head, 'session.wav')
+    for offset in range(0, len(data), 1000):
+        part.write(data[offset:offset + 1000])
+
+    assert part.rejection is None
+    part.seek(0)
+    assert part.read() == data
+
+
+def test_session_upload_of_non_audio_is_refused(client, auth_headers):
+    response = client.post('/api/therapy/sessions', headers=auth_headers, content_type='multipart/form-data',
+                           data={'audio_file': (io.BytesIO(os.urandom(256 * 1024)), 'session.mp4')})
+    assert response.status_code == 400
+    assert [name for name in os.listdir('uploads') if not os.path.isdir(os.path.join('uploads', name))] == []
+
+
+def ingest_leftovers():
+    return [os.path.join(root, name) for root, _, names in os.walk('uploads')
+            for name in names if name.startswith('.ingest-') and name.endswith('.tmp')]
+
+
+def test_upload_over_the_quota_stops_streaming(appmod, client, auth_headers, monkeypatch):
+    monkeypatch.setitem(appmod.app.config, 'USER_STORAGE_QUOTA_MB', 1)
+    received = []
+    spend = UploadBudget.spend
+
+    def metered_spend(self, count):
+        received.append(count)
+        spend(self, count)
+
+    monkeypatch.setattr(UploadBudget, 'spend', metered_spend)
+    # Within the up-front Content-Length allowance, so only the streamed bytes can trip the quota
+    data = make_wav(seconds=1) + b'\0' * (1024 * 1024 + 32 * 1024)
+    response = client.post('/api/therapy/sessions', headers=auth_headers, content_type='multipart/form-data',
+                           data={'audio_file': (io.BytesIO(data), 'session.wav')})
+
+    assert response.status_code == 413
+    assert 'storage allowance' in response.get_json()['error']
+    # Tripped by the bytes written, not by the declared length
+    assert sum(received) > 1024 * 1024
+    assert ingest_leftovers() == []
+    assert client.get('/api/files/list', headers=auth_headers).get_json()['files'] == []
+
+
+def test_upload_declared_over_the_quota_is_refused_unread(appmod, client, auth_headers, monkeypatch):
+    monkeypatch.setitem(appmod.app.config, 'USER_STORAGE_QUOTA_MB', 1)
+    data = make_wav(seconds=1) + b'\0' * (2 * 1024 * 1024)
+    response = client.post('/api/therapy/sessions', headers=auth_headers, content_type='multipart/form-data',
+                           data={'audio_file': (io.BytesIO(data), 'session.wav')})
+
+    assert response.status_code == 413
+    assert 'remaining storage quota' in response.get_json()['error']
+    assert not os.path.exists('uploads') or ingest_leftovers() == []
+
+
+def test_rejected_part_is_discarded_unwritten(client, auth_headers, wav_bytes, monkeypatch):
+    on_disk = {}
+    write = IngestFile.write
+
+    def tracked_write(self, data):
+        result = write(self, data)
+        on_disk[self.filename] = max(on_disk.get(self.filename, 0), os.path.getsize(self.temp_path))
+        return result
+
+    monkeypatch.setattr(IngestFile, 'write', tracked_write)
+    noise = os.urandom(1024 * 1024)
+    parts = [(io.BytesIO(noise), 'noise.mp4'), (io.BytesIO(wav_bytes), 'session.wav')]
+    response = client.post('/api/therapy/sessions/batch', headers=auth_headers, content_type='multipart/form-data',
+                           data={'audio_files': parts})
+
+    statuses = response.get_json()['sessions']
+    assert [s['status'] for s in statuses] == ['rejected', 'completed']
+    # Only the bytes before the screen ran ever reached the disk
+    assert on_disk['noise.mp4'] < len(noise) // 4
+    assert on_disk['session.wav'] == len(wav_bytes)
+    assert ingest_leftovers() == []
+    files = client.get('/api/files/list', headers=auth_headers).get_json()['files']
+    assert [f['fileName'] for f in files] == ['session.wav']
@@ -0,0 +1,62 @@
+"""
+Waveform peak tests for WellTech AI MedSuite
+Peaks are written in the background after upload and served once ready
+"""
+
+import io
+import time
+
+import waveform
+from waveform import PeaksWriter, read_peaks, PEAKS_PER_SECOND
+from conftest import make_wav
+
+
+def upload(client, headers, data):
+    client.post('/api/therapy/sessions', headers=headers, content_type='multipart/form-data',
+                data={'audio_file': (io.BytesIO(data), 'session.wav')})
+    return client.get('/api/files/list', headers=headers).get_json()['files'][0]['id']
+
+
+def test_peaks_are_served_once_written(client, auth_headers):
+    file_id = upload(client, auth_headers, make_wav(seconds=2))
+
+    deadline = time.monotonic() + 10
+    response = client.get(f'/api/files/{file_id}/peaks', headers=auth_headers)
+    while response.status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = client.get(f'/api/files/{file_id}/peaks', headers=auth_headers)
+
+    assert response.status_code == 200
+    sample_rate, _, peaks = read_peaks(response.data)
+    assert sample_rate == 8000
+    assert len(peaks) == 2 * PEAKS_PER_SECOND
+
+
+def test_unsupported_format_has_no_peaks(client, auth_headers):
+    file_id = upload(client, auth_headers, make_wav(seconds=1, sample_width=3))
+    assert client.get(f'/api/files/{file_id}/peaks', headers=auth_headers).status_code == 404
+
+
+def test_failed_recordings_are_not_queued_again(tmp_path, monkeypatch):
+    writes = []
+
+    def failing_write_peaks(file_path):
+        writes.append(file_path)
+        raise OSError('disk full')
+
+    monkeypatch.setattr(waveform, 'write_peaks', failing_write_peaks)
+    paths = []
+    for i in range(16):
+        path = tmp_path / f'session-{i}.wav'
+        path.write_bytes(make_wav(seconds=0.1))
+        paths.append(str(path))
+
+    writer = PeaksWriter(workers=4)
+    assert all(writer.schedule(path) for path in paths)
+    deadline = time.monotonic() + 10
+    while any(writer.pending(path) for path in paths) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert sorted(writes) == sorted(paths)
+    assert not any(writer.schedule(path) for path in paths)
+    assert len(writes) == len(paths)
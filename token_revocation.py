@@ -0,0 +1,120 @@
+"""
+Token Revocation Module for WellTech AI MedSuite
+Revoked JWT ids persisted in SQLite and mirrored in memory per worker
+"""
+
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRevocationList:
+    """Expiring set of revoked token ids (`jti`).
+
+    Revocations are written to the revoked_tokens table and kept in a dict
+    of jti -> exp so require_auth can check a token without touching the
+    database. Each worker pulls rows added by other workers every
+    `sync_interval` seconds using the autoincrement id as a watermark, and
+    entries are dropped once the token would have expired anyway.
+    """
+
+    def __init__(self, get_db, sync_interval=2, purge_interval=600):
+        self.get_db = get_db
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._expiry_heap = []
+        self._last_row_id = 0
+        self._synced_at = 0.0
+        self._purged_at = 0.0
+        self._schema_ready = False
+
+    def init_schema(self):
+        """Create the revoked_tokens table if needed"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    jti TEXT UNIQUE NOT NULL,
+                    user_id INTEGER,
+                    expires_at REAL NOT NULL,
+                    revoked_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens (expires_at)')
+            conn.commit()
+        self._schema_ready = True
+
+    def _remember(self, jti, expires_at):
+        if jti not in self._revoked:
+            self._revoked[jti] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, jti))
+
+    def _prune(self, now):
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, jti = heapq.heappop(heap)
+            self._revoked.pop(jti, None)
+
+    def revoke(self, jti, expires_at, user_id=None):
+        """Revoke a token until its `exp` (seconds since the epoch).
+
+        Returns False if it was already revoked, by any worker, so a
+        single-use token can be consumed by revoking it.
+        """
+        if not self._schema_ready:
+            self.init_schema()
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO revoked_tokens (jti, user_id, expires_at)
+                VALUES (?, ?, ?)
+            ''', (jti, user_id, float(expires_at)))
+            conn.commit()
+        with self._lock:
+            self._remember(jti, float(expires_at))
+        return cursor.rowcount == 1
+
+    def _sync(self):
+        now = time.time()
+        if time.monotonic() - self._synced_at < self.sync_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if not self._schema_ready:
+                self.init_schema()
+            with self.get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, jti, expires_at FROM revoked_tokens
+                    WHERE id > ? ORDER BY id
+                ''', (self._last_row_id,))
+                for row in cursor.fetchall():
+                    self._last_row_id = row[0]
+                    if row[2] > now:
+                        self._remember(row[1], row[2])
+
+                if now - self._purged_at >= self.purge_interval:
+                    cursor.execute('DELETE FROM revoked_tokens WHERE expires_at < ?', (now,))
+                    conn.commit()
+                    self._purged_at = now
+
+            self._prune(now)
+            self._synced_at = time.monotonic()
+        except sqlite3.Error as e:
+            logger.error(f"Revocation list sync error: {e}")
+        finally:
+            self._lock.release()
+
+    def is_revoked(self, jti):
+        """Return True if the token id has been revoked"""
+        self._sync()
+        return jti in self._revoked
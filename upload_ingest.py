@@ -0,0 +1,134 @@
+"""
+Upload Ingest Module for WellTech AI MedSuite
+Streams multipart file parts straight to disk, hashing and metering them as they arrive
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+logger = logging.getLogger(__name__)
+
+
+class UploadLimitExceeded(RequestEntityTooLarge):
+    """A request uploaded more than its byte budget allows"""
+
+    def __init__(self, limit):
+        super().__init__(f'Upload exceeds the remaining storage allowance of {limit} bytes')
+        self.limit = limit
+
+
+class UploadBudget:
+    """Bytes a request may still upload, shared by all of its file parts; None is unlimited"""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+
+    def spend(self, count):
+        self.used += count
+        if self.limit is not None and self.used > self.limit:
+            raise UploadLimitExceeded(self.limit)
+
+
+class IngestFile:
+    """One uploaded file part, written once to a temp file in its final directory.
+
+    The SHA-256 and size are computed as the parser writes, so saving the
+    upload is a rename (commit) rather than a copy. Reads and seeks go to
+    the temp file, so probing works as on any upload stream. Closing an
+    uncommitted part deletes it.
+
+    `screen(head, filename)`, if given, is called once the first
+    `screen_bytes` have arrived. If it raises ValueError, the part is
+    emptied and the rest of it is discarded unwritten; the error is kept
+    in `rejection` for whoever handles the upload.
+    """
+
+    screen_bytes = 4096
+
+    def __init__(self, directory, budget, screen=None, filename=None):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.ingest-', suffix='.tmp')
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self._budget = budget
+        self._screen = screen
+        self.filename = filename
+        self.size = 0
+        self.rejection = None
+        self.committed_path = None
+
+    def write(self, data):
+        if self.rejection is not None:
+            return len(data)
+        self._budget.spend(len(data))
+        self._digest.update(data)
+        self.size += len(data)
+        written = self._file.write(data)
+        if self._screen is not None and self.size >= self.screen_bytes:
+            self._check_head()
+        return written
+
+    def _check_head(self):
+        screen, self._screen = self._screen, None
+        self._file.seek(0)
+        head = self._file.read(self.screen_bytes)
+        try:
+            screen(head, self.filename)
+        except ValueError as e:
+            self.rejection = e
+            self._file.truncate(0)
+            logger.info(f"Upload {self.filename!r} rejected after {self.size} bytes: {e}")
+        self._file.seek(0, os.SEEK_END)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def commit(self, path):
+        """Give the part its final name; it is no longer removed on close"""
+        self._file.flush()
+        os.replace(self.temp_path, path)
+        self.committed_path = path
+        return path
+
+    def close(self):
+        self._file.close()
+        if self.committed_path is None:
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class IngestRequest(Request):
+    """Request whose file parts stream into IngestFiles under upload_dir.
+
+    Werkzeug would otherwise spool each part to memory or a temp file
+    that is then copied to the uploads directory. `upload_budget`, set
+    before the form is first read, caps the bytes all parts may use; the
+    parse stops with UploadLimitExceeded (413) as soon as it is spent.
+    `upload_screen`, set the same way, is each part's IngestFile screen.
+    """
+
+    upload_dir = 'uploads'
+    upload_budget = None
+    upload_screen = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        ingest = IngestFile(self.upload_dir, self.upload_budget or UploadBudget(), self.upload_screen, filename)
+        self.__dict__.setdefault('_ingest_files', []).append(ingest)
+        return ingest
+
+    def close(self):
+        super().close()
+        # Parts abandoned mid-parse (limit hit, client gone) never reach request.files
+        for ingest in self.__dict__.get('_ingest_files', ()):
+            ingest.close()
@@ -11,16 +11,35 @@ import hashlib
 import secrets
 import jwt
 import smtplib
+import time
 from datetime import datetime, timedelta
 from email.mime.text import MimeText
 from email.mime.multipart import MimeMultipart
+from contextlib import contextmanager
 from flask import request, jsonify, session
 from functools import wraps
+from token_revocation import TokenRevocationList
+from key_management import KeyRing
+
+@contextmanager
+def get_db(db_path='user_management.db'):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+# JWT signing keys shared by every worker through the keyring file
+keyring = KeyRing(os.environ.get('JWT_KEYRING_FILE', 'jwt_keyring.json'),
+                  legacy_secret=os.environ.get('JWT_SECRET_KEY'))
+
+# Revoked token ids, shared between workers through the database
+revocation_list = TokenRevocationList(get_db)
 
 class UserManager:
     def __init__(self, db_path='user_management.db'):
         self.db_path = db_path
-        self.secret_key = os.environ.get('JWT_SECRET_KEY', secrets.token_hex(32))
+        self.keyring = keyring
         self.init_database()
         self.create_admin_user()
     
@@ -65,6 +84,8 @@ class UserManager:
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions (expires_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id, expires_at)')
         
         # Audit log table for security tracking
         cursor.execute('''
@@ -149,15 +170,16 @@ class UserManager:
             'user_id': user_id,
             'email': email,
             'role': role,
+            'jti': secrets.token_urlsafe(16),
             'exp': datetime.utcnow() + timedelta(hours=24),
             'iat': datetime.utcnow()
         }
-        return jwt.encode(payload, self.secret_key, algorithm='HS256')
+        return self.keyring.encode(payload)
     
     def verify_jwt_token(self, token):
         """Verify JWT token and return user data"""
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+            payload = self.keyring.decode(token)
             return payload
         except jwt.ExpiredSignatureError:
             return None
@@ -446,15 +468,24 @@ class UserManager:
         conn.close()
         return sessions
     
-    def cleanup_expired_sessions(self):
-        """Clean up expired sessions"""
+    def cleanup_expired_sessions(self, batch_size=500, max_seconds=1.0):
+        """Clean up expired sessions in short batches so the write lock is released often"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('DELETE FROM user_sessions WHERE expires_at < ?', (datetime.now(),))
-        deleted_count = cursor.rowcount
+        deadline = time.monotonic() + max_seconds
+        deleted_count = 0
+        while True:
+            cursor.execute('''
+                DELETE FROM user_sessions WHERE id IN (
+                    SELECT id FROM user_sessions WHERE expires_at < ? LIMIT ?
+                )
+            ''', (datetime.now(), batch_size))
+            conn.commit()
+            deleted_count += cursor.rowcount
+            if cursor.rowcount < batch_size or time.monotonic() >= deadline:
+                break
         
-        conn.commit()
         conn.close()
         
         return deleted_count
@@ -477,6 +508,9 @@ def require_auth(f):
         if not payload:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
+        if payload.get('jti') and revocation_list.is_revoked(payload['jti']):
+            return jsonify({'error': 'Token has been revoked'}), 401
+        
         # Add user info to request context
         request.current_user = payload
         return f(*args, **kwargs)
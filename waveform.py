@@ -0,0 +1,203 @@
+"""
+Waveform Module for WellTech AI MedSuite
+Downsampled min/max peaks over memory-mapped PCM for audio previews
+"""
+
+import os
+import struct
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PEAKS_PER_SECOND = 20
+PEAKS_EXTENSION = '.peaks'
+
+# Blob header: magic, version, sample rate, samples per peak, peak count
+PEAKS_MAGIC = b'WTPK'
+PEAKS_HEADER = struct.Struct('<4sHIII')
+PEAKS_VERSION = 1
+
+# Buckets reduced per step, so memory stays bounded on long recordings
+_BLOCK_PEAKS = 8192
+
+_PCM_DTYPES = {
+    (1, 1): np.uint8,
+    (1, 2): np.dtype('<i2'),
+    (1, 4): np.dtype('<i4'),
+    (3, 4): np.dtype('<f4')
+}
+
+
+def peaks_path(file_path):
+    """Location of a recording's peaks blob"""
+    return file_path + PEAKS_EXTENSION
+
+
+def _pcm_layout(path):
+    """(audio_format, channels, sample_rate, sample_width, data_offset, data_size) of a WAV file"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            return None
+        fmt = None
+        offset = 12
+        while offset + 8 <= size:
+            f.seek(offset)
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            if chunk_id == b'fmt ':
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', f.read(16))
+                if audio_format == 0xFFFE and chunk_size >= 40:
+                    # WAVE_FORMAT_EXTENSIBLE: the real format is the subformat GUID's first two bytes
+                    f.seek(offset + 8 + 24)
+                    audio_format = struct.unpack('<H', f.read(2))[0]
+                fmt = (audio_format, channels, sample_rate, bits // 8)
+            elif chunk_id == b'data' and fmt:
+                data_size = min(chunk_size, size - offset - 8) if chunk_size else size - offset - 8
+                return fmt + (offset + 8, data_size)
+            offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def peaks_supported(path):
+    """Whether compute_peaks can handle a recording, judged from its header"""
+    try:
+        layout = _pcm_layout(path)
+    except (OSError, struct.error):
+        return False
+    return layout is not None and (layout[0], layout[3]) in _PCM_DTYPES and bool(layout[1] and layout[2])
+
+
+def compute_peaks(path, peaks_per_second=PEAKS_PER_SECOND):
+    """Min/max peak pairs for a PCM WAV file, all channels mixed.
+
+    The samples are memory-mapped rather than read, and each block of
+    buckets is reduced with vectorised min/max. Returns (sample_rate,
+    samples_per_peak, peaks) where peaks is an int8 array of shape
+    (count, 2) scaled to full scale, or None for audio that is not
+    8/16/32-bit integer or 32-bit float PCM.
+    """
+    layout = _pcm_layout(path)
+    if layout is None:
+        return None
+    audio_format, channels, sample_rate, width, data_offset, data_size = layout
+    dtype = _PCM_DTYPES.get((audio_format, width))
+    if dtype is None or not channels or not sample_rate:
+        return None
+
+    frames = data_size // (width * channels)
+    samples_per_peak = max(1, sample_rate // peaks_per_second)
+    count = -(-frames // samples_per_peak)
+    peaks = np.zeros((count, 2), dtype=np.int8)
+    if frames == 0:
+        return sample_rate, samples_per_peak, peaks
+
+    pcm = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(frames, channels))
+    if audio_format == 3:
+        scale, center = 1.0, 0.0
+    else:
+        full_scale = float(1 << (8 * width - 1))
+        scale, center = 1.0 / full_scale, (full_scale if width == 1 else 0.0)
+
+    for first in range(0, count, _BLOCK_PEAKS):
+        last = min(count, first + _BLOCK_PEAKS)
+        block = pcm[first * samples_per_peak:last * samples_per_peak]
+        whole = len(block) // samples_per_peak
+        lows = np.empty(last - first)
+        highs = np.empty(last - first)
+        if whole:
+            buckets = block[:whole * samples_per_peak].reshape(whole, samples_per_peak * channels)
+            lows[:whole] = buckets.min(axis=1)
+            highs[:whole] = buckets.max(axis=1)
+        if whole < last - first:
+            tail = block[whole * samples_per_peak:]
+            lows[whole], highs[whole] = tail.min(), tail.max()
+        peaks[first:last, 0] = np.clip(np.round((lows - center) * scale * 127), -127, 127)
+        peaks[first:last, 1] = np.clip(np.round((highs - center) * scale * 127), -127, 127)
+
+    del pcm
+    return sample_rate, samples_per_peak, peaks
+
+
+def write_peaks(file_path, peaks_per_second=PEAKS_PER_SECOND):
+    """Compute and store a recording's peaks blob; returns its path or None.
+
+    The blob is the PEAKS_HEADER followed by count (min, max) int8 pairs.
+    It is written through a temp file so readers never see a partial blob.
+    """
+    computed = compute_peaks(file_path, peaks_per_second)
+    if computed is None:
+        return None
+    sample_rate, samples_per_peak, peaks = computed
+
+    target = peaks_path(file_path)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, sample_rate, samples_per_peak, len(peaks)))
+        f.write(peaks.tobytes())
+    os.replace(tmp_path, target)
+    logger.info(f"Waveform peaks written: {target} ({len(peaks)} peaks)")
+    return target
+
+
+def read_peaks(blob):
+    """Decode a peaks blob into (sample_rate, samples_per_peak, peaks)"""
+    magic, version, sample_rate, samples_per_peak, count = PEAKS_HEADER.unpack_from(blob)
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+        raise ValueError('Not a peaks blob')
+    peaks = np.frombuffer(blob, dtype=np.int8, count=count * 2, offset=PEAKS_HEADER.size)
+    return sample_rate, samples_per_peak, peaks.reshape(count, 2)
+
+
+class PeaksWriter:
+    """Writes peaks blobs on a background thread pool, off the request path.
+
+    schedule() queues a recording once; until its blob is written,
+    pending() is true for it in this process. A recording whose peaks
+    failed is not queued again by this process.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self._pool = None
+        self._pending = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, file_path):
+        """Queue a recording's peaks unless they exist or are already queued; False if they cannot be made"""
+        if os.path.exists(peaks_path(file_path)):
+            return True
+        if not peaks_supported(file_path):
+            return False
+        with self._lock:
+            if file_path in self._failed:
+                return False
+            if file_path in self._pending:
+                return True
+            self._pending.add(file_path)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='waveform')
+        self._pool.submit(self._write, file_path)
+        return True
+
+    def pending(self, file_path):
+        with self._lock:
+            return file_path in self._pending
+
+    def _write(self, file_path):
+        failed = False
+        try:
+            write_peaks(file_path)
+        except Exception as e:
+            failed = True
+            logger.error(f"Waveform peaks failed for {file_path}: {e}")
+        finally:
+            # In one step, so schedule() never sees the recording as neither pending nor failed
+            with self._lock:
+                self._pending.discard(file_path)
+                if failed:
+                    self._failed.add(file_path)